@@ -0,0 +1,43 @@
+import sys
+import time
+import numpy as np
+from utils import calculate_aqi_from_components, calculate_aqi_arrays
+
+def main():
+    """
+    Compare scalar and vectorized AQI computation on random concentrations.
+    
+    Usage: python benchmark_aqi.py [n_samples]
+    """
+    n_samples = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    
+    rng = np.random.default_rng(42)
+    pm25 = rng.gamma(2.0, 15.0, n_samples)
+    o3 = rng.gamma(3.0, 15.0, n_samples)
+    no2 = rng.gamma(2.0, 20.0, n_samples)
+    
+    print(f"Benchmarking AQI computation on {n_samples:,} samples...")
+    
+    start = time.perf_counter()
+    scalar_overall = np.array([
+        calculate_aqi_from_components(p, o, n)['Overall']
+        for p, o, n in zip(pm25.tolist(), o3.tolist(), no2.tolist())
+    ])
+    scalar_seconds = time.perf_counter() - start
+    
+    # Compile the breakpoint tables before timing
+    calculate_aqi_arrays(pm25[:1], o3[:1], no2[:1])
+    
+    start = time.perf_counter()
+    vector_overall = calculate_aqi_arrays(pm25, o3, no2)['Overall']
+    vector_seconds = time.perf_counter() - start
+    
+    mismatches = int(np.sum(scalar_overall != vector_overall))
+    
+    print(f"  Scalar:     {scalar_seconds:8.3f}s")
+    print(f"  Vectorized: {vector_seconds:8.3f}s")
+    print(f"  Speedup:    {scalar_seconds / vector_seconds:8.1f}x")
+    print(f"  Mismatches: {mismatches}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+import plotly.graph_objects as go
+
+# Points sent to the browser per chart, shared by all of its traces
+# (roughly 250 kB of JSON for timestamp/value pairs)
+CHART_POINT_BUDGET = 5000
+
+# Traces with more points than this are drawn with WebGL instead of SVG
+WEBGL_POINT_THRESHOLD = 1000
+
+def lttb_indices(x, y, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    The first and last points are always kept. The points in between are
+    split into n_out - 2 equal buckets, and from each bucket the point
+    forming the largest triangle with the previously kept point and the mean
+    of the next bucket is selected, which preserves peaks and troughs far
+    better than striding or averaging.
+
+    Args:
+        x (array-like): Sorted x values (numbers or datetimes)
+        y (array-like): y values without NaNs
+        n_out (int): Number of points to keep
+
+    Returns:
+        np.ndarray: Sorted indices into x and y
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    x = x.astype(float)
+    y = np.asarray(y, dtype=float)
+
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for bucket in range(n_out - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+
+        # Average of the next bucket (the last point for the final bucket)
+        if bucket + 2 < len(edges):
+            next_end = edges[bucket + 2]
+            avg_x = x[end:next_end].mean()
+            avg_y = y[end:next_end].mean()
+        else:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+def downsample_frame(data, x, y, group=None, budget=CHART_POINT_BUDGET, x_range=None):
+    """
+    Downsample long-format series to a per-chart point budget.
+
+    Rows outside x_range are dropped first, so zooming in re-spends the
+    whole budget on the visible window. The budget is split evenly across
+    groups and each group is reduced with LTTB.
+
+    Args:
+        data (pd.DataFrame): Long-format data
+        x (str): x column
+        y (str): y column
+        group (str): Column identifying separate traces
+        budget (int): Maximum points for the whole chart
+        x_range (tuple): Visible (start, end) of the x axis
+
+    Returns:
+        tuple: (downsampled DataFrame, number of points in the visible range)
+    """
+    data = data.dropna(subset=[y])
+    if x_range is not None:
+        data = data[(data[x] >= x_range[0]) & (data[x] <= x_range[1])]
+
+    if data.empty:
+        return data, 0
+
+    groups = [(None, data)] if group is None else list(data.groupby(group, sort=False))
+    per_group = max(3, budget // len(groups))
+
+    parts = []
+    for _, frame in groups:
+        frame = frame.sort_values(x)
+        parts.append(frame.iloc[lttb_indices(frame[x].values, frame[y].values, per_group)])
+
+    return pd.concat(parts, ignore_index=True), len(data)
+
+def time_series_figure(data, x, y, group=None, budget=CHART_POINT_BUDGET, x_range=None,
+                       mode='lines', **layout):
+    """
+    Line chart that stays within a point budget.
+
+    Traces are downsampled with downsample_frame and drawn with Scattergl
+    when they still carry more than WEBGL_POINT_THRESHOLD points.
+
+    Args:
+        data (pd.DataFrame): Long-format data
+        x (str): x column
+        y (str): y column
+        group (str): Column identifying separate traces
+        budget (int): Maximum points for the whole chart
+        x_range (tuple): Visible (start, end) of the x axis
+        mode (str): Plotly trace mode
+        **layout: Passed to fig.update_layout
+
+    Returns:
+        tuple: (go.Figure, dict with 'total' visible points, 'shown'
+            points and whether 'webgl' traces were used)
+    """
+    sampled, total = downsample_frame(data, x, y, group=group, budget=budget, x_range=x_range)
+
+    fig = go.Figure()
+    webgl = False
+    traces = [(y, sampled)] if group is None else sampled.groupby(group, sort=False)
+    for name, frame in traces:
+        dense = len(frame) > WEBGL_POINT_THRESHOLD
+        webgl = webgl or dense
+        trace_type = go.Scattergl if dense else go.Scatter
+        fig.add_trace(trace_type(x=frame[x], y=frame[y], mode=mode, name=str(name)))
+
+    fig.update_layout(**layout)
+
+    return fig, {'total': total, 'shown': len(sampled), 'webgl': webgl}
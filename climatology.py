@@ -0,0 +1,330 @@
+import pandas as pd
+import numpy as np
+import xarray as xr
+import os
+import sys
+import json
+import time
+import threading
+from tempo_index import read_tempo_granule
+
+CLIMATOLOGY_DIR = os.path.join('data', 'climatology')
+
+# Cube resolution: grid cells in degrees and days of year per time bin
+CLIMATOLOGY_GRID_DEG = 2.5
+CLIMATOLOGY_DAY_BIN = 8
+
+MERRA2_VARIABLES = [
+    'BCSMASS', 'OCSMASS', 'DUSMASS', 'SSSMASS', 'SO4SMASS',
+    'T2M', 'QV2M', 'U2M', 'V2M', 'PBLH', 'CLDTOT'
+]
+TEMPO_VARIABLES = ['NO2_vertical_column_troposphere', 'NO2_column_uncertainty']
+CLIMATOLOGY_VARIABLES = MERRA2_VARIABLES + TEMPO_VARIABLES
+
+# Last-resort values when there is no cube or it has no value for a variable,
+# in the units of the source products (MERRA-2 SI units, TEMPO molecules/cm^2)
+CLIMATOLOGY_DEFAULTS = {
+    'BCSMASS': 0.0,  # kg m-3
+    'OCSMASS': 0.0,  # kg m-3
+    'DUSMASS': 0.0,  # kg m-3
+    'SSSMASS': 0.0,  # kg m-3
+    'SO4SMASS': 0.0,  # kg m-3
+    'T2M': 288.15,  # K
+    'QV2M': 0.01,  # kg kg-1
+    'U2M': 0.0,  # m s-1
+    'V2M': 0.0,  # m s-1
+    'PBLH': 1000.0,  # m
+    'CLDTOT': 0.5,  # fraction
+    'NO2_vertical_column_troposphere': 0.0,  # molecules cm-2
+    'NO2_column_uncertainty': 0.0  # molecules cm-2
+}
+
+def cube_shape(grid_deg=CLIMATOLOGY_GRID_DEG, day_bin=CLIMATOLOGY_DAY_BIN, n_variables=len(CLIMATOLOGY_VARIABLES)):
+    """(lat cells, lon cells, day bins, variables) of a climatology cube."""
+    return (int(np.ceil(180 / grid_deg)), int(np.ceil(360 / grid_deg)),
+            int(np.ceil(366 / day_bin)), n_variables)
+
+def cube_index(lat, lon, dayofyear, grid_deg=CLIMATOLOGY_GRID_DEG, day_bin=CLIMATOLOGY_DAY_BIN):
+    """
+    Cube indices of locations and days; works on scalars and arrays.
+
+    Returns:
+        tuple: (lat index, lon index, day bin index)
+    """
+    n_lat, n_lon, n_days, _ = cube_shape(grid_deg, day_bin)
+    lat_index = np.clip(np.floor((np.asarray(lat) + 90) / grid_deg).astype(int), 0, n_lat - 1)
+    lon_index = np.floor(((np.asarray(lon) + 180) % 360) / grid_deg).astype(int) % n_lon
+    day_index = np.clip((np.asarray(dayofyear).astype(int) - 1) // day_bin, 0, n_days - 1)
+    return lat_index, lon_index, day_index
+
+class ClimatologyBuilder:
+    """
+    Accumulates observations into per (cell, day bin, variable) sums and
+    counts, then turns them into a gap-filled float16 cube.
+    """
+
+    def __init__(self, variables=CLIMATOLOGY_VARIABLES, grid_deg=CLIMATOLOGY_GRID_DEG,
+                 day_bin=CLIMATOLOGY_DAY_BIN):
+        self.variables = list(variables)
+        self.grid_deg = grid_deg
+        self.day_bin = day_bin
+        shape = cube_shape(grid_deg, day_bin, len(self.variables))
+        self.sums = np.zeros(shape)
+        self.counts = np.zeros(shape, dtype=np.int64)
+
+    def add_points(self, lat, lon, dayofyear, values):
+        """
+        Add point values.
+
+        Args:
+            lat, lon, dayofyear (array-like): Positions and days of the points
+            values (dict): Arrays aligned with the points per variable name
+        """
+        lat_index, lon_index, day_index = cube_index(lat, lon, dayofyear, self.grid_deg, self.day_bin)
+        for variable, column in values.items():
+            if variable not in self.variables:
+                continue
+            column = np.asarray(column, dtype=float)
+            valid = np.isfinite(column)
+            cell = (lat_index[valid], lon_index[valid], day_index[valid], self.variables.index(variable))
+            np.add.at(self.sums, cell, column[valid])
+            np.add.at(self.counts, cell, 1)
+
+    def add_granule(self, path):
+        """
+        Add a MERRA-2 or TEMPO netCDF granule.
+
+        Every time step of a gridded granule is binned by its own day of
+        year. TEMPO swaths are read pixel by pixel and binned by the date in
+        their file name, as are other granules without a time coordinate.
+
+        Returns:
+            int: Number of values added
+        """
+        if os.path.basename(path).startswith('TEMPO'):
+            lat, lon, values = read_tempo_granule(path)
+            self.add_points(lat, lon, np.full(len(lat), granule_date(path).dayofyear), values)
+            return int(sum(np.isfinite(column).sum() for column in values.values()))
+
+        added = 0
+        with xr.open_dataset(path) as dataset:
+            variables = [name for name in dataset.data_vars if name in self.variables]
+            lat_name = next((name for name in ('lat', 'latitude') if name in dataset.variables), None)
+            lon_name = next((name for name in ('lon', 'longitude') if name in dataset.variables), None)
+            if not variables or lat_name is None or lon_name is None:
+                return 0
+
+            if 'time' in dataset.coords:
+                times = pd.DatetimeIndex(np.atleast_1d(dataset['time'].values))
+            else:
+                times = pd.DatetimeIndex([granule_date(path)])
+
+            for step, timestamp in enumerate(times):
+                values = {}
+                for name in variables:
+                    data = dataset[name]
+                    if 'time' in data.dims:
+                        data = data.isel(time=step)
+                    data, lat, lon = xr.broadcast(data, dataset[lat_name], dataset[lon_name])
+                    values[name] = data.values.ravel()
+                    added += int(np.isfinite(values[name]).sum())
+
+                self.add_points(lat.values.ravel(), lon.values.ravel(),
+                                np.full(lat.size, timestamp.dayofyear), values)
+
+        return added
+
+    def finalize(self):
+        """
+        Means per cell, gap-filled and packed into float16.
+
+        Empty entries are filled, in order, from the same cell in other day
+        bins, from the cell's latitude band in the same day bin, from the
+        latitude band over the year, from all cells in the same day bin and
+        finally from CLIMATOLOGY_DEFAULTS. Each variable is scaled by the
+        inverse of its largest magnitude so that values such as aerosol mass
+        (~1e-9 kg/m³) or NO2 columns (~1e16 molecules/cm²) keep their
+        precision in float16.
+
+        Returns:
+            tuple: (float16 cube, per-variable scales to divide by)
+        """
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = self.sums / self.counts
+            cell_year = self.sums.sum(axis=2, keepdims=True) / self.counts.sum(axis=2, keepdims=True)
+            band_day = self.sums.sum(axis=1, keepdims=True) / self.counts.sum(axis=1, keepdims=True)
+            band_year = (self.sums.sum(axis=(1, 2), keepdims=True)
+                         / self.counts.sum(axis=(1, 2), keepdims=True))
+            global_day = (self.sums.sum(axis=(0, 1), keepdims=True)
+                          / self.counts.sum(axis=(0, 1), keepdims=True))
+
+        defaults = np.array([CLIMATOLOGY_DEFAULTS.get(variable, 0.0) for variable in self.variables])
+        for fallback in (cell_year, band_day, band_year, global_day, defaults):
+            means = np.where(np.isfinite(means), means, fallback)
+
+        largest = np.max(np.abs(means), axis=(0, 1, 2))
+        scales = np.where(largest > 0, 1.0 / np.where(largest > 0, largest, 1.0), 1.0)
+
+        return (means * scales).astype(np.float16), scales
+
+    def save(self, output_dir=CLIMATOLOGY_DIR):
+        """Write the finalized cube and its metadata."""
+        cube, scales = self.finalize()
+        os.makedirs(output_dir, exist_ok=True)
+
+        cube_path = os.path.join(output_dir, 'cube.npy')
+        np.save(cube_path + '.tmp.npy', cube)
+        os.replace(cube_path + '.tmp.npy', cube_path)
+
+        with open(os.path.join(output_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'variables': self.variables,
+                'scales': scales.tolist(),
+                'grid_deg': self.grid_deg,
+                'day_bin': self.day_bin,
+                'observations': self.counts.sum(axis=(0, 1, 2)).tolist(),
+                'built_at': pd.Timestamp.now().isoformat(timespec='seconds')
+            }, f, indent=2)
+
+        return cube_path
+
+def granule_date(path):
+    """Date in a granule file name (the first 8-digit YYYYMMDD run)."""
+    name = os.path.basename(path)
+    for start in range(len(name) - 7):
+        candidate = name[start:start + 8]
+        if candidate.isdigit():
+            try:
+                return pd.Timestamp(candidate)
+            except ValueError:
+                continue
+    raise ValueError(f"No date in granule name {name}")
+
+class Climatology:
+    """
+    Memory-mapped climatology cube.
+
+    Lookups only read the few bytes of one (cell, day bin) row, so a
+    location-aware fallback takes microseconds and the cube is never loaded
+    into memory as a whole.
+    """
+
+    def __init__(self, directory=CLIMATOLOGY_DIR):
+        with open(os.path.join(directory, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        self.variables = meta['variables']
+        self.positions = {variable: position for position, variable in enumerate(self.variables)}
+        self.scales = [float(scale) for scale in meta['scales']]
+        self.grid_deg = meta['grid_deg']
+        self.day_bin = meta['day_bin']
+        self.cube = np.load(os.path.join(directory, 'cube.npy'), mmap_mode='r')
+        self.n_lat, self.n_lon, self.n_days, _ = self.cube.shape
+
+    def lookup(self, lat, lon, dayofyear, variables):
+        """
+        Climatological values of variables at a location and day of year.
+
+        Returns:
+            dict: Value per variable that the cube contains
+        """
+        # Same cells as cube_index, in plain arithmetic for a single point
+        lat_index = min(max(int((lat + 90) // self.grid_deg), 0), self.n_lat - 1)
+        lon_index = int(((lon + 180) % 360) // self.grid_deg) % self.n_lon
+        day_index = min(max((int(dayofyear) - 1) // self.day_bin, 0), self.n_days - 1)
+
+        row = self.cube[lat_index, lon_index, day_index].tolist()
+        return {
+            variable: row[self.positions[variable]] / self.scales[self.positions[variable]]
+            for variable in variables if variable in self.positions
+        }
+
+_climatology = None
+_climatology_lock = threading.Lock()
+
+def get_climatology(directory=CLIMATOLOGY_DIR):
+    """Process-wide climatology cube, or None if none has been built."""
+    global _climatology
+    with _climatology_lock:
+        if _climatology is None and os.path.exists(os.path.join(directory, 'meta.json')):
+            _climatology = Climatology(directory)
+    return _climatology
+
+def climatology_fallback(lat, lon, start_date, end_date, variables, values=None):
+    """
+    Fill variables a data source could not provide.
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        start_date (str): Start of the requested window (YYYY-MM-DD)
+        end_date (str): End of the requested window (YYYY-MM-DD)
+        variables (list): Variables the source should have returned
+        values (dict): Values the source did return
+
+    Returns:
+        dict: values completed from the climatology at the middle of the
+            window (or CLIMATOLOGY_DEFAULTS), with the list of filled
+            variables under '_filled'
+    """
+    values = dict(values or {})
+    missing = [variable for variable in variables if not np.isfinite(values.get(variable, np.nan))]
+    if not missing:
+        values['_filled'] = []
+        return values
+
+    middle = pd.Timestamp(start_date) + (pd.Timestamp(end_date) - pd.Timestamp(start_date)) / 2
+    climatology = get_climatology()
+    filled = climatology.lookup(lat, lon, middle.dayofyear, missing) if climatology else {}
+
+    for variable in missing:
+        values[variable] = filled.get(variable, CLIMATOLOGY_DEFAULTS.get(variable, 0.0))
+    values['_filled'] = missing
+
+    return values
+
+def main():
+    """
+    Build the climatology cube from downloaded granules.
+
+    Usage:
+        python climatology.py <granule or directory> [...] [--output data/climatology]
+    """
+    print("Building Mframapa AI climatology cube...")
+    print("=" * 60)
+
+    output_dir = CLIMATOLOGY_DIR
+    arguments = sys.argv[1:]
+    if '--output' in arguments:
+        position = arguments.index('--output')
+        output_dir = arguments[position + 1]
+        del arguments[position:position + 2]
+
+    paths = []
+    for argument in arguments:
+        if os.path.isdir(argument):
+            paths.extend(
+                os.path.join(argument, name) for name in sorted(os.listdir(argument))
+                if name.endswith(('.nc', '.nc4'))
+            )
+        else:
+            paths.append(argument)
+
+    if not paths:
+        print("ERROR: No granules given")
+        return
+
+    builder = ClimatologyBuilder()
+    started = time.time()
+    for position, path in enumerate(paths):
+        try:
+            added = builder.add_granule(path)
+        except (OSError, ValueError) as e:
+            print(f"  Skipping {path}: {str(e)}")
+            continue
+        print(f"  [{position + 1}/{len(paths)}] {os.path.basename(path)}: {added} values")
+
+    cube_path = builder.save(output_dir)
+    print(f"Wrote {cube_path} ({os.path.getsize(cube_path) / 1e6:.1f} MB) in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
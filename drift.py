@@ -0,0 +1,280 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import threading
+
+FEATURE_PROFILE_FILE = 'feature_profile.json'
+DRIFT_METRICS_PATH = os.path.join('data', 'drift_metrics.json')
+
+# Quantile bins per feature in the training histograms
+DRIFT_BINS = 10
+
+# Training rows used to place the bin edges
+PROFILE_SAMPLE_ROWS = 200_000
+
+# Serving rows after which older inputs count half as much
+DRIFT_HALF_LIFE = 5000
+
+# Conventional PSI levels for a moderate and a significant shift
+PSI_WARNING = 0.1
+PSI_ALERT = 0.25
+
+# Minimum seconds between metric exports
+DRIFT_EXPORT_SECONDS = 60
+
+# Pseudo-count added to every bin so empty bins keep PSI finite
+_SMOOTHING = 0.5
+
+def bin_edges(values, bins=DRIFT_BINS):
+    """
+    Quantile bin edges of one feature.
+
+    The edges run from the training minimum to just above the maximum, so
+    serving values below or above the training range land in their own
+    tail bins instead of being merged into the outermost quantiles.
+
+    Args:
+        values (array-like): Training values without NaNs
+        bins (int): Number of quantile bins
+
+    Returns:
+        np.ndarray: Increasing edges; values are binned with searchsorted
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.array([0.0, np.nextafter(0.0, np.inf)])
+
+    edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+    edges[-1] = np.nextafter(edges[-1], np.inf)
+    if len(edges) == 1:
+        edges = np.append(edges, np.nextafter(edges[0], np.inf))
+    return edges
+
+def bin_counts(values, edges):
+    """Histogram of values over edges plus the two tail bins."""
+    values = np.asarray(values, dtype=float)
+    return np.bincount(np.searchsorted(edges, values, side='right'), minlength=len(edges) + 1)
+
+def build_feature_profile(frames, feature_columns, bins=DRIFT_BINS, sample_rows=PROFILE_SAMPLE_ROWS):
+    """
+    Per-feature histograms of the training inputs.
+
+    Bin edges are placed on the first sample_rows rows; all rows are then
+    counted, so frames can be a generator over shards that never fit in
+    memory together.
+
+    Args:
+        frames (iterable): DataFrames holding the feature columns
+        feature_columns (list): Features to profile
+        bins (int): Number of quantile bins
+        sample_rows (int): Rows used to place the bin edges
+
+    Returns:
+        dict: 'features' with edges and counts per feature, and the total 'rows'
+    """
+    features = {}
+    pending = []
+    pending_rows = 0
+    rows = 0
+
+    def count(frame):
+        for col in feature_columns:
+            features[col]['counts'] += bin_counts(frame[col].fillna(0).values, features[col]['edges'])
+
+    def fit(sample):
+        for col in feature_columns:
+            edges = bin_edges(sample[col].dropna().values, bins)
+            features[col] = {'edges': edges, 'counts': np.zeros(len(edges) + 1, dtype=np.int64)}
+
+    for frame in frames:
+        rows += len(frame)
+        if features:
+            count(frame)
+            continue
+
+        pending.append(frame)
+        pending_rows += len(frame)
+        if pending_rows >= sample_rows:
+            sample = pd.concat(pending, ignore_index=True)
+            fit(sample)
+            count(sample)
+            pending = []
+
+    if not features and pending:
+        sample = pd.concat(pending, ignore_index=True)
+        fit(sample)
+        count(sample)
+
+    return {
+        'rows': rows,
+        'features': {
+            col: {'edges': profile['edges'].tolist(), 'counts': profile['counts'].tolist()}
+            for col, profile in features.items()
+        }
+    }
+
+def save_feature_profile(profile, model_dir='models'):
+    """Write the training feature profile next to the models."""
+    path = os.path.join(model_dir, FEATURE_PROFILE_FILE)
+    with open(path, 'w') as f:
+        json.dump(profile, f)
+    return path
+
+def load_feature_profile(model_dir='models'):
+    """Training feature profile saved with the models, or None."""
+    path = os.path.join(model_dir, FEATURE_PROFILE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def psi(expected, actual):
+    """Population stability index between two histograms over the same bins."""
+    expected = np.asarray(expected, dtype=float) + _SMOOTHING
+    actual = np.asarray(actual, dtype=float) + _SMOOTHING
+    expected /= expected.sum()
+    actual /= actual.sum()
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+def ks_statistic(expected, actual):
+    """Kolmogorov-Smirnov distance between two histograms, evaluated at the bin edges."""
+    expected = np.asarray(expected, dtype=float)
+    actual = np.asarray(actual, dtype=float)
+    if expected.sum() == 0 or actual.sum() == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(expected) / expected.sum() - np.cumsum(actual) / actual.sum())))
+
+def drift_status(value):
+    """'ok', 'warning' or 'alert' for a PSI value."""
+    if value >= PSI_ALERT:
+        return 'alert'
+    if value >= PSI_WARNING:
+        return 'warning'
+    return 'ok'
+
+class DriftMonitor:
+    """
+    Streaming comparison of serving inputs with the training distribution.
+
+    For every profiled feature the monitor keeps one decayed count per
+    training bin and a decayed count of rows where the feature was missing
+    or came from a fallback such as the climatology, so memory stays fixed
+    however many forecasts are served. Counts decay with a half-life of
+    half_life rows, which makes PSI and KS follow recent inputs rather than
+    everything since start-up.
+    """
+
+    def __init__(self, profile, half_life=DRIFT_HALF_LIFE):
+        self.profile = profile
+        self.half_life = half_life
+        self.edges = {
+            col: np.asarray(feature['edges'], dtype=float)
+            for col, feature in profile['features'].items()
+        }
+        self.expected = {
+            col: np.asarray(feature['counts'], dtype=float)
+            for col, feature in profile['features'].items()
+        }
+        self.counts = {col: np.zeros(len(expected)) for col, expected in self.expected.items()}
+        self.filled = {col: 0.0 for col in self.expected}
+        self.weight = 0.0
+        self.rows = 0
+        self.last_export = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, X, filled=None):
+        """
+        Add a batch of serving inputs.
+
+        Args:
+            X (pd.DataFrame): Model inputs before NaN filling; profiled
+                features that are absent or NaN count as filled with 0
+            filled (array-like): Comma-separated names of the features that
+                were filled from a fallback source, per row
+        """
+        if X is None or len(X) == 0:
+            return
+
+        n = len(X)
+        decay = 0.5 ** (n / self.half_life)
+
+        fallback = {}
+        if filled is not None:
+            filled = pd.Series(filled).fillna('').values
+            for names in set(filled):
+                rows = filled == names
+                for col in filter(None, names.split(',')):
+                    fallback[col] = fallback[col] | rows if col in fallback else rows
+
+        with self._lock:
+            for col, edges in self.edges.items():
+                values = X[col].values.astype(float) if col in X else np.full(n, np.nan)
+                finite = np.isfinite(values)
+                missing = ~finite | fallback[col] if col in fallback else ~finite
+
+                self.counts[col] *= decay
+                self.counts[col] += bin_counts(np.where(finite, values, 0.0), edges)
+                self.filled[col] = self.filled[col] * decay + int(missing.sum())
+
+            self.weight = self.weight * decay + n
+            self.rows += n
+
+    def scores(self):
+        """
+        Current drift per feature.
+
+        Returns:
+            pd.DataFrame: feature, psi, ks, fill_rate, out_of_range (share of
+                inputs outside the training range) and status, worst first
+        """
+        with self._lock:
+            rows = []
+            for col, expected in self.expected.items():
+                actual = self.counts[col]
+                weight = actual.sum()
+                rows.append({
+                    'feature': col,
+                    'psi': psi(expected, actual) if weight > 0 else 0.0,
+                    'ks': ks_statistic(expected, actual),
+                    'fill_rate': self.filled[col] / self.weight if self.weight > 0 else 0.0,
+                    'out_of_range': (actual[0] + actual[-1]) / weight if weight > 0 else 0.0
+                })
+
+        scores = pd.DataFrame(rows, columns=['feature', 'psi', 'ks', 'fill_rate', 'out_of_range'])
+        scores['status'] = scores['psi'].map(drift_status)
+        return scores.sort_values('psi', ascending=False).reset_index(drop=True)
+
+    def export(self, path=DRIFT_METRICS_PATH, min_interval=DRIFT_EXPORT_SECONDS):
+        """
+        Atomically write the current scores as a metrics snapshot.
+
+        Exports within min_interval seconds of the previous one are skipped.
+
+        Returns:
+            bool: True if the snapshot was written
+        """
+        now = time.time()
+        if now - self.last_export < min_interval:
+            return False
+        self.last_export = now
+
+        snapshot = {
+            'exported_at': pd.Timestamp.now().isoformat(timespec='seconds'),
+            'rows': self.rows,
+            'effective_rows': self.weight,
+            'features': self.scores().to_dict(orient='records')
+        }
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(path + '.tmp', path)
+        return True
+
+def load_drift_metrics(path=DRIFT_METRICS_PATH):
+    """Last exported drift snapshot, or None if nothing was exported yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
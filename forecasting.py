@@ -0,0 +1,834 @@
+import streamlit as st
+import xgboost as xgb
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import os
+import json
+import pickle
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from verification import archive_forecast, verify_observations
+from drift import DriftMonitor, load_feature_profile
+from merra2 import resolve_merra2_dates
+from tempo_index import TEMPO_SERVING_LAG_DAYS, TEMPO_SERVING_DAYS
+from utils import (
+    fetch_openweather_forecast,
+    fetch_merra2_data,
+    fetch_tempo_box_means,
+    in_tempo_coverage,
+    fetch_air_quality_data,
+    calculate_aqi_arrays,
+    StreamingAQIEngine,
+    get_history_buffer,
+    parse_current_observations,
+    lag_feature_names,
+    unit_scale,
+    LEGACY_MODEL_UNITS
+)
+
+MODEL_DIR = 'models'
+
+# Forecast lead times in hours (every 3 hours for 48 hours)
+FORECAST_HORIZONS = tuple(range(0, 49, 3))
+
+# Model file suffix -> pollutant name used by the AQI functions
+MODEL_POLLUTANTS = {'pm25': 'PM2.5', 'o3': 'O3', 'no2': 'NO2'}
+
+# Cities within the same grid cell share a cached forecast (~11 km)
+FORECAST_GRID_DEG = 0.1
+
+@st.cache_resource
+def load_models(model_dir=MODEL_DIR):
+    """
+    Load trained XGBoost models and supporting data.
+
+    Args:
+        model_dir (str): Directory written by train_model.py
+
+    Returns:
+        tuple: (models, feature_columns, label_encoders, normalization_params)
+    """
+    models = {}
+    feature_columns = []
+    label_encoders = {}
+    normalization_params = {}
+
+    try:
+        # Load feature columns
+        with open(os.path.join(model_dir, 'feature_columns.pkl'), 'rb') as f:
+            feature_columns = pickle.load(f)
+
+        # Load label encoders
+        with open(os.path.join(model_dir, 'label_encoders.pkl'), 'rb') as f:
+            label_encoders = pickle.load(f)
+
+        # Load normalization parameters
+        norm_path = os.path.join(model_dir, 'normalization_params.pkl')
+        if os.path.exists(norm_path):
+            with open(norm_path, 'rb') as f:
+                normalization_params = pickle.load(f)
+
+        # Load models for each pollutant
+        model_files = [
+            f for f in os.listdir(model_dir)
+            if f.startswith('xgboost_model_') and f.endswith('.json')
+        ]
+
+        for model_file in model_files:
+            pollutant = model_file.replace('xgboost_model_', '').replace('.json', '')
+            model_path = os.path.join(model_dir, model_file)
+
+            model = xgb.XGBRegressor()
+            model.load_model(model_path)
+            models[pollutant] = model
+
+        return models, feature_columns, label_encoders, normalization_params
+
+    except Exception as e:
+        st.error(f"Error loading models: {str(e)}")
+        return {}, [], {}, {}
+
+def _fetcher(func, cached):
+    """A Streamlit-cached fetcher, or the plain function behind it for worker threads."""
+    return func if cached else func.__wrapped__
+
+def _weather_inputs(lat, lon, cached=True):
+    """OpenWeather forecast steps for one location as a DataFrame."""
+    weather_data = _fetcher(fetch_openweather_forecast, cached)(lat, lon)
+    weather_rows = []
+    if weather_data and 'list' in weather_data:
+        for forecast in weather_data['list']:
+            weather_rows.append({
+                'weather_time': datetime.fromtimestamp(forecast['dt']),
+                'weather_temp': forecast['main']['temp'],
+                'weather_humidity': forecast['main']['humidity'],
+                'weather_pressure': forecast['main']['pressure'],
+                'weather_wind_speed': forecast['wind']['speed'],
+                'weather_clouds': forecast['clouds']['all']
+            })
+
+    return pd.DataFrame(weather_rows)
+
+def _tempo_inputs(locations, start_date, end_date, download=False, cached=True):
+    """
+    TEMPO features for several locations, constant over the horizon.
+
+    Box means for all North American locations come from one batched fetch.
+    Unless download is set, granules that are not indexed yet are not
+    waited for: they are indexed in the background and the climatology is
+    used until then. Features
+    filled from the climatology are listed, comma-separated, under
+    'filled_features'.
+
+    Returns:
+        list: One feature dict per location
+    """
+    # TEMPO only covers North America
+    tempo_locations = [
+        position for position, (lat, lon) in enumerate(locations) if in_tempo_coverage(lat, lon)
+    ]
+    tempo_results = {}
+    if tempo_locations:
+        bounding_boxes = [
+            (locations[position][1] - 0.5, locations[position][0] - 0.5,
+             locations[position][1] + 0.5, locations[position][0] + 0.5)
+            for position in tempo_locations
+        ]
+        tempo_results = dict(zip(
+            tempo_locations,
+            _fetcher(fetch_tempo_box_means, cached)(bounding_boxes, start_date, end_date, download=download)
+        ))
+
+    rows = []
+    for position in range(len(locations)):
+        static_features = {}
+        filled = []
+
+        tempo_data = tempo_results.get(position)
+        if tempo_data:
+            tempo_data = dict(tempo_data)
+            filled += [f'tempo_{key}' for key in tempo_data.pop('_filled', [])]
+            for key, value in tempo_data.items():
+                static_features[f'tempo_{key}'] = value
+
+        static_features['filled_features'] = ','.join(filled)
+        rows.append(static_features)
+
+    return rows
+
+def _merra2_inputs(locations, issue_day, cached=True):
+    """
+    MERRA-2 features for several locations.
+
+    Only the latest day(s) published by the issue day are read. The models
+    are trained on daily means from fetch_merra2_data, so the same daily
+    means are served for every forecast step.
+
+    Returns:
+        pd.DataFrame: 'location', the merra2_ features and 'merra2_filled'
+            with the features filled from the climatology
+    """
+    days = resolve_merra2_dates(issue_day)
+    start_date, end_date = days[0].strftime('%Y-%m-%d'), days[-1].strftime('%Y-%m-%d')
+    rows = []
+    for location, (lat, lon) in enumerate(locations):
+        merra_data = dict(_fetcher(fetch_merra2_data, cached)(lat, lon, start_date, end_date))
+        filled = merra_data.pop('_filled', [])
+        row = {f'merra2_{key}': value for key, value in merra_data.items()}
+        row.update(location=location, merra2_filled=','.join(f'merra2_{key}' for key in filled))
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def build_forecast_frame(locations, normalization_params=None, issue_time=None, include_weather=True,
+                         download_tempo=False, cached=True):
+    """
+    Build one feature matrix covering every location and forecast horizon.
+
+    Calendar, normalization and interaction features are computed column-wise
+    over the whole locations x issue times x horizons grid; only the external
+    data fetches (which are cached individually) run per location and, for
+    satellite data, per issue day. TEMPO box means of all locations are
+    fetched together per issue day; MERRA-2 comes from the latest published
+    day.
+
+    Args:
+        locations (list): (lat, lon) tuples
+        normalization_params (dict): Saved lat/lon normalization parameters
+        issue_time (datetime | list): Forecast start time, or several of
+            them for hindcasts; defaults to now
+        include_weather (bool): Fetch the OpenWeather forecast, which only
+            exists for upcoming days
+        download_tempo (bool): Wait for unindexed TEMPO granules to download
+            (offline hindcasts) instead of indexing them in the background
+        cached (bool): Go through the Streamlit caches of the data fetchers;
+            threads without a ScriptRunContext call the plain functions
+
+    Returns:
+        pd.DataFrame: One row per (location, issue time, horizon) with a
+            'location' index into locations, 'issue_time', 'lead_hours',
+            'forecast_time' and the model features
+    """
+    if not locations:
+        return pd.DataFrame()
+
+    if isinstance(issue_time, (list, tuple, np.ndarray, pd.Index, pd.Series)):
+        issue_times = pd.DatetimeIndex(issue_time)
+    else:
+        issue_times = pd.DatetimeIndex([issue_time or datetime.now()])
+
+    n_locations, n_issues, n_horizons = len(locations), len(issue_times), len(FORECAST_HORIZONS)
+    frame = pd.DataFrame({
+        'location': np.repeat(np.arange(n_locations), n_issues * n_horizons),
+        'issue_time': np.tile(np.repeat(issue_times.values.astype('datetime64[ns]'), n_horizons), n_locations),
+        'lead_hours': np.tile(FORECAST_HORIZONS, n_locations * n_issues)
+    })
+    frame['forecast_time'] = frame['issue_time'] + pd.to_timedelta(frame['lead_hours'], unit='h')
+    coordinates = np.asarray(locations, dtype=float)
+    frame['lat'] = coordinates[frame['location'], 0]
+    frame['lon'] = coordinates[frame['location'], 1]
+
+    # Satellite data for recent dates: one window per issue day
+    issue_days = frame['issue_time'].dt.normalize()
+    windows = issue_days.unique()
+    frame['window'] = issue_days.map({day: position for position, day in enumerate(windows)})
+
+    weather_frames = []
+    static_rows = []
+    merra2_frames = []
+    for location, (lat, lon) in enumerate(locations):
+        if include_weather:
+            weather = _weather_inputs(lat, lon, cached)
+            if not weather.empty:
+                weather_frames.append(weather.assign(location=location))
+
+    for window, day in enumerate(windows):
+        end = day - timedelta(days=TEMPO_SERVING_LAG_DAYS)
+        start_date = (end - timedelta(days=TEMPO_SERVING_DAYS - 1)).strftime('%Y-%m-%d')
+        end_date = end.strftime('%Y-%m-%d')
+        tempo_rows = _tempo_inputs(locations, start_date, end_date, download_tempo, cached)
+        for location, features in enumerate(tempo_rows):
+            static_rows.append(dict(features, location=location, window=window))
+        merra2_frames.append(_merra2_inputs(locations, day, cached).assign(window=window))
+
+    # Calendar features
+    times = frame['forecast_time'].dt
+    month = times.month
+    day = times.day
+    dayofweek = times.dayofweek
+    frame['year'] = times.year
+    frame['month'] = month
+    frame['day'] = day
+    frame['dayofweek'] = dayofweek
+    frame['dayofyear'] = times.dayofyear
+    frame['week'] = times.isocalendar().week.astype(int).values
+    frame['season'] = (month - 1) // 3
+    frame['is_weekend'] = (dayofweek >= 5).astype(int)
+    frame['month_sin'] = np.sin(2 * np.pi * month / 12)
+    frame['month_cos'] = np.cos(2 * np.pi * month / 12)
+    frame['day_sin'] = np.sin(2 * np.pi * day / 31)
+    frame['day_cos'] = np.cos(2 * np.pi * day / 31)
+    frame['dayofweek_sin'] = np.sin(2 * np.pi * dayofweek / 7)
+    frame['dayofweek_cos'] = np.cos(2 * np.pi * dayofweek / 7)
+
+    # Apply proper normalization using saved parameters
+    if normalization_params:
+        frame['lat_norm'] = (frame['lat'] - normalization_params.get('lat_mean', frame['lat'])) / normalization_params.get('lat_std', 1.0)
+        frame['lon_norm'] = (frame['lon'] - normalization_params.get('lon_mean', frame['lon'])) / normalization_params.get('lon_std', 1.0)
+
+        # Interaction features using normalized values
+        frame['lat_month'] = frame['lat_norm'] * month
+        frame['lon_month'] = frame['lon_norm'] * month
+        frame['lat_lon'] = frame['lat_norm'] * frame['lon_norm']
+    else:
+        # Fallback if normalization params not available
+        for col in ('lat_norm', 'lon_norm', 'lat_month', 'lon_month', 'lat_lon'):
+            frame[col] = 0.0
+
+    # Weather features from the closest forecast step of each location
+    if weather_frames:
+        weather = pd.concat(weather_frames, ignore_index=True).sort_values('weather_time')
+        weather['weather_time'] = weather['weather_time'].astype('datetime64[ns]')
+        frame = pd.merge_asof(
+            frame.sort_values('forecast_time'),
+            weather,
+            left_on='forecast_time',
+            right_on='weather_time',
+            by='location',
+            direction='nearest'
+        ).drop(columns='weather_time')
+        frame = frame.sort_values(['location', 'issue_time', 'forecast_time'], kind='stable').reset_index(drop=True)
+
+    # TEMPO features are constant over the horizon
+    static = pd.DataFrame(static_rows)
+    if len(static.columns) > 2:
+        frame = frame.merge(static, on=['location', 'window'], how='left')
+
+    # MERRA-2 daily means are constant over the horizon, like in training
+    frame = frame.merge(pd.concat(merra2_frames, ignore_index=True), on=['location', 'window'], how='left')
+    frame['filled_features'] = (
+        frame['filled_features'].fillna('') + ',' + frame.pop('merra2_filled').fillna('')
+    ).str.strip(',')
+    frame = frame.drop(columns='window')
+
+    # Create interaction features
+    if 'weather_temp' in frame and 'weather_humidity' in frame:
+        frame['temp_humidity_interaction'] = frame['weather_temp'] * frame['weather_humidity']
+
+    if 'merra2_U2M' in frame and 'merra2_V2M' in frame:
+        frame['wind_speed'] = np.sqrt(frame['merra2_U2M']**2 + frame['merra2_V2M']**2)
+
+    return frame
+
+@st.cache_data(ttl=1800)  # Cache for 30 minutes
+def fetch_forecast_features(lat, lon):
+    """Fetch all required features for forecasting a single location."""
+    normalization_params = load_models()[3]
+    return build_forecast_frame([(lat, lon)], normalization_params)
+
+def record_current_observations(lat, lon, observation_time=None):
+    """
+    Feed current observations into the shared per-location history buffer
+    and verify archived forecasts for the current hour against them.
+
+    Returns:
+        dict: Current concentration per pollutant in MODEL_UNITS
+    """
+    history_buffer = get_history_buffer()
+    observation_time = observation_time or datetime.now()
+    observations = parse_current_observations(fetch_air_quality_data(lat, lon))
+    for pollutant, value in observations.items():
+        history_buffer.update(lat, lon, pollutant, observation_time, value)
+
+    if observations:
+        try:
+            verify_observations(pd.DataFrame({
+                'lat': lat,
+                'lon': lon,
+                'pollutant': list(observations.keys()),
+                'time': pd.Timestamp(observation_time).floor('h'),
+                'value': list(observations.values())
+            }))
+        except OSError:
+            pass  # Verification is best-effort and must not break serving
+
+    return observations
+
+def stream_hourly_aqi(lat, lon, hourly_times, hourly_values, observations=None, history_buffer=None):
+    """
+    Regulatory AQI for every forecast hour, continuing the observed hours.
+
+    The engine is seeded with the buffered hourly observations before the
+    forecast, and the first forecast hour is replaced by the current
+    observation where one exists.
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        hourly_times (pd.DatetimeIndex): Hourly forecast timestamps
+        hourly_values (dict): Hourly forecast concentrations per pollutant
+        observations (dict): Current concentrations from record_current_observations
+        history_buffer (PollutantHistoryBuffer): Defaults to the shared buffer
+
+    Returns:
+        pd.DataFrame: Result of StreamingAQIEngine.run
+    """
+    history_buffer = history_buffer or get_history_buffer()
+    observations = observations or {}
+
+    series, history = {}, {}
+    for pollutant, values in hourly_values.items():
+        values = np.array(values, dtype=float)
+        observed = observations.get(pollutant)
+        if observed is not None and np.isfinite(observed):
+            values[0] = observed
+        series[pollutant] = values
+        history[pollutant] = history_buffer.recent_hours(lat, lon, pollutant, hourly_times[0])
+
+    return StreamingAQIEngine().run(
+        hourly_times,
+        series.get('PM2.5'),
+        series.get('O3'),
+        series.get('NO2'),
+        history=history
+    )
+
+def archive_issued_forecast(frame, predictions):
+    """Archive a served forecast for later verification (best-effort)."""
+    try:
+        archive_forecast(frame, predictions, MODEL_POLLUTANTS)
+    except OSError:
+        pass
+
+@st.cache_resource
+def get_drift_monitor(model_dir=MODEL_DIR):
+    """
+    Process-wide input drift monitor, or None if the models were saved
+    without a feature profile.
+
+    Lag features are looked up per pollutant inside predict_pollutants and
+    are not monitored here.
+    """
+    profile = load_feature_profile(model_dir)
+    if not profile:
+        return None
+
+    lag_columns = set(lag_feature_names())
+    profile = dict(profile, features={
+        col: feature for col, feature in profile['features'].items() if col not in lag_columns
+    })
+    return DriftMonitor(profile)
+
+_monitored_issues = OrderedDict()
+_monitored_lock = threading.Lock()
+MONITORED_ISSUES_SIZE = 4096
+
+def monitor_forecast_inputs(frame, feature_columns):
+    """
+    Add the inputs of a served forecast to the drift monitor (best-effort).
+
+    Each location and issue time is counted once, so page reruns serving
+    the same cached forecast do not outweigh other inputs.
+    """
+    monitor = get_drift_monitor()
+    if monitor is None or frame is None or len(frame) == 0:
+        return
+
+    keys = list(zip(frame['lat'].values, frame['lon'].values, pd.to_datetime(frame['issue_time']).values))
+    with _monitored_lock:
+        new_keys = {key for key in set(keys) if key not in _monitored_issues}
+        for key in new_keys:
+            _monitored_issues[key] = True
+        while len(_monitored_issues) > MONITORED_ISSUES_SIZE:
+            _monitored_issues.popitem(last=False)
+
+    if not new_keys:
+        return
+
+    keep = np.array([key in new_keys for key in keys])
+    rows = frame[keep]
+    monitor.update(rows.reindex(columns=feature_columns), rows.get('filled_features'))
+    try:
+        monitor.export()
+    except OSError:
+        pass
+
+def lag_features_for(frame, pollutant, history_buffer=None):
+    """
+    Lag and rolling features of one pollutant for every row of a feature matrix.
+
+    Args:
+        frame (pd.DataFrame): Rows with lat, lon and forecast_time
+        pollutant (str): 'PM2.5', 'O3' or 'NO2'
+        history_buffer (PollutantHistoryBuffer): Defaults to the shared buffer
+
+    Returns:
+        pd.DataFrame: One column per lag feature, aligned with frame rows
+    """
+    history_buffer = history_buffer or get_history_buffer()
+
+    # Features only change per location and day, so look each one up once
+    keys = pd.DataFrame({
+        'lat': frame['lat'].values,
+        'lon': frame['lon'].values,
+        'day': pd.to_datetime(frame['forecast_time']).dt.normalize().values
+    })
+    codes = keys.groupby(['lat', 'lon', 'day'], sort=False).ngroup().values
+    unique_keys = keys.drop_duplicates()
+
+    values = pd.DataFrame([
+        history_buffer.features(row_lat, row_lon, pollutant, day)
+        for row_lat, row_lon, day in zip(unique_keys['lat'], unique_keys['lon'], unique_keys['day'])
+    ], columns=lag_feature_names())
+
+    return values.iloc[codes].reset_index(drop=True)
+
+@st.cache_resource
+def load_model_unit_scales(model_dir=MODEL_DIR):
+    """
+    Multipliers from each model's output units into MODEL_UNITS.
+
+    Models saved before train_model.py wrote model_units.json were trained
+    on raw AQS values, so their ozone is in ppm.
+
+    Returns:
+        dict: Scale per model key (1.0 for models trained in MODEL_UNITS)
+    """
+    units = LEGACY_MODEL_UNITS
+    units_path = os.path.join(model_dir, 'model_units.json')
+    if os.path.exists(units_path):
+        with open(units_path, 'r') as f:
+            units = json.load(f)
+
+    return {
+        model_key: unit_scale(units.get(pollutant), pollutant)
+        for model_key, pollutant in MODEL_POLLUTANTS.items()
+    }
+
+def predict_pollutants(frame, models, feature_columns, lag_values=None, unit_scales=None,
+                       history_buffer=None):
+    """
+    Run every pollutant model once over a (multi-location) feature matrix.
+
+    Lag features are given in MODEL_UNITS and predictions are returned in
+    MODEL_UNITS, converting both for models trained in other units.
+
+    Args:
+        frame (pd.DataFrame): Result of build_forecast_frame
+        models (dict): Models keyed by pollutant file suffix
+        feature_columns (list): Feature order the models were trained on
+        lag_values (dict): Precomputed lag_features_for result per pollutant;
+            looked up in the history buffer when omitted
+        unit_scales (dict): Defaults to load_model_unit_scales()
+        history_buffer (PollutantHistoryBuffer): Defaults to the shared buffer
+
+    Returns:
+        tuple: (predictions dict of arrays aligned with frame rows,
+            list of missing feature columns, dict of errors per pollutant)
+    """
+    missing_features = [col for col in feature_columns if col not in frame.columns]
+    X = frame.reindex(columns=feature_columns).fillna(0)
+
+    lag_columns = [col for col in lag_feature_names() if col in feature_columns]
+
+    unit_scales = unit_scales if unit_scales is not None else load_model_unit_scales()
+
+    predictions = {}
+    errors = {}
+    for pollutant, model in models.items():
+        scale = unit_scales.get(pollutant, 1.0)
+        try:
+            X_forecast = X
+
+            # Lag features are specific to the pollutant each model predicts
+            if lag_columns:
+                history_key = MODEL_POLLUTANTS.get(pollutant, pollutant)
+                if lag_values is not None and history_key in lag_values:
+                    pollutant_lags = lag_values[history_key]
+                else:
+                    pollutant_lags = lag_features_for(frame, history_key, history_buffer)
+                X_forecast = X.copy()
+                X_forecast[lag_columns] = pollutant_lags[lag_columns].fillna(0).values / scale
+
+            predictions[pollutant] = model.predict(X_forecast) * scale
+        except Exception as e:
+            errors[pollutant] = str(e)
+
+    return predictions, missing_features, errors
+
+def forecast_many(cities, issue_time=None):
+    """
+    Forecast several cities in one batch.
+
+    All cities share the same horizon grid, so a single feature matrix is
+    built and each pollutant model runs once over every city and lead time.
+    AQI is then computed vectorized over the whole result.
+
+    Args:
+        cities (list): Dicts with 'name', 'lat' and 'lon'
+        issue_time (datetime): Forecast start time, defaults to now
+
+    Returns:
+        pd.DataFrame: city, time, lat, lon, PM2.5, O3, NO2 and AQI per
+            (city, horizon); empty if no models are available
+    """
+    models, feature_columns, _, normalization_params = load_models()
+    if not cities or not models:
+        return pd.DataFrame()
+
+    locations = [(city['lat'], city['lon']) for city in cities]
+    for lat, lon in locations:
+        record_current_observations(lat, lon)
+
+    frame = build_forecast_frame(locations, normalization_params, issue_time)
+    predictions, _, _ = predict_pollutants(frame, models, feature_columns)
+    archive_issued_forecast(frame, predictions)
+    monitor_forecast_inputs(frame, feature_columns)
+
+    result = pd.DataFrame({
+        'city': np.array([city['name'] for city in cities], dtype=object)[frame['location']],
+        'time': frame['forecast_time'],
+        'lat': frame['lat'],
+        'lon': frame['lon']
+    })
+    for model_key, pollutant in MODEL_POLLUTANTS.items():
+        result[pollutant] = predictions.get(model_key, np.full(len(frame), np.nan))
+
+    result['AQI'] = calculate_aqi_arrays(result['PM2.5'], result['O3'], result['NO2'])['Overall']
+
+    return result
+
+_city_forecast_cache = OrderedDict()
+_city_forecast_lock = threading.Lock()
+CITY_FORECAST_CACHE_SIZE = 512
+
+def forecast_cell_key(lat, lon, grid_deg=FORECAST_GRID_DEG):
+    """Grid cell a location falls into."""
+    return (int(np.floor(lat / grid_deg)), int(np.floor(lon / grid_deg)))
+
+def forecast_hour_bucket(now=None):
+    """Issue time shared by all forecasts made within the same hour."""
+    return (now or datetime.now()).replace(minute=0, second=0, microsecond=0)
+
+def forecast_cities(cities, now=None):
+    """
+    Forecasts for several cities, cached per city.
+
+    Results are memoized per (grid cell, hour bucket), so adding a city only
+    forecasts that city, and removing or reordering cities is free. Cities
+    missing from the cache are still forecast together in one forecast_many
+    batch.
+
+    Args:
+        cities (list): Dicts with 'name', 'lat' and 'lon'
+        now (datetime): Current time, defaults to now
+
+    Returns:
+        pd.DataFrame: Same columns as forecast_many, in city order
+    """
+    if not cities:
+        return pd.DataFrame()
+
+    issue_time = forecast_hour_bucket(now)
+    keys = [(forecast_cell_key(city['lat'], city['lon']), issue_time) for city in cities]
+
+    cached = {}
+    with _city_forecast_lock:
+        for key in keys:
+            if key in _city_forecast_cache:
+                _city_forecast_cache.move_to_end(key)
+                cached[key] = _city_forecast_cache[key]
+
+    # One representative city per uncached cell
+    pending = {}
+    for key, city in zip(keys, cities):
+        if key not in cached and key not in pending:
+            pending[key] = city
+
+    if pending:
+        batch = forecast_many(list(pending.values()), issue_time=issue_time)
+        if batch.empty:
+            return batch
+
+        # forecast_many returns one block of horizons per city, in order
+        horizons = len(FORECAST_HORIZONS)
+        for position, key in enumerate(pending):
+            rows = batch.iloc[position * horizons:(position + 1) * horizons]
+            cached[key] = rows.drop(columns=['city', 'lat', 'lon']).reset_index(drop=True)
+
+        with _city_forecast_lock:
+            for key in pending:
+                _city_forecast_cache[key] = cached[key]
+            while len(_city_forecast_cache) > CITY_FORECAST_CACHE_SIZE:
+                _city_forecast_cache.popitem(last=False)
+
+    return pd.concat(
+        [cached[key].assign(city=city['name'], lat=city['lat'], lon=city['lon']) for key, city in zip(keys, cities)],
+        ignore_index=True
+    )[['city', 'time', 'lat', 'lon', 'PM2.5', 'O3', 'NO2', 'AQI']]
+
+def clear_forecast_cache():
+    """Drop all cached per-city forecasts."""
+    with _city_forecast_lock:
+        _city_forecast_cache.clear()
+
+# Speculative forecasts kept per (location, hour bucket)
+PREFETCH_CACHE_SIZE = 64
+
+# Background threads computing speculative forecasts
+PREFETCH_WORKERS = 2
+
+# Longest the Forecast page waits for a prefetch still in flight
+PREFETCH_WAIT_SECONDS = 120
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='forecast-prefetch')
+_prefetch_cache = OrderedDict()
+_prefetch_misses = OrderedDict()
+_prefetch_lock = threading.Lock()
+_prefetch_stats = {'issued': 0, 'ready_hits': 0, 'in_flight_hits': 0, 'misses': 0, 'wasted': 0, 'failed': 0}
+
+def _prefetch_key(lat, lon, now=None):
+    return (round(lat, 4), round(lon, 4), forecast_hour_bucket(now))
+
+def predict_forecast(frame, models, feature_columns, unit_scales=None, history_buffer=None):
+    """
+    Predictions for a single-location feature frame, as shown by the Forecast page.
+
+    Returns:
+        dict: 'frame', 'predictions', 'missing_features' and 'errors' as
+            returned by predict_pollutants
+    """
+    predictions, missing_features, errors = {}, [], {}
+    if not frame.empty:
+        predictions, missing_features, errors = predict_pollutants(
+            frame, models, feature_columns, unit_scales=unit_scales, history_buffer=history_buffer
+        )
+    return {'frame': frame, 'predictions': predictions, 'missing_features': missing_features, 'errors': errors}
+
+def _prefetch_location(lat, lon, models, feature_columns, normalization_params, unit_scales, history_buffer):
+    """
+    Forecast one location on a prefetch thread.
+
+    Runs without a ScriptRunContext, so no Streamlit cache is touched: the
+    models, unit scales and history buffer are resolved by the caller and
+    the data fetchers are called directly.
+    """
+    frame = build_forecast_frame([(lat, lon)], normalization_params, cached=False)
+    if frame.empty:
+        raise ValueError(f'No forecast features for {lat:.4f}, {lon:.4f}')
+    return predict_forecast(frame, models, feature_columns, unit_scales, history_buffer)
+
+def _discard_failed_prefetch(key, future):
+    """Drop a prefetch that raised or was cancelled so it can be retried."""
+    if not future.cancelled() and future.exception() is None:
+        return
+    with _prefetch_lock:
+        entry = _prefetch_cache.get(key)
+        if entry is not None and entry['future'] is future:
+            del _prefetch_cache[key]
+            _prefetch_stats['failed'] += 1
+
+def prefetch_forecast(lat, lon):
+    """
+    Start forecasting a location in the background.
+
+    Called as soon as a location is resolved, so the Forecast page usually
+    finds the features and predictions ready or in flight instead of
+    starting from scratch.
+
+    Returns:
+        bool: True if a new prefetch was started
+    """
+    models, feature_columns, _, normalization_params = load_models()
+    if not models:
+        return False
+
+    key = _prefetch_key(lat, lon)
+    with _prefetch_lock:
+        if key in _prefetch_cache:
+            _prefetch_cache.move_to_end(key)
+            return False
+
+        future = _prefetch_executor.submit(
+            _prefetch_location, lat, lon, models, feature_columns, normalization_params,
+            load_model_unit_scales(), get_history_buffer()
+        )
+        _prefetch_cache[key] = {'future': future, 'used': False}
+        _prefetch_stats['issued'] += 1
+        while len(_prefetch_cache) > PREFETCH_CACHE_SIZE:
+            _, evicted = _prefetch_cache.popitem(last=False)
+            if not evicted['used']:
+                _prefetch_stats['wasted'] += 1
+
+    # Outside the lock: the callback runs immediately if the future is already done
+    future.add_done_callback(lambda done: _discard_failed_prefetch(key, done))
+    return True
+
+def forecast_for(lat, lon):
+    """
+    Forecast of a location, from a speculative prefetch when there is one.
+
+    The first request for a prefetched location counts as a ready or
+    in-flight hit; the first request for any other location counts as a
+    miss. Reruns of the same page are not counted again. Misses are only
+    remembered for counting and do not stop later prefetches.
+
+    Returns:
+        dict: Same as predict_forecast
+    """
+    key = _prefetch_key(lat, lon)
+    with _prefetch_lock:
+        entry = _prefetch_cache.get(key)
+        if entry is None:
+            if key not in _prefetch_misses:
+                _prefetch_misses[key] = True
+                _prefetch_stats['misses'] += 1
+                while len(_prefetch_misses) > PREFETCH_CACHE_SIZE:
+                    _prefetch_misses.popitem(last=False)
+        else:
+            if not entry['used']:
+                entry['used'] = True
+                _prefetch_stats['ready_hits' if entry['future'].done() else 'in_flight_hits'] += 1
+            _prefetch_cache.move_to_end(key)
+
+    if entry is not None:
+        try:
+            forecast = entry['future'].result(timeout=PREFETCH_WAIT_SECONDS)
+            return dict(forecast, frame=forecast['frame'].copy(), predictions=dict(forecast['predictions']))
+        except Exception:
+            pass
+
+    models, feature_columns, _, _ = load_models()
+    return predict_forecast(fetch_forecast_features(lat, lon), models, feature_columns)
+
+def clear_prefetch_cache():
+    """Drop all speculative forecasts; unused ones are counted as wasted."""
+    with _prefetch_lock:
+        pending = [entry['future'] for entry in _prefetch_cache.values() if not entry['used']]
+        _prefetch_stats['wasted'] += len(pending)
+        _prefetch_cache.clear()
+        _prefetch_misses.clear()
+
+    # Cancelling runs the done callbacks, which take the lock themselves
+    for future in pending:
+        future.cancel()
+
+def prefetch_stats():
+    """
+    Counters of the speculative prefetches made by this server process.
+
+    Returns:
+        dict: issued, ready_hits, in_flight_hits, misses, wasted and failed counts,
+            plus hit_rate (share of forecast requests served by a prefetch)
+            and accuracy (share of prefetches that were used)
+    """
+    with _prefetch_lock:
+        stats = dict(_prefetch_stats)
+        pending = sum(1 for entry in _prefetch_cache.values() if not entry['used'])
+    hits = stats['ready_hits'] + stats['in_flight_hits']
+    requests = hits + stats['misses']
+    settled = stats['issued'] - pending - stats['failed']
+    stats['hit_rate'] = hits / requests if requests else 0.0
+    stats['accuracy'] = hits / settled if settled else 0.0
+    return stats
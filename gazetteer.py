@@ -0,0 +1,337 @@
+import pandas as pd
+import numpy as np
+import requests
+import pytz
+import os
+import io
+import re
+import csv
+import sys
+import json
+import time
+import hashlib
+import bisect
+import difflib
+import zipfile
+import threading
+import unicodedata
+
+GAZETTEER_PATH = os.path.join('data', 'gazetteer', 'cities15000.txt')
+GAZETTEER_INDEX_PATH = os.path.join('cache', 'gazetteer', 'index.npz')
+GEOCODE_CACHE_PATH = os.path.join('cache', 'geocode_cache.json')
+
+# GeoNames dump of all places with 15,000 or more inhabitants
+GAZETTEER_URL = 'https://download.geonames.org/export/dump/cities15000.zip'
+
+# Suggestions returned for a partial name
+SUGGESTION_LIMIT = 8
+
+# Similarity a misspelt name needs to be suggested
+SUGGESTION_CUTOFF = 0.75
+
+# Columns of a GeoNames table (tab-separated, no header)
+GEONAMES_COLUMNS = [
+    'geonameid', 'name', 'asciiname', 'alternatenames', 'latitude', 'longitude',
+    'feature_class', 'feature_code', 'country_code', 'cc2', 'admin1_code',
+    'admin2_code', 'admin3_code', 'admin4_code', 'population', 'elevation',
+    'dem', 'timezone', 'modification_date'
+]
+
+_NON_WORD = re.compile(r'[^\w\s]')
+
+def normalize_name(text):
+    """Lowercase a place name and strip accents, punctuation and extra spaces."""
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return ' '.join(_NON_WORD.sub(' ', text.lower()).split())
+
+def name_hash(name):
+    """Stable 64-bit hash of a normalized name."""
+    return int.from_bytes(hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest(), 'little')
+
+# Normalized country name -> ISO code, for queries like "Accra, Ghana"
+_COUNTRY_CODES = {normalize_name(name): code.lower() for code, name in pytz.country_names.items()}
+_COUNTRY_CODES.update({'usa': 'us', 'united states of america': 'us', 'uk': 'gb', 'england': 'gb'})
+
+class Gazetteer:
+    """
+    In-memory place index built from a GeoNames table.
+
+    Places are stored as parallel arrays sorted by population, largest
+    first, so a place's position is also its rank. Every spelling of a
+    place (its name, ASCII name and alternate names) is normalized and
+    hashed to 64 bits; the hashes are kept sorted next to the position of
+    their place, so a lookup is one hash and a binary search, and all
+    places sharing a name come out already ranked by population.
+
+    For autocomplete, the normalized primary names are also kept in a
+    sorted list: the names starting with a prefix form one contiguous range
+    found with two binary searches.
+    """
+
+    def __init__(self, names, countries, admin1, lat, lon, population, key_hashes, key_places):
+        self.names = names
+        self.countries = countries
+        self.admin1 = admin1
+        self.lat = lat
+        self.lon = lon
+        self.population = population
+        self.key_hashes = key_hashes
+        self.key_places = key_places
+        self._prefix_index = None
+
+    @classmethod
+    def from_geonames(cls, path):
+        """
+        Build the index from a GeoNames table such as cities15000.txt.
+
+        Args:
+            path (str): Tab-separated GeoNames file
+
+        Returns:
+            Gazetteer: The index
+        """
+        places = pd.read_csv(
+            path, sep='\t', header=None, names=GEONAMES_COLUMNS,
+            usecols=['name', 'asciiname', 'alternatenames', 'latitude', 'longitude',
+                     'country_code', 'admin1_code', 'population'],
+            dtype={'alternatenames': str, 'country_code': str, 'admin1_code': str},
+            quoting=csv.QUOTE_NONE, keep_default_na=False, encoding='utf-8'
+        )
+        places['population'] = pd.to_numeric(places['population'], errors='coerce').fillna(0).astype(np.int64)
+        places = places.sort_values('population', ascending=False, kind='stable').reset_index(drop=True)
+
+        hashes = []
+        positions = []
+        for position, (name, asciiname, alternates) in enumerate(
+            zip(places['name'], places['asciiname'], places['alternatenames'])
+        ):
+            spellings = {normalize_name(name), normalize_name(asciiname)}
+            spellings.update(normalize_name(alternate) for alternate in alternates.split(',') if alternate)
+            spellings.discard('')
+            hashes.extend(name_hash(spelling) for spelling in spellings)
+            positions.extend([position] * len(spellings))
+
+        key_hashes = np.array(hashes, dtype=np.uint64)
+        key_places = np.array(positions, dtype=np.int32)
+        order = np.lexsort((key_places, key_hashes))
+
+        return cls(
+            places['name'].values.astype(str),
+            places['country_code'].str.lower().values.astype(str),
+            places['admin1_code'].str.lower().values.astype(str),
+            places['latitude'].values.astype(np.float64),
+            places['longitude'].values.astype(np.float64),
+            places['population'].values,
+            key_hashes[order],
+            key_places[order]
+        )
+
+    def save(self, path):
+        """Write the index as an .npz file."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez(
+            path + '.tmp.npz',
+            names=self.names,
+            countries=self.countries,
+            admin1=self.admin1,
+            lat=self.lat,
+            lon=self.lon,
+            population=self.population,
+            key_hashes=self.key_hashes,
+            key_places=self.key_places
+        )
+        os.replace(path + '.tmp.npz', path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save."""
+        with np.load(path) as data:
+            return cls(
+                data['names'], data['countries'], data['admin1'], data['lat'], data['lon'],
+                data['population'], data['key_hashes'], data['key_places']
+            )
+
+    def place(self, position):
+        """Place at a rank as a dict with name, country, admin1, lat, lon and population."""
+        return {
+            'name': str(self.names[position]),
+            'country': str(self.countries[position]).upper(),
+            'admin1': str(self.admin1[position]).upper(),
+            'lat': float(self.lat[position]),
+            'lon': float(self.lon[position]),
+            'population': int(self.population[position])
+        }
+
+    def candidates(self, name):
+        """Ranks of the places with a spelling equal to name, most populous first."""
+        key = np.uint64(name_hash(normalize_name(name)))
+        start = np.searchsorted(self.key_hashes, key, side='left')
+        end = np.searchsorted(self.key_hashes, key, side='right')
+        return self.key_places[start:end]
+
+    def lookup(self, query):
+        """
+        Most populous place matching a query.
+
+        Text after a comma narrows the match: each part must be the place's
+        country (ISO code or name) or its first-level admin code, as in
+        "Accra, Ghana" or "Portland, OR, US".
+
+        Args:
+            query (str): Place name, optionally followed by qualifiers
+
+        Returns:
+            dict: The place (see place), or None if nothing matches
+        """
+        name, *qualifiers = query.split(',')
+        positions = self.candidates(name)
+        for qualifier in filter(None, map(normalize_name, qualifiers)):
+            code = _COUNTRY_CODES.get(qualifier, qualifier)
+            positions = positions[(self.countries[positions] == code) | (self.admin1[positions] == qualifier)]
+
+        if len(positions) == 0:
+            return None
+        return self.place(int(positions.min()))
+
+    def nearest(self, lat, lon):
+        """Place closest to a location, or None if the index is empty."""
+        if len(self.lat) == 0:
+            return None
+        # Equirectangular distance is accurate enough between neighbouring places
+        d_lat = self.lat - lat
+        d_lon = (self.lon - lon + 180) % 360 - 180
+        distance = d_lat ** 2 + (d_lon * np.cos(np.radians(lat))) ** 2
+        return self.place(int(np.argmin(distance)))
+
+    def prefix_index(self):
+        """Sorted normalized names and the rank of each, built on first use."""
+        if self._prefix_index is None:
+            keys = [normalize_name(name) for name in self.names]
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._prefix_index = ([keys[position] for position in order], np.array(order, dtype=np.int32))
+        return self._prefix_index
+
+    def suggest(self, text, limit=SUGGESTION_LIMIT, cutoff=SUGGESTION_CUTOFF):
+        """
+        Places for a partially typed name.
+
+        Places whose name starts with text come first, most populous first.
+        If there are none, names sharing its first letter whose beginning is
+        a close spelling of text are suggested instead, best match first.
+
+        Args:
+            text (str): What has been typed so far
+            limit (int): Maximum number of places
+            cutoff (float): Minimum similarity (0-1) of a misspelt match
+
+        Returns:
+            list: Places as returned by place
+        """
+        prefix = normalize_name(text)
+        if not prefix:
+            return []
+
+        keys, ranks = self.prefix_index()
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\U0010ffff')
+        if end > start:
+            matches = ranks[start:end]
+            if len(matches) > limit:
+                matches = np.partition(matches, limit - 1)[:limit]
+            return [self.place(int(rank)) for rank in np.sort(matches)]
+
+        start = bisect.bisect_left(keys, prefix[0])
+        end = bisect.bisect_left(keys, prefix[0] + '\U0010ffff')
+        matcher = difflib.SequenceMatcher(b=prefix)
+        scored = []
+        for key, rank in zip(keys[start:end], ranks[start:end]):
+            matcher.set_seq1(key[:len(prefix)])
+            if matcher.real_quick_ratio() >= cutoff and matcher.quick_ratio() >= cutoff:
+                ratio = matcher.ratio()
+                if ratio >= cutoff:
+                    scored.append((-ratio, int(rank)))
+        return [self.place(rank) for _, rank in sorted(scored)[:limit]]
+
+def place_label(place):
+    """Display name of a place, e.g. "Springfield, IL, US" or "Accra, GH"."""
+    if place['admin1'].isalpha():
+        return f"{place['name']}, {place['admin1']}, {place['country']}"
+    return f"{place['name']}, {place['country']}"
+
+_gazetteer = None
+_gazetteer_lock = threading.Lock()
+
+def get_gazetteer(path=GAZETTEER_PATH, index_path=GAZETTEER_INDEX_PATH):
+    """
+    Process-wide gazetteer, or None if no GeoNames table is installed.
+
+    The table is parsed once and the index saved to index_path; later
+    processes load the saved index unless the table is newer.
+    """
+    global _gazetteer
+    with _gazetteer_lock:
+        if _gazetteer is None and os.path.exists(path):
+            if os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+                _gazetteer = Gazetteer.load(index_path)
+            else:
+                _gazetteer = Gazetteer.from_geonames(path)
+                _gazetteer.save(index_path)
+    return _gazetteer
+
+_geocode_cache = None
+_geocode_lock = threading.Lock()
+
+def _load_geocode_cache(path):
+    global _geocode_cache
+    if _geocode_cache is None:
+        _geocode_cache = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                _geocode_cache = json.load(f)
+    return _geocode_cache
+
+def cached_geocode(query, path=GEOCODE_CACHE_PATH):
+    """(lat, lon) stored for a query by remember_geocode, or None."""
+    with _geocode_lock:
+        coordinates = _load_geocode_cache(path).get(normalize_name(query))
+    return tuple(coordinates) if coordinates else None
+
+def remember_geocode(query, coordinates, path=GEOCODE_CACHE_PATH):
+    """Persist the coordinates an online geocoder returned for a query."""
+    with _geocode_lock:
+        cache = _load_geocode_cache(path)
+        cache[normalize_name(query)] = [float(coordinates[0]), float(coordinates[1])]
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(path + '.tmp', path)
+
+def main():
+    """
+    Download the GeoNames table and build the gazetteer index.
+
+    Usage:
+        python gazetteer.py [--download]
+    """
+    print("Building Mframapa AI gazetteer...")
+    print("=" * 60)
+
+    if '--download' in sys.argv[1:] or not os.path.exists(GAZETTEER_PATH):
+        print(f"Downloading {GAZETTEER_URL}...")
+        response = requests.get(GAZETTEER_URL, timeout=120)
+        response.raise_for_status()
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            os.makedirs(os.path.dirname(GAZETTEER_PATH), exist_ok=True)
+            with open(GAZETTEER_PATH, 'wb') as f:
+                f.write(archive.read(os.path.basename(GAZETTEER_PATH)))
+
+    started = time.time()
+    gazetteer = Gazetteer.from_geonames(GAZETTEER_PATH)
+    gazetteer.save(GAZETTEER_INDEX_PATH)
+    print(f"Indexed {len(gazetteer.names):,} places and {len(gazetteer.key_hashes):,} spellings "
+          f"in {time.time() - started:.1f}s")
+    print(f"Saved index to {GAZETTEER_INDEX_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+import pandas as pd
+import numpy as np
+from datetime import datetime, timedelta
+import os
+import sys
+import time
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from utils import (
+    PollutantHistoryBuffer,
+    calculate_aqi_arrays,
+    get_lat_lon
+)
+from forecasting import (
+    FORECAST_HORIZONS,
+    MODEL_POLLUTANTS,
+    load_models,
+    build_forecast_frame,
+    lag_features_for,
+    predict_pollutants
+)
+from historical_store import query_history
+
+HINDCAST_DIR = os.path.join('data', 'hindcast')
+
+# Feature rows per model call and per output write
+HINDCAST_CHUNK_ROWS = 50_000
+
+HINDCAST_SCHEMA = pa.schema([
+    ('issue_time', pa.timestamp('ms')),
+    ('forecast_time', pa.timestamp('ms')),
+    ('lead_hours', pa.int16()),
+    ('lat', pa.float32()),
+    ('lon', pa.float32()),
+    ('PM2.5', pa.float32()),
+    ('O3', pa.float32()),
+    ('NO2', pa.float32()),
+    ('AQI', pa.float32()),
+    ('city', pa.string()),
+    ('year', pa.int16())
+])
+
+HINDCAST_PARTITIONING = ds.partitioning(
+    pa.schema([('city', pa.string()), ('year', pa.int16())]),
+    flavor='hive'
+)
+
+def hindcast_locations(names=None):
+    """
+    Resolve hindcast locations.
+
+    Cities in the historical store use the mean position of their sites;
+    other names are geocoded.
+
+    Args:
+        names (list): City names, all stored cities if None
+
+    Returns:
+        list: Dicts with 'name', 'lat' and 'lon'
+    """
+    stored = query_history(cities=names, columns=('lat', 'lon'))
+    positions = stored.groupby('city')[['lat', 'lon']].mean()
+
+    locations = []
+    for name in (names if names is not None else positions.index):
+        if name in positions.index:
+            locations.append({'name': name, 'lat': float(positions.loc[name, 'lat']),
+                              'lon': float(positions.loc[name, 'lon'])})
+        else:
+            coordinates = get_lat_lon(name)
+            if coordinates:
+                locations.append({'name': name, 'lat': coordinates[0], 'lon': coordinates[1]})
+            else:
+                print(f"Skipping {name}: location not found")
+
+    return locations
+
+def hindcast_dataset(output_dir=HINDCAST_DIR):
+    """Open hindcast output as a pyarrow dataset, or None if there is none."""
+    if not os.path.isdir(output_dir) or not os.listdir(output_dir):
+        return None
+
+    return ds.dataset(output_dir, schema=HINDCAST_SCHEMA, format='parquet', partitioning=HINDCAST_PARTITIONING)
+
+def clear_hindcast_range(cities, start, end, output_dir=HINDCAST_DIR):
+    """
+    Remove earlier hindcast rows of the cities issued between start and end.
+
+    Only files in the affected city/year partitions are opened; files fully
+    inside the range are deleted and partially overlapping ones rewritten,
+    so re-running a range replaces its results instead of duplicating them.
+    """
+    dataset = hindcast_dataset(output_dir)
+    if dataset is None:
+        return
+
+    partition_filter = (
+        ds.field('city').isin(list(cities))
+        & (ds.field('year') >= start.year) & (ds.field('year') <= end.year)
+    )
+    overlap = (ds.field('issue_time') >= pd.Timestamp(start)) & (ds.field('issue_time') <= pd.Timestamp(end))
+
+    for fragment in dataset.get_fragments(filter=partition_filter):
+        table = fragment.to_table(schema=dataset.schema)
+        kept = table.filter(~overlap)
+        if kept.num_rows == 0:
+            os.remove(fragment.path)
+        elif kept.num_rows < table.num_rows:
+            pq.write_table(kept.select(fragment.physical_schema.names), fragment.path)
+
+def write_hindcast_chunk(chunk, output_dir, chunk_id):
+    """Write one chunk of hindcast rows to the partitioned output."""
+    chunk = chunk.assign(year=chunk['issue_time'].dt.year)
+    table = pa.Table.from_pandas(
+        chunk[HINDCAST_SCHEMA.names], schema=HINDCAST_SCHEMA, preserve_index=False
+    )
+    ds.write_dataset(
+        table,
+        output_dir,
+        format='parquet',
+        partitioning=HINDCAST_PARTITIONING,
+        existing_data_behavior='overwrite_or_ignore',
+        basename_template=f'hindcast-{chunk_id}-{{i}}.parquet'
+    )
+    return table.num_rows
+
+def run_hindcast(locations, start, end, every_hours=24, output_dir=HINDCAST_DIR,
+                 chunk_rows=HINDCAST_CHUNK_ROWS):
+    """
+    Sweep past issue times through the feature builder and models.
+
+    Issue times are processed in order, in chunks of about chunk_rows
+    feature rows. Each chunk is built by one build_forecast_frame call,
+    every model runs once over it and the results are written out, keeping
+    memory bounded by the chunk size. Before each issue day, observations of
+    the preceding days are replayed into a private history buffer, so lag
+    features only use data that was available at issue time.
+
+    Args:
+        locations (list): Dicts with 'name', 'lat' and 'lon'
+        start (datetime): First issue time
+        end (datetime): Last issue time
+        every_hours (int): Hours between issue times
+        output_dir (str): Root of the partitioned output
+        chunk_rows (int): Feature rows per model call and output write
+
+    Returns:
+        dict: 'rows' written, 'seconds' elapsed and 'rows_per_second'
+    """
+    models, feature_columns, _, normalization_params = load_models()
+    if not models:
+        print("ERROR: No models loaded, run train_model.py first")
+        return None
+
+    if not locations:
+        print("ERROR: No hindcast locations")
+        return None
+
+    names = np.array([location['name'] for location in locations], dtype=object)
+    coordinates = [(location['lat'], location['lon']) for location in locations]
+
+    # Observations from the week before the first issue time onwards
+    observations = query_history(
+        cities=list(names), start=start - timedelta(days=8), end=end,
+        columns=('date', 'value')
+    )
+    observations['day'] = pd.to_datetime(observations['date']).dt.normalize()
+    observations = observations.groupby(['day', 'city', 'pollutant'], as_index=False)['value'].mean()
+    observations_by_day = {day: rows for day, rows in observations.groupby('day')}
+    replay_days = iter(sorted(observations_by_day))
+    next_day = next(replay_days, None)
+    city_positions = {location['name']: (location['lat'], location['lon']) for location in locations}
+
+    clear_hindcast_range(list(names), start, end, output_dir)
+    run_id = time.time_ns()
+
+    history_buffer = PollutantHistoryBuffer()
+    pollutants = [MODEL_POLLUTANTS.get(key, key) for key in models]
+
+    issue_times = pd.date_range(start, end, freq=f'{every_hours}h')
+    issues_per_chunk = max(1, chunk_rows // (len(locations) * len(FORECAST_HORIZONS)))
+    print(f"Hindcasting {len(issue_times)} issue times for {len(locations)} locations")
+
+    started = time.time()
+    rows_written = 0
+
+    for chunk_start in range(0, len(issue_times), issues_per_chunk):
+        chunk_issues = issue_times[chunk_start:chunk_start + issues_per_chunk]
+        chunk = build_forecast_frame(
+            coordinates, normalization_params, chunk_issues, include_weather=False, download_tempo=True
+        )
+
+        # Lag features as they were known on each issue day
+        chunk_lags = {pollutant: [] for pollutant in pollutants}
+        positions = []
+        for issue_day, rows in chunk.groupby(chunk['issue_time'].dt.normalize(), sort=True):
+            while next_day is not None and next_day < issue_day:
+                for row in observations_by_day[next_day].itertuples(index=False):
+                    lat, lon = city_positions[row.city]
+                    history_buffer.update(lat, lon, row.pollutant, next_day, row.value)
+                next_day = next(replay_days, None)
+
+            positions.append(rows.index.values)
+            for pollutant in pollutants:
+                chunk_lags[pollutant].append(lag_features_for(rows, pollutant, history_buffer))
+
+        order = np.argsort(np.concatenate(positions), kind='stable')
+        chunk_lags = {
+            pollutant: pd.concat(frames, ignore_index=True).iloc[order].reset_index(drop=True)
+            for pollutant, frames in chunk_lags.items()
+        }
+
+        predictions, _, errors = predict_pollutants(chunk, models, feature_columns, chunk_lags)
+        for pollutant, error in errors.items():
+            print(f"  Could not predict {pollutant}: {error}")
+
+        result = pd.DataFrame({
+            'issue_time': chunk['issue_time'],
+            'forecast_time': chunk['forecast_time'],
+            'lead_hours': chunk['lead_hours'],
+            'lat': chunk['lat'],
+            'lon': chunk['lon'],
+            'city': names[chunk['location']]
+        })
+        for model_key, pollutant in MODEL_POLLUTANTS.items():
+            result[pollutant] = predictions.get(model_key, np.full(len(chunk), np.nan))
+        result['AQI'] = calculate_aqi_arrays(result['PM2.5'], result['O3'], result['NO2'])['Overall']
+
+        rows_written += write_hindcast_chunk(result, output_dir, f"{run_id}-{chunk_start}")
+
+        elapsed = time.time() - started
+        print(f"  {rows_written} rows through {chunk_issues[-1]:%Y-%m-%d %H:%M} ({rows_written / elapsed:.0f} rows/s)")
+
+    elapsed = time.time() - started
+    rate = rows_written / elapsed if elapsed > 0 else 0.0
+    print(f"Wrote {rows_written} hindcast rows to {output_dir} in {elapsed:.1f}s ({rate:.0f} rows/s)")
+
+    return {'rows': rows_written, 'seconds': elapsed, 'rows_per_second': rate}
+
+def query_hindcast(cities=None, start=None, end=None, max_lead_hours=None,
+                   columns=('forecast_time', 'lead_hours', 'PM2.5', 'O3', 'NO2', 'AQI'),
+                   output_dir=HINDCAST_DIR):
+    """
+    Filtered, column-projected read of hindcast output.
+
+    Args:
+        cities (list): Cities to include, all if None
+        start (datetime): Earliest forecast time
+        end (datetime): Latest forecast time
+        max_lead_hours (int): Only keep forecasts up to this lead time
+        columns (tuple): Columns to read besides city
+        output_dir (str): Root of the partitioned output
+
+    Returns:
+        pd.DataFrame: city and the requested columns
+    """
+    output_columns = ['city'] + [col for col in columns if col != 'city']
+    dataset = hindcast_dataset(output_dir)
+    if dataset is None:
+        return pd.DataFrame(columns=output_columns)
+
+    conditions = []
+    if cities is not None:
+        conditions.append(ds.field('city').isin(list(cities)))
+    if start is not None:
+        # Forecasts for start were issued at most two days earlier
+        conditions.append(ds.field('year') >= (pd.Timestamp(start) - timedelta(days=2)).year)
+        conditions.append(ds.field('forecast_time') >= pd.Timestamp(start))
+    if end is not None:
+        conditions.append(ds.field('year') <= pd.Timestamp(end).year)
+        conditions.append(ds.field('forecast_time') <= pd.Timestamp(end))
+    if max_lead_hours is not None:
+        conditions.append(ds.field('lead_hours') <= max_lead_hours)
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    return dataset.to_table(columns=output_columns, filter=expression).to_pandas()
+
+def _arg(name, default=None):
+    """Value following a command-line flag."""
+    if name in sys.argv:
+        return sys.argv[sys.argv.index(name) + 1]
+    return default
+
+def main():
+    """
+    Run a hindcast from the command line.
+
+    Usage:
+        python hindcast.py --start 2025-01-01 --end 2025-03-31
+            [--cities "Los Angeles, USA;Accra, Ghana"] [--every 24]
+            [--output data/hindcast] [--chunk-rows 50000]
+    """
+    print("Starting Mframapa AI hindcast...")
+    print("=" * 60)
+
+    end = pd.Timestamp(_arg('--end', (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'))).to_pydatetime()
+    start = pd.Timestamp(_arg('--start', (end - timedelta(days=90)).strftime('%Y-%m-%d'))).to_pydatetime()
+    cities = _arg('--cities')
+
+    locations = hindcast_locations(cities.split(';') if cities else None)
+    run_hindcast(
+        locations,
+        start,
+        end,
+        every_hours=int(_arg('--every', 24)),
+        output_dir=_arg('--output', HINDCAST_DIR),
+        chunk_rows=int(_arg('--chunk-rows', HINDCAST_CHUNK_ROWS))
+    )
+
+if __name__ == "__main__":
+    main()
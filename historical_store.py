@@ -0,0 +1,403 @@
+import pandas as pd
+import numpy as np
+import os
+import time
+import pyarrow as pa
+import pyarrow.dataset as ds
+from utils import process_training_data
+
+HISTORY_STORE_DIR = os.path.join('data', 'history')
+
+# Hive-style partition keys, outermost first
+PARTITION_COLUMNS = ['city', 'pollutant', 'year']
+
+HISTORY_SCHEMA = pa.schema([
+    ('date', pa.timestamp('ms')),
+    ('value', pa.float32()),
+    ('site_id', pa.string()),
+    ('lat', pa.float32()),
+    ('lon', pa.float32()),
+    ('city', pa.string()),
+    ('pollutant', pa.string()),
+    ('year', pa.int16())
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([(name, HISTORY_SCHEMA.field(name).type) for name in PARTITION_COLUMNS]),
+    flavor='hive'
+)
+
+# AQS parameter names -> pollutant names used by the AQI functions
+POLLUTANT_NAMES = {
+    'PM2.5': 'PM2.5',
+    'PM2.5 - LOCAL CONDITIONS': 'PM2.5',
+    'OZONE': 'O3',
+    'O3': 'O3',
+    'NITROGEN DIOXIDE (NO2)': 'NO2',
+    'NO2': 'NO2'
+}
+
+# Per city x pollutant x month aggregates, ignored by dataset discovery
+ROLLUP_FILE = '_rollups.parquet'
+ROLLUP_KEYS = ['city', 'pollutant', 'year', 'month']
+
+# Month -> representative period for each time resolution
+SEASON_PERIODS = {12: 2, 1: 2, 2: 2, 3: 5, 4: 5, 5: 5, 6: 8, 7: 8, 8: 8, 9: 11, 10: 11, 11: 11}
+
+# Monitoring sites used for training and the city they represent
+SITE_CITIES = {
+    '060371103': 'Los Angeles, USA',
+    '080310027': 'Denver, USA',
+    '360810124': 'New York City, USA',
+    'ghana_accra': 'Accra, Ghana'
+}
+
+def normalize_pollutant(parameter):
+    """Map an ingestion parameter name to 'PM2.5', 'O3' or 'NO2' (None if unknown)."""
+    return POLLUTANT_NAMES.get(str(parameter).strip().upper())
+
+def to_history_records(ground_truth_data):
+    """
+    Convert ingested ground truth rows to the history store schema.
+
+    Args:
+        ground_truth_data (pd.DataFrame): Result of process_training_data
+
+    Returns:
+        pd.DataFrame: One row per observation with the store columns, values
+            in utils.MODEL_UNITS as converted by process_training_data
+    """
+    data = ground_truth_data
+
+    records = pd.DataFrame({
+        'date': pd.to_datetime(data['date']),
+        'value': data['value'].astype(float),
+        'site_id': data['site_id'].astype(str) if 'site_id' in data else 'unknown',
+        'lat': data['Latitude'].astype(float),
+        'lon': data['Longitude'].astype(float),
+        'pollutant': data['parameter'].map(normalize_pollutant)
+    })
+
+    records['city'] = records['site_id'].map(SITE_CITIES)
+    unnamed = records['city'].isna()
+    records.loc[unnamed, 'city'] = (
+        records.loc[unnamed, 'lat'].round(2).astype(str) + ', ' + records.loc[unnamed, 'lon'].round(2).astype(str)
+    )
+    records['year'] = records['date'].dt.year
+
+    return records.dropna(subset=['pollutant', 'value']).reset_index(drop=True)
+
+def write_history(records, store_dir=HISTORY_STORE_DIR):
+    """
+    Write observations into the partitioned store.
+
+    Partitions present in records are replaced as a whole, so re-ingesting
+    a year is idempotent and other partitions are left untouched. Rollups of
+    the replaced partitions are recomputed from records.
+
+    Args:
+        records (pd.DataFrame): Rows in the history store schema
+        store_dir (str): Root directory of the store
+
+    Returns:
+        int: Number of rows written
+    """
+    if records is None or len(records) == 0:
+        return 0
+
+    records = records.sort_values(PARTITION_COLUMNS + ['date'])
+    table = pa.Table.from_pandas(
+        records[HISTORY_SCHEMA.names], schema=HISTORY_SCHEMA, preserve_index=False
+    )
+
+    ds.write_dataset(
+        table,
+        store_dir,
+        format='parquet',
+        partitioning=PARTITIONING,
+        existing_data_behavior='delete_matching',
+        basename_template='part-{i}.parquet'
+    )
+
+    rollups = load_rollups(store_dir)
+    replaced = rollups.set_index(['city', 'pollutant', 'year']).index.isin(
+        records.set_index(['city', 'pollutant', 'year']).index.unique()
+    )
+    save_rollups(merge_rollups(rollups[~replaced], compute_rollups(records)), store_dir)
+
+    return table.num_rows
+
+def append_history(records, store_dir=HISTORY_STORE_DIR):
+    """
+    Add newly ingested days to the store.
+
+    Only observations after the last stored date of their city and pollutant
+    are written, as extra files in the existing partitions, and their monthly
+    aggregates are merged into the rollups without rescanning any history.
+
+    Args:
+        records (pd.DataFrame): Rows in the history store schema
+        store_dir (str): Root directory of the store
+
+    Returns:
+        int: Number of rows written
+    """
+    if records is None or len(records) == 0:
+        return 0
+
+    rollups = load_rollups(store_dir)
+    if not rollups.empty:
+        last_dates = rollups.groupby(['city', 'pollutant'])['last_date'].max().rename('last_stored')
+        records = records.join(last_dates, on=['city', 'pollutant'])
+        records = records[records['last_stored'].isna() | (records['date'] > records['last_stored'])]
+
+    if len(records) == 0:
+        return 0
+
+    records = records.sort_values(PARTITION_COLUMNS + ['date'])
+    table = pa.Table.from_pandas(
+        records[HISTORY_SCHEMA.names], schema=HISTORY_SCHEMA, preserve_index=False
+    )
+
+    ds.write_dataset(
+        table,
+        store_dir,
+        format='parquet',
+        partitioning=PARTITIONING,
+        existing_data_behavior='overwrite_or_ignore',
+        basename_template=f'part-{time.time_ns()}-{{i}}.parquet'
+    )
+
+    save_rollups(merge_rollups(rollups, compute_rollups(records)), store_dir)
+
+    return table.num_rows
+
+def build_history_store(store_dir=HISTORY_STORE_DIR, rebuild=False):
+    """
+    Fill the store from the training ingestion sources.
+
+    Args:
+        store_dir (str): Root directory of the store
+        rebuild (bool): Rewrite every ingested partition instead of only
+            appending days newer than the store
+
+    Returns:
+        int: Number of rows written
+    """
+    ground_truth_data = process_training_data()
+    if ground_truth_data is None:
+        return 0
+
+    records = to_history_records(ground_truth_data)
+    if rebuild or history_dataset(store_dir) is None:
+        return write_history(records, store_dir)
+
+    return append_history(records, store_dir)
+
+def history_dataset(store_dir=HISTORY_STORE_DIR):
+    """Open the store as a pyarrow dataset, or None if it has not been built."""
+    if not os.path.isdir(store_dir) or not os.listdir(store_dir):
+        return None
+
+    return ds.dataset(store_dir, schema=HISTORY_SCHEMA, format='parquet', partitioning=PARTITIONING)
+
+def list_history_partitions(store_dir=HISTORY_STORE_DIR):
+    """
+    List stored partitions without reading any data files.
+
+    Returns:
+        pd.DataFrame: city, pollutant and year of every partition
+    """
+    dataset = history_dataset(store_dir)
+    if dataset is None:
+        return pd.DataFrame(columns=PARTITION_COLUMNS)
+
+    partitions = [
+        ds.get_partition_keys(fragment.partition_expression)
+        for fragment in dataset.get_fragments()
+    ]
+    return pd.DataFrame(partitions, columns=PARTITION_COLUMNS).drop_duplicates().reset_index(drop=True)
+
+def query_history(cities=None, pollutants=None, years=None, start=None, end=None,
+                  columns=('date', 'value'), store_dir=HISTORY_STORE_DIR):
+    """
+    Filtered, column-projected read of the history store.
+
+    City, pollutant and year filters prune whole partitions before any file
+    is opened; date bounds are pushed down to Parquet row-group statistics.
+    Only the requested columns (plus city and pollutant) are decoded.
+
+    Args:
+        cities (list): City names to include, all if None
+        pollutants (list): Pollutants to include, all if None
+        years (tuple): Inclusive (first, last) year range, all if None
+        start (datetime): Earliest observation date
+        end (datetime): Latest observation date
+        columns (tuple): Data columns to read
+        store_dir (str): Root directory of the store
+
+    Returns:
+        pd.DataFrame: city, pollutant and the requested columns
+    """
+    output_columns = ['city', 'pollutant'] + [col for col in columns if col not in ('city', 'pollutant')]
+
+    dataset = history_dataset(store_dir)
+    if dataset is None:
+        return pd.DataFrame(columns=output_columns)
+
+    conditions = []
+    if cities is not None:
+        conditions.append(ds.field('city').isin(list(cities)))
+    if pollutants is not None:
+        conditions.append(ds.field('pollutant').isin(list(pollutants)))
+    if years is not None:
+        conditions.append((ds.field('year') >= years[0]) & (ds.field('year') <= years[1]))
+    if start is not None:
+        conditions.append(ds.field('date') >= pd.Timestamp(start))
+    if end is not None:
+        conditions.append(ds.field('date') <= pd.Timestamp(end))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+
+    table = dataset.to_table(columns=output_columns, filter=expression)
+    return table.to_pandas()
+
+def compute_rollups(records):
+    """
+    Monthly aggregates of observations.
+
+    Args:
+        records (pd.DataFrame): Rows with city, pollutant, date and value
+
+    Returns:
+        pd.DataFrame: count, sum, min, max, sumsq and last_date per
+            city x pollutant x year x month
+    """
+    if records is None or len(records) == 0:
+        return pd.DataFrame(columns=ROLLUP_KEYS + ['count', 'sum', 'min', 'max', 'sumsq', 'last_date'])
+
+    dates = pd.to_datetime(records['date'])
+    values = records['value'].astype(float)
+    frame = pd.DataFrame({
+        'city': records['city'].values,
+        'pollutant': records['pollutant'].values,
+        'year': dates.dt.year.values,
+        'month': dates.dt.month.values,
+        'value': values.values,
+        'sq': (values ** 2).values,
+        'date': dates.values
+    })
+
+    return frame.groupby(ROLLUP_KEYS, as_index=False, observed=True).agg(
+        count=('value', 'size'),
+        sum=('value', 'sum'),
+        min=('value', 'min'),
+        max=('value', 'max'),
+        sumsq=('sq', 'sum'),
+        last_date=('date', 'max')
+    )
+
+def merge_rollups(*rollups):
+    """Combine rollup tables; counts and sums add, extremes take min/max."""
+    frames = [rollup for rollup in rollups if rollup is not None and len(rollup) > 0]
+    if not frames:
+        return compute_rollups(None)
+
+    return pd.concat(frames, ignore_index=True).groupby(ROLLUP_KEYS, as_index=False).agg(
+        count=('count', 'sum'),
+        sum=('sum', 'sum'),
+        min=('min', 'min'),
+        max=('max', 'max'),
+        sumsq=('sumsq', 'sum'),
+        last_date=('last_date', 'max')
+    )
+
+def rebuild_rollups(store_dir=HISTORY_STORE_DIR):
+    """Recompute the rollups with one scan of the stored date and value columns."""
+    rollups = compute_rollups(query_history(columns=('date', 'value'), store_dir=store_dir))
+    save_rollups(rollups, store_dir)
+    return rollups
+
+def save_rollups(rollups, store_dir=HISTORY_STORE_DIR):
+    """Atomically replace the rollup file of the store."""
+    os.makedirs(store_dir, exist_ok=True)
+    path = os.path.join(store_dir, ROLLUP_FILE)
+    rollups.to_parquet(path + '.tmp', index=False)
+    os.replace(path + '.tmp', path)
+
+def load_rollups(store_dir=HISTORY_STORE_DIR, rebuild=True):
+    """
+    Load the monthly rollups of the store.
+
+    Args:
+        store_dir (str): Root directory of the store
+        rebuild (bool): Rebuild them from the data if the file is missing
+
+    Returns:
+        pd.DataFrame: Rollups, empty if the store has no data
+    """
+    path = os.path.join(store_dir, ROLLUP_FILE)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+
+    if rebuild and history_dataset(store_dir) is not None:
+        return rebuild_rollups(store_dir)
+
+    return compute_rollups(None)
+
+def rollup_view(rollups, resolution='Monthly', cities=None, years=None, pollutants=None):
+    """
+    Aggregate monthly rollups to a coarser time resolution.
+
+    Means and standard deviations are derived from the merged counts, sums
+    and sums of squares, so no observation is read again.
+
+    Args:
+        rollups (pd.DataFrame): Result of load_rollups
+        resolution (str): 'Monthly', 'Seasonal' or 'Annual'
+        cities (list): Cities to include, all if None
+        years (tuple): Inclusive (first, last) year range, all if None; for
+            seasons this is the year the season ends in
+        pollutants (list): Pollutants to include, all if None
+
+    Returns:
+        pd.DataFrame: city, pollutant, Year, Period, count, mean, std, min, max
+    """
+    selection = rollups
+    if cities is not None:
+        selection = selection[selection['city'].isin(list(cities))]
+    if pollutants is not None:
+        selection = selection[selection['pollutant'].isin(list(pollutants))]
+
+    selection = selection.rename(columns={'year': 'Year'})
+    if resolution == 'Annual':
+        selection = selection.assign(Period=6)  # Mid-year
+    elif resolution == 'Seasonal':
+        # December opens the following year's winter (DJF) season
+        selection = selection.assign(
+            Year=selection['Year'] + (selection['month'] == 12),
+            Period=selection['month'].map(SEASON_PERIODS)
+        )
+    else:
+        selection = selection.assign(Period=selection['month'])
+
+    # Filter on the period's year, so a winter season is kept or dropped whole
+    if years is not None:
+        selection = selection[selection['Year'].between(years[0], years[1])]
+
+    view = selection.groupby(['city', 'pollutant', 'Year', 'Period'], as_index=False).agg(
+        count=('count', 'sum'),
+        sum=('sum', 'sum'),
+        sumsq=('sumsq', 'sum'),
+        min=('min', 'min'),
+        max=('max', 'max')
+    )
+
+    count = view['count'].astype(float)
+    view['mean'] = view['sum'] / count
+    variance = (view['sumsq'] - view['sum'] ** 2 / count) / (count - 1).where(count > 1)
+    view['std'] = np.sqrt(variance.clip(lower=0))
+
+    return view.drop(columns=['sum', 'sumsq'])
@@ -0,0 +1,250 @@
+import streamlit as st
+import pandas as pd
+import earthaccess
+import xarray as xr
+import os
+import json
+import threading
+from datetime import datetime, timedelta
+from collections import OrderedDict
+
+# Variables read from each collection
+MERRA2_COLLECTIONS = {
+    'M2T1NXAER': ['BCSMASS', 'OCSMASS', 'DUSMASS', 'SSSMASS', 'SO4SMASS'],
+    'M2T1NXSLV': ['T2M', 'QV2M', 'U2M', 'V2M', 'PBLH', 'CLDTOT']
+}
+
+MERRA2_CACHE_DIR = os.path.join('cache', 'merra2')
+MERRA2_LATEST_PATH = os.path.join(MERRA2_CACHE_DIR, 'latest.json')
+
+# How long the latest-granule index is trusted before searching again
+MERRA2_LATEST_TTL = timedelta(hours=12)
+
+# Assumed publication delay until the index has been built once
+MERRA2_DEFAULT_LATENCY_DAYS = 35
+
+# Most recent available days used per forecast
+MERRA2_LOOKBACK_DAYS = 1
+
+# Daily granule files kept on disk per collection
+MERRA2_FILES_KEPT = 8
+
+# MERRA-2 grid spacing in degrees (lat, lon)
+MERRA2_GRID = (0.5, 0.625)
+
+# Hourly point series kept in memory
+MERRA2_HOURLY_CACHE_SIZE = 1024
+
+_login_lock = threading.Lock()
+_logged_in = False
+
+def earthdata_login():
+    """Log in to NASA Earthdata once per process with the credentials in secrets.toml."""
+    global _logged_in
+    with _login_lock:
+        if _logged_in:
+            return True
+
+        try:
+            username = st.secrets.get("EARTHDATA_USERNAME")
+            password = st.secrets.get("EARTHDATA_PASSWORD")
+            if not username or not password:
+                return False
+
+            os.environ["EARTHDATA_USERNAME"] = username
+            os.environ["EARTHDATA_PASSWORD"] = password
+            _logged_in = bool(earthaccess.login(strategy="environment").authenticated)
+        except Exception:
+            _logged_in = False
+        return _logged_in
+
+def granule_day(granule):
+    """Day a MERRA-2 granule covers, from its temporal extent."""
+    extent = granule['umm']['TemporalExtent']['RangeDateTime']['BeginningDateTime']
+    return pd.Timestamp(extent).tz_localize(None).normalize()
+
+def latest_available_dates(now=None, path=MERRA2_LATEST_PATH):
+    """
+    Latest published day of every collection.
+
+    The answer comes from a small index file that is refreshed with one
+    granule search per collection at most every MERRA2_LATEST_TTL. When no
+    search is possible the stale index is used, or the default latency if
+    there is none.
+
+    Returns:
+        dict: pd.Timestamp of the latest day per collection
+    """
+    now = pd.Timestamp(now or datetime.now())
+    index = {}
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            index = json.load(f)
+
+    fresh = index and now - pd.Timestamp(index['checked_at']) < MERRA2_LATEST_TTL
+    if not fresh and earthdata_login():
+        latest = {}
+        for collection in MERRA2_COLLECTIONS:
+            try:
+                granules = earthaccess.search_data(
+                    short_name=collection,
+                    temporal=((now - timedelta(days=120)).strftime('%Y-%m-%d'), now.strftime('%Y-%m-%d'))
+                )
+            except Exception:
+                granules = []
+            if granules:
+                latest[collection] = max(granule_day(granule) for granule in granules).strftime('%Y-%m-%d')
+
+        if len(latest) == len(MERRA2_COLLECTIONS):
+            index = {'checked_at': now.isoformat(timespec='seconds'), 'latest': latest}
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(index, f)
+            os.replace(path + '.tmp', path)
+
+    if index:
+        return {collection: pd.Timestamp(day) for collection, day in index['latest'].items()}
+
+    default = now.normalize() - timedelta(days=MERRA2_DEFAULT_LATENCY_DAYS)
+    return {collection: default for collection in MERRA2_COLLECTIONS}
+
+def resolve_merra2_dates(issue_time, days=MERRA2_LOOKBACK_DAYS, now=None):
+    """
+    Most recent days of MERRA-2 that were available at an issue time.
+
+    The current publication latency (today minus the latest day all
+    collections share) is applied to the issue day, so live forecasts use
+    the newest published day and hindcasts use what a forecast issued then
+    would have had.
+
+    Args:
+        issue_time (datetime): Forecast issue time
+        days (int): Number of days to return
+        now (datetime): Current time, defaults to now
+
+    Returns:
+        list: pd.Timestamp days, oldest first
+    """
+    now = pd.Timestamp(now or datetime.now())
+    common = min(latest_available_dates(now).values())
+    latency = now.normalize() - common
+    end = min(pd.Timestamp(issue_time).normalize() - latency, common)
+    return [end - timedelta(days=offset) for offset in reversed(range(days))]
+
+_download_locks = {}
+_download_locks_lock = threading.Lock()
+_evict_lock = threading.Lock()
+
+def _granule_lock(collection, stamp):
+    """Lock of one (collection, day) file, so different days download in parallel."""
+    with _download_locks_lock:
+        return _download_locks.setdefault((collection, stamp), threading.Lock())
+
+def merra2_granule_path(collection, day, cache_dir=MERRA2_CACHE_DIR):
+    """
+    Local file of one daily MERRA-2 granule, downloading it if needed.
+
+    The MERRA2_FILES_KEPT most recently used files of each collection are
+    kept, so every location and forecast reading the same day shares one
+    download as long as callers read day by day (training fetches its
+    features grouped by date). Only requests for the same file wait for
+    each other.
+
+    Returns:
+        str: Path of the granule, or None if it could not be fetched
+    """
+    directory = os.path.join(cache_dir, collection)
+    stamp = pd.Timestamp(day).strftime('%Y%m%d')
+
+    with _granule_lock(collection, stamp):
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if stamp in name and name.endswith('.nc4'):
+                    path = os.path.join(directory, name)
+                    os.utime(path)
+                    return path
+
+        if not earthdata_login():
+            return None
+
+        day_str = pd.Timestamp(day).strftime('%Y-%m-%d')
+        granules = [
+            granule for granule in earthaccess.search_data(short_name=collection, temporal=(day_str, day_str))
+            if granule_day(granule) == pd.Timestamp(day).normalize()
+        ]
+        if not granules:
+            return None
+
+        os.makedirs(directory, exist_ok=True)
+        files = [str(file) for file in earthaccess.download(granules[:1], local_path=directory)]
+
+        with _evict_lock:
+            kept = sorted(
+                (os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.nc4')),
+                key=os.path.getmtime, reverse=True
+            )
+            for stale in kept[MERRA2_FILES_KEPT:]:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+        return files[0] if files and os.path.exists(files[0]) else None
+
+def merra2_grid_point(lat, lon):
+    """Indices of the MERRA-2 grid point nearest to a location."""
+    return (int(round((lat + 90) / MERRA2_GRID[0])), int(round((lon + 180) / MERRA2_GRID[1])))
+
+_hourly_cache = OrderedDict()
+_hourly_lock = threading.Lock()
+
+def merra2_hourly(lat, lon, days):
+    """
+    Hourly MERRA-2 values at the grid point nearest to a location.
+
+    Series are cached per grid point and day, so locations sharing a grid
+    point and repeated forecasts read each granule once.
+
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        days (list): Days to read
+
+    Returns:
+        pd.DataFrame: 'time' and one column per variable that could be read
+    """
+    point = merra2_grid_point(lat, lon)
+    frames = []
+    for day in days:
+        for collection, variables in MERRA2_COLLECTIONS.items():
+            key = (collection, pd.Timestamp(day).strftime('%Y-%m-%d'), point)
+            with _hourly_lock:
+                cached = _hourly_cache.get(key)
+                if cached is not None:
+                    _hourly_cache.move_to_end(key)
+
+            if cached is None:
+                path = merra2_granule_path(collection, day)
+                if path is None:
+                    continue
+                with xr.open_dataset(path) as dataset:
+                    present = [var for var in variables if var in dataset.variables]
+                    if not present:
+                        continue
+                    cached = (
+                        dataset[present].sel(lat=lat, lon=lon, method='nearest')
+                        .to_dataframe()[present].reset_index()
+                    )
+                cached['time'] = pd.to_datetime(cached['time'])
+                with _hourly_lock:
+                    _hourly_cache[key] = cached
+                    while len(_hourly_cache) > MERRA2_HOURLY_CACHE_SIZE:
+                        _hourly_cache.popitem(last=False)
+
+            frames.append(cached.set_index('time'))
+
+    if not frames:
+        return pd.DataFrame(columns=['time'])
+
+    # One row per hour, AER and SLV columns side by side
+    return pd.concat(frames).groupby(level=0).first().reset_index()
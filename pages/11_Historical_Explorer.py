@@ -6,7 +6,10 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 import calendar
-from utils import get_aqi_category, get_lat_lon
+from utils import get_aqi_category, get_lat_lon, calculate_aqi_arrays
+from historical_store import load_rollups, rollup_view, query_history
+from charting import time_series_figure
+from hindcast import query_hindcast
 
 st.set_page_config(page_title="Historical Explorer - Mframapa AI", page_icon="📚", layout="wide")
 
@@ -17,16 +20,29 @@ Explore historical air quality trends, discover patterns, and understand how air
 Use satellite data and ground measurements to uncover insights about air quality evolution.
 """)
 
+# Monthly rollups of the historical observation store
+@st.cache_data(ttl=600)
+def load_history_rollups():
+    """Count, sum, min, max and sum of squares per city x pollutant x month."""
+    return load_rollups()
+
+history_rollups = load_history_rollups()
+
+if history_rollups.empty:
+    st.warning("⚠️ The historical store is empty. Run `python train_model.py --history` to build it from the training data.")
+
 # Time period selection
 st.markdown("## 🕐 Select Time Period for Exploration")
 
+year_options = list(range(2015, datetime.now().year + 1))
+
 time_col1, time_col2, time_col3 = st.columns(3)
 
 with time_col1:
-    start_year = st.selectbox("Start Year", range(2015, 2025), index=0)
+    start_year = st.selectbox("Start Year", year_options, index=0)
 
 with time_col2:
-    end_year = st.selectbox("End Year", range(2015, 2025), index=9)
+    end_year = st.selectbox("End Year", year_options, index=len(year_options) - 1)
 
 with time_col3:
     time_resolution = st.selectbox("Time Resolution", ["Monthly", "Seasonal", "Annual"])
@@ -52,11 +68,19 @@ with location_tab1:
         "Accra, Ghana": (5.6037, -0.1870)
     }
     
+    # Cities with stored observations come first
+    stored_cities = sorted(history_rollups['city'].unique())
+    city_choices = stored_cities + [city for city in city_options if city not in stored_cities]
+    
     selected_cities = st.multiselect(
         "Select cities for comparison:",
-        list(city_options.keys()),
-        default=["Los Angeles, USA", "Beijing, China"]
+        city_choices,
+        default=stored_cities[:2] or ["Los Angeles, USA", "Beijing, China"]
     )
+    
+    cities_without_data = [city for city in selected_cities if city not in stored_cities]
+    if cities_without_data and stored_cities:
+        st.info(f"No stored observations for: {', '.join(cities_without_data)}")
 
 with location_tab2:
     st.markdown("### Regional Analysis")
@@ -85,74 +109,64 @@ with location_tab3:
         else:
             st.error(f"Could not find {custom_city}")
 
-# Generate historical data for analysis
-@st.cache_data
+# Raw observations for the visible window, read with partition pruning
+@st.cache_data(ttl=600)
+def load_daily_observations(cities, pollutant, start, end):
+    """Daily values of one pollutant for the cities between start and end."""
+    return query_history(
+        cities=list(cities), pollutants=[pollutant], years=(start.year, end.year),
+        start=start, end=end, columns=('date', 'value')
+    )
+
+# Daily means of short-lead hindcasts for the visible window
+@st.cache_data(ttl=600)
+def load_daily_hindcast(cities, pollutant, start, end):
+    """Hindcast daily means of one pollutant, labelled as separate series."""
+    hindcast = query_hindcast(
+        cities=list(cities), start=start, end=end, max_lead_hours=24,
+        columns=('forecast_time', pollutant)
+    )
+    if hindcast.empty:
+        return pd.DataFrame(columns=['city', 'date', 'value'])
+    
+    hindcast['date'] = pd.to_datetime(hindcast['forecast_time']).dt.normalize()
+    daily = hindcast.groupby(['city', 'date'], as_index=False)[pollutant].mean()
+    return pd.DataFrame({
+        'city': daily['city'] + ' (hindcast)',
+        'date': daily['date'],
+        'value': daily[pollutant]
+    })
+
+# Aggregate stored observations for analysis
 def generate_historical_data(cities, years, resolution):
-    """Generate realistic historical air quality data for demonstration."""
-    data = []
-    
-    # Define base pollution levels and trends for different cities
-    city_profiles = {
-        "Los Angeles, USA": {"base_pm25": 25, "trend": -0.5, "seasonal_amp": 8},
-        "New York City, USA": {"base_pm25": 20, "trend": -0.3, "seasonal_amp": 6},
-        "Beijing, China": {"base_pm25": 85, "trend": -2.0, "seasonal_amp": 25},
-        "Delhi, India": {"base_pm25": 95, "trend": 0.5, "seasonal_amp": 30},
-        "London, UK": {"base_pm25": 18, "trend": -0.4, "seasonal_amp": 4},
-        "Tokyo, Japan": {"base_pm25": 15, "trend": -0.2, "seasonal_amp": 3},
-        "Accra, Ghana": {"base_pm25": 45, "trend": 1.0, "seasonal_amp": 35}
-    }
+    """
+    Period means per city and pollutant, merged from the monthly rollups.
     
-    for city in cities:
-        if city not in city_profiles:
-            continue
-            
-        profile = city_profiles[city]
-        
-        for year in range(years[0], years[1] + 1):
-            if resolution == "Annual":
-                periods = [(year, 6)]  # Mid-year
-            elif resolution == "Seasonal":
-                periods = [(year, 2), (year, 5), (year, 8), (year, 11)]  # Winter, Spring, Summer, Fall
-            else:  # Monthly
-                periods = [(year, month) for month in range(1, 13)]
-            
-            for year_val, period in periods:
-                # Calculate trend effect
-                year_offset = year_val - 2015
-                trend_effect = profile["trend"] * year_offset
-                
-                # Calculate seasonal effect
-                if resolution != "Annual":
-                    seasonal_effect = profile["seasonal_amp"] * np.sin(2 * np.pi * period / 12)
-                else:
-                    seasonal_effect = 0
-                
-                # Base value with trend and seasonal effects
-                pm25 = max(5, profile["base_pm25"] + trend_effect + seasonal_effect + np.random.normal(0, 3))
-                
-                # Generate correlated pollutants
-                no2 = max(5, pm25 * 0.6 + np.random.normal(0, 5))
-                o3 = max(10, 60 - pm25 * 0.3 + 20 * np.sin(2 * np.pi * period / 12) + np.random.normal(0, 8))
-                
-                # Calculate AQI (simplified)
-                aqi = min(500, max(0, pm25 * 2.5 + np.random.normal(0, 5)))
-                
-                data.append({
-                    'City': city,
-                    'Year': year_val,
-                    'Period': period,
-                    'PM2.5': pm25,
-                    'NO2': no2,
-                    'O3': o3,
-                    'AQI': aqi
-                })
-    
-    return pd.DataFrame(data)
+    Switching resolution only regroups the small rollup table; no stored
+    observation is read again.
+    """
+    view = rollup_view(history_rollups, resolution, cities=cities, years=years)
+    
+    if view.empty:
+        return pd.DataFrame(columns=['City', 'Year', 'Period', 'PM2.5', 'NO2', 'O3', 'AQI'])
+    
+    data = view.pivot_table(
+        index=['city', 'Year', 'Period'], columns='pollutant', values='mean'
+    ).reindex(columns=['PM2.5', 'NO2', 'O3'])
+    data.columns.name = None
+    data = data.reset_index().rename(columns={'city': 'City'})
+    
+    # AQI of the period means, ignoring pollutants a city does not measure
+    data['AQI'] = calculate_aqi_arrays(data['PM2.5'], data['O3'], data['NO2'])['Overall']
+    
+    return data
 
 # Main analysis section
+historical_data = pd.DataFrame()
 if selected_cities and start_year <= end_year:
     historical_data = generate_historical_data(selected_cities, (start_year, end_year), time_resolution)
-    
+
+if not historical_data.empty:
     st.markdown("## 📊 Historical Trends Analysis")
     
     # Trend visualization
@@ -196,12 +210,68 @@ if selected_cities and start_year <= end_year:
     fig.update_layout(height=500)
     st.plotly_chart(fig, use_container_width=True)
     
+    # Daily observations at full resolution, downsampled to the chart budget
+    st.markdown("### 🔎 Daily Observations")
+    
+    daily_pollutant = pollutant_choice if pollutant_choice != 'AQI' else 'PM2.5'
+    period_start = datetime(start_year, 1, 1)
+    period_end = datetime(end_year, 12, 31)
+    
+    # A box selection on the chart zooms the visible range to it
+    chart_state = st.session_state.get('daily_chart')
+    selected_boxes = chart_state.get('selection', {}).get('box', []) if chart_state else []
+    if selected_boxes and selected_boxes[0].get('x') != st.session_state.get('daily_applied_box'):
+        box_x = pd.to_datetime(selected_boxes[0]['x']).sort_values()
+        st.session_state.daily_applied_box = selected_boxes[0]['x']
+        st.session_state.daily_zoom = (
+            max(box_x[0].to_pydatetime(), period_start),
+            min(box_x[-1].to_pydatetime(), period_end)
+        )
+    
+    zoom = st.session_state.get('daily_zoom')
+    if not zoom or zoom[0] < period_start or zoom[1] > period_end or zoom[0] >= zoom[1]:
+        st.session_state.daily_zoom = (period_start, period_end)
+    
+    visible_range = st.slider(
+        "Visible range",
+        min_value=period_start,
+        max_value=period_end,
+        step=timedelta(days=1),
+        format="YYYY-MM-DD",
+        key='daily_zoom',
+        help="Drag to zoom, or box-select on the chart"
+    )
+    
+    daily_data = load_daily_observations(tuple(selected_cities), daily_pollutant, visible_range[0], visible_range[1])
+    
+    if st.checkbox("Overlay model hindcast", help="Daily mean of next-24-hour forecasts from `python hindcast.py`"):
+        hindcast_data = load_daily_hindcast(tuple(selected_cities), daily_pollutant, visible_range[0], visible_range[1])
+        if hindcast_data.empty:
+            st.caption("No hindcast stored for this range.")
+        daily_data = pd.concat([daily_data, hindcast_data], ignore_index=True)
+    
+    if daily_data.empty:
+        st.info(f"No daily {daily_pollutant} observations stored for this range.")
+    else:
+        fig_daily, chart_stats = time_series_figure(
+            daily_data, 'date', 'value', group='city',
+            title=f'Daily {daily_pollutant} Observations',
+            xaxis_title='Date', yaxis_title=daily_pollutant, height=400,
+            dragmode='select'
+        )
+        st.plotly_chart(fig_daily, use_container_width=True, key='daily_chart',
+                        on_select='rerun', selection_mode='box')
+        st.caption(
+            f"Showing {chart_stats['shown']:,} of {chart_stats['total']:,} observations"
+            + (" (WebGL)" if chart_stats['webgl'] else "")
+        )
+    
     # Statistical analysis
     st.markdown("### 📋 Statistical Summary")
     
     stats_data = []
     for city in selected_cities:
-        city_data = historical_data[historical_data['City'] == city]
+        city_data = historical_data[historical_data['City'] == city].dropna(subset=[pollutant_choice])
         
         if not city_data.empty:
             stats = {
@@ -251,10 +321,13 @@ if selected_cities and start_year <= end_year:
                 st.warning(f"🟡 **{city}**: Stable levels ({trend:.1f} units/year)")
 
 # Seasonal patterns analysis
+seasonal_data = pd.DataFrame()
 if selected_cities:
+    seasonal_data = generate_historical_data(selected_cities, (start_year, end_year), "Monthly")
+
+if not seasonal_data.empty:
     st.markdown("## 🌡️ Seasonal Patterns Analysis")
     
-    seasonal_data = generate_historical_data(selected_cities, (start_year, end_year), "Monthly")
     
     # Calculate monthly averages
     monthly_avg = seasonal_data.groupby(['City', 'Period']).agg({
@@ -288,7 +361,7 @@ if selected_cities:
     
     seasonal_insights = []
     for city in selected_cities:
-        city_monthly = monthly_avg[monthly_avg['City'] == city]
+        city_monthly = monthly_avg[monthly_avg['City'] == city].dropna(subset=[seasonal_pollutant])
         if not city_monthly.empty:
             max_month = city_monthly.loc[city_monthly[seasonal_pollutant].idxmax(), 'Month']
             min_month = city_monthly.loc[city_monthly[seasonal_pollutant].idxmin(), 'Month']
@@ -0,0 +1,117 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+from forecasting import get_drift_monitor, prefetch_stats
+from drift import PSI_WARNING, PSI_ALERT, DRIFT_METRICS_PATH, load_drift_metrics
+
+st.set_page_config(page_title="Admin - Mframapa AI", page_icon="🛠️", layout="wide")
+
+st.title("🛠️ Model Monitoring")
+
+st.markdown("""
+How closely the inputs of served forecasts match the data the models were trained on.
+Each feature is compared with its training histogram using the Population Stability Index (PSI)
+and the Kolmogorov-Smirnov (KS) distance, weighted towards recent forecasts.
+""")
+
+# Speculative forecasts started by the Home page once a city is resolved
+st.markdown("## ⚡ Forecast Prefetch")
+
+stats = prefetch_stats()
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    st.metric("Hit Rate", f"{stats['hit_rate']:.0%}",
+              help="Share of forecast requests served by a prefetch that was ready or in flight")
+
+with col2:
+    st.metric("Ready / In Flight", f"{stats['ready_hits']} / {stats['in_flight_hits']}")
+
+with col3:
+    st.metric("Prefetches Used", f"{stats['accuracy']:.0%}",
+              help="Share of prefetches whose forecast was then requested")
+
+with col4:
+    st.metric("Misses / Wasted / Failed", f"{stats['misses']} / {stats['wasted']} / {stats['failed']}",
+              help="Requests without a prefetch, prefetches evicted unused, and prefetches that raised")
+
+monitor = get_drift_monitor()
+
+if monitor is None:
+    st.warning("⚠️ The current models have no feature profile. Retrain with `python train_model.py` to enable drift monitoring.")
+    st.stop()
+
+st.markdown("## 📊 Input Drift")
+
+if monitor.rows > 0:
+    scores = monitor.scores()
+    rows_monitored = monitor.rows
+    source = "live monitor of this server process"
+else:
+    # Fall back to the last snapshot exported by an earlier server process
+    snapshot = load_drift_metrics()
+    if not snapshot or not snapshot.get('features'):
+        st.info("No forecasts have been served since start-up. Drift scores appear here once forecasts are made.")
+        st.stop()
+    scores = pd.DataFrame(snapshot['features'])
+    rows_monitored = snapshot['rows']
+    source = f"snapshot exported at {snapshot['exported_at']}"
+
+col1, col2, col3, col4 = st.columns(4)
+
+with col1:
+    st.metric("Inputs Monitored", f"{rows_monitored:,}")
+
+with col2:
+    st.metric("Features in Alert", int((scores['status'] == 'alert').sum()),
+              help=f"PSI of {PSI_ALERT} or more")
+
+with col3:
+    st.metric("Features in Warning", int((scores['status'] == 'warning').sum()),
+              help=f"PSI between {PSI_WARNING} and {PSI_ALERT}")
+
+with col4:
+    st.metric("Mean Fill Rate", f"{scores['fill_rate'].mean():.0%}",
+              help="Share of inputs that were missing or taken from the climatology fallback")
+
+status_colors = {'ok': '#00e400', 'warning': '#ff7e00', 'alert': '#ff0000'}
+
+fig_psi = px.bar(scores, x='feature', y='psi', color='status', color_discrete_map=status_colors,
+                 title='PSI by Feature', labels={'feature': 'Feature', 'psi': 'PSI', 'status': 'Status'})
+fig_psi.add_hline(y=PSI_WARNING, line_dash="dash", line_color="orange", annotation_text="Warning")
+fig_psi.add_hline(y=PSI_ALERT, line_dash="dash", line_color="red", annotation_text="Alert")
+fig_psi.update_layout(height=400)
+st.plotly_chart(fig_psi, use_container_width=True)
+
+st.dataframe(
+    scores.rename(columns={
+        'feature': 'Feature', 'psi': 'PSI', 'ks': 'KS', 'fill_rate': 'Fill Rate',
+        'out_of_range': 'Outside Training Range', 'status': 'Status'
+    }).round(3),
+    use_container_width=True
+)
+
+st.caption(f"Source: {source}. Snapshots are exported to `{DRIFT_METRICS_PATH}`.")
+
+# Training and serving histograms of a single feature
+if monitor.rows > 0:
+    st.markdown("## 🔍 Feature Distribution")
+
+    feature = st.selectbox("Feature", scores['feature'].tolist(), key="drift_feature")
+    edges = monitor.edges[feature]
+    expected = monitor.expected[feature]
+    actual = monitor.counts[feature]
+
+    labels = (
+        [f"< {edges[0]:.3g}"]
+        + [f"{low:.3g} – {high:.3g}" for low, high in zip(edges[:-1], edges[1:])]
+        + [f"> {edges[-1]:.3g}"]
+    )
+
+    fig_hist = go.Figure()
+    fig_hist.add_trace(go.Bar(x=labels, y=expected / max(expected.sum(), 1), name='Training'))
+    fig_hist.add_trace(go.Bar(x=labels, y=actual / max(actual.sum(), 1e-9), name='Serving'))
+    fig_hist.update_layout(barmode='group', height=350, yaxis_title='Share of Inputs',
+                           title=f'{feature}: Training vs Serving')
+    st.plotly_chart(fig_hist, use_container_width=True)
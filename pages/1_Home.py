@@ -1,6 +1,7 @@
 import streamlit as st
 from utils import get_lat_lon
-import time
+from gazetteer import get_gazetteer, place_label
+from forecasting import prefetch_forecast
 
 st.set_page_config(
     page_title="Home - Mframapa AI",
@@ -307,18 +308,38 @@ with col_center:
   city_input = st.text_input("", placeholder="Type a city (e.g., Accra, Lagos, Los Angeles)", key="city_input", value="" if "focus_search" not in st.session_state else "")
   if "focus_search" in st.session_state:
       del st.session_state.focus_search
+
+  # Places from the offline gazetteer; choosing one needs no geocoding
+  gazetteer = get_gazetteer()
+  suggestions = gazetteer.suggest(city_input) if gazetteer is not None and city_input else []
+  suggestion = None
+  if suggestions:
+    suggestion = st.pills(
+      "Suggestions",
+      list(range(len(suggestions))),
+      format_func=lambda position: place_label(suggestions[position]),
+      key=f"city_suggestion_{city_input}",
+      label_visibility="collapsed"
+    )
   search_btn = st.button("Search City", key="home_search")
 
+if suggestion is not None:
+  place = suggestions[suggestion]
+  st.session_state.selected_city = place_label(place)
+  st.session_state.selected_coordinates = (place['lat'], place['lon'])
+  prefetch_forecast(place['lat'], place['lon'])
+  st.switch_page("pages/2_Forecast.py")
+
 if search_btn and city_input:
   with st.spinner(f"🔎 Finding coordinates for {city_input}..."):
-    time.sleep(0.9)
     coords = get_lat_lon(city_input)
     if coords:
       lat, lon = coords
+      # Start the forecast while the Forecast page loads
+      prefetch_forecast(lat, lon)
       st.session_state.selected_city = city_input
       st.session_state.selected_coordinates = coords
       st.success(f"✅ Found {city_input} — {lat:.4f}, {lon:.4f}. Redirecting to Forecast...")
-      time.sleep(1.1)
       st.switch_page("pages/2_Forecast.py")
     else:
       st.error("❌ Could not find this city. Try a different spelling or add the country (e.g., 'Accra, Ghana').")
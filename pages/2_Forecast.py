@@ -1,22 +1,27 @@
 import streamlit as st
-import xgboost as xgb
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
 import folium
 from streamlit_folium import folium_static
 import os
-import pickle
 from utils import (
-    fetch_openweather_forecast,
-    fetch_merra2_data,
-    fetch_tempo_data,
     calculate_aqi_from_components,
+    to_hourly,
+    in_tempo_coverage,
     get_aqi_category,
     get_health_recommendation,
-    fetch_air_quality_data
+    get_health_timeline
+)
+from forecasting import (
+    load_models,
+    forecast_for,
+    clear_prefetch_cache,
+    record_current_observations,
+    stream_hourly_aqi,
+    archive_issued_forecast,
+    monitor_forecast_inputs
 )
 
 st.set_page_config(page_title="Forecast - Mframapa AI", page_icon="📈", layout="wide")
@@ -42,46 +47,6 @@ if not os.path.exists(model_dir):
     st.stop()
 
 # Load models and feature information
-@st.cache_resource
-def load_models():
-    """Load trained XGBoost models and supporting data."""
-    models = {}
-    feature_columns = []
-    label_encoders = {}
-    normalization_params = {}
-    
-    try:
-        # Load feature columns
-        with open(os.path.join(model_dir, 'feature_columns.pkl'), 'rb') as f:
-            feature_columns = pickle.load(f)
-        
-        # Load label encoders
-        with open(os.path.join(model_dir, 'label_encoders.pkl'), 'rb') as f:
-            label_encoders = pickle.load(f)
-        
-        # Load normalization parameters
-        norm_path = os.path.join(model_dir, 'normalization_params.pkl')
-        if os.path.exists(norm_path):
-            with open(norm_path, 'rb') as f:
-                normalization_params = pickle.load(f)
-        
-        # Load models for each pollutant
-        model_files = [f for f in os.listdir(model_dir) if f.endswith('.json')]
-        
-        for model_file in model_files:
-            pollutant = model_file.replace('xgboost_model_', '').replace('.json', '')
-            model_path = os.path.join(model_dir, model_file)
-            
-            model = xgb.XGBRegressor()
-            model.load_model(model_path)
-            models[pollutant] = model
-        
-        return models, feature_columns, label_encoders, normalization_params
-    
-    except Exception as e:
-        st.error(f"Error loading models: {str(e)}")
-        return {}, [], {}, {}
-
 models, feature_columns, label_encoders, normalization_params = load_models()
 
 if not models:
@@ -90,185 +55,68 @@ if not models:
 
 st.success(f"✅ Loaded models for: {', '.join(models.keys())}")
 
-# Fetch real-time data
-@st.cache_data(ttl=1800)  # Cache for 30 minutes
-def fetch_forecast_features(lat, lon):
-    """Fetch all required features for forecasting."""
-    features_list = []
-    
-    # Get current date and forecast dates
-    current_date = datetime.now()
-    forecast_dates = [current_date + timedelta(hours=h) for h in range(0, 49, 3)]  # Every 3 hours for 48 hours
-    
-    # Fetch weather forecast
-    weather_data = fetch_openweather_forecast(lat, lon)
-    
-    # Fetch satellite data for recent dates
-    start_date = (current_date - timedelta(days=60)).strftime('%Y-%m-%d')
-    end_date = (current_date - timedelta(days=30)).strftime('%Y-%m-%d')
-    
-    merra_data = fetch_merra2_data(lat, lon, start_date, end_date)
-    
-    # Check if location is in North America for TEMPO data
-    tempo_data = None
-    if -170 <= lon <= -50 and 15 <= lat <= 75:
-        bounding_box = (lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5)
-        tempo_data = fetch_tempo_data(bounding_box, start_date, end_date)
-    
-    # Process weather forecast data
-    weather_forecasts = {}
-    if weather_data and 'list' in weather_data:
-        for forecast in weather_data['list']:
-            forecast_time = datetime.fromtimestamp(forecast['dt'])
-            weather_forecasts[forecast_time] = {
-                'temp': forecast['main']['temp'],
-                'humidity': forecast['main']['humidity'],
-                'pressure': forecast['main']['pressure'],
-                'wind_speed': forecast['wind']['speed'],
-                'wind_deg': forecast['wind'].get('deg', 0),
-                'clouds': forecast['clouds']['all']
-            }
-    
-    # Create feature vectors for each forecast time
-    for forecast_date in forecast_dates:
-        dayofweek = forecast_date.weekday()
-        dayofyear = forecast_date.timetuple().tm_yday
-        week = forecast_date.isocalendar()[1]
-        
-        features = {
-            'lat': lat,
-            'lon': lon,
-            'year': forecast_date.year,
-            'month': forecast_date.month,
-            'day': forecast_date.day,
-            'dayofweek': dayofweek,
-            'dayofyear': dayofyear,
-            'week': week,
-            'season': (forecast_date.month - 1) // 3,
-            'is_weekend': 1 if dayofweek >= 5 else 0,
-            'month_sin': np.sin(2 * np.pi * forecast_date.month / 12),
-            'month_cos': np.cos(2 * np.pi * forecast_date.month / 12),
-            'day_sin': np.sin(2 * np.pi * forecast_date.day / 31),
-            'day_cos': np.cos(2 * np.pi * forecast_date.day / 31),
-            'dayofweek_sin': np.sin(2 * np.pi * dayofweek / 7),
-            'dayofweek_cos': np.cos(2 * np.pi * dayofweek / 7),
-        }
-        
-        # Apply proper normalization using saved parameters
-        if normalization_params:
-            lat_mean = normalization_params.get('lat_mean', lat)
-            lat_std = normalization_params.get('lat_std', 1.0)
-            lon_mean = normalization_params.get('lon_mean', lon)
-            lon_std = normalization_params.get('lon_std', 1.0)
-            
-            features['lat_norm'] = (lat - lat_mean) / lat_std
-            features['lon_norm'] = (lon - lon_mean) / lon_std
-            
-            # Interaction features using normalized values
-            features['lat_month'] = features['lat_norm'] * forecast_date.month
-            features['lon_month'] = features['lon_norm'] * forecast_date.month
-            features['lat_lon'] = features['lat_norm'] * features['lon_norm']
-        else:
-            # Fallback if normalization params not available
-            features['lat_norm'] = 0.0
-            features['lon_norm'] = 0.0
-            features['lat_month'] = 0.0
-            features['lon_month'] = 0.0
-            features['lat_lon'] = 0.0
-        
-        # Add weather features (use closest forecast)
-        closest_weather = None
-        min_time_diff = float('inf')
-        
-        for weather_time, weather_info in weather_forecasts.items():
-            time_diff = abs((weather_time - forecast_date).total_seconds())
-            if time_diff < min_time_diff:
-                min_time_diff = time_diff
-                closest_weather = weather_info
-        
-        if closest_weather:
-            features['weather_temp'] = closest_weather['temp']
-            features['weather_humidity'] = closest_weather['humidity']
-            features['weather_pressure'] = closest_weather['pressure']
-            features['weather_wind_speed'] = closest_weather['wind_speed']
-            features['weather_clouds'] = closest_weather['clouds']
-        
-        # Add MERRA-2 features (use latest available)
-        if merra_data:
-            for key, value in merra_data.items():
-                if isinstance(value, (np.ndarray, list)) and len(value) > 0:
-                    features[f'merra2_{key}'] = np.mean(value)
-                elif isinstance(value, (int, float)):
-                    features[f'merra2_{key}'] = value
-        
-        # Add TEMPO features for North America
-        if tempo_data:
-            for key, value in tempo_data.items():
-                features[f'tempo_{key}'] = value
-        
-        # Create interaction features
-        if 'weather_temp' in features and 'weather_humidity' in features:
-            features['temp_humidity_interaction'] = features['weather_temp'] * features['weather_humidity']
-        
-        if 'merra2_U2M' in features and 'merra2_V2M' in features:
-            features['wind_speed'] = np.sqrt(features['merra2_U2M']**2 + features['merra2_V2M']**2)
-        
-        features['forecast_time'] = forecast_date
-        features_list.append(features)
-    
-    return features_list
-
 # Main forecasting section
 with st.spinner("🛰️ Fetching satellite data and generating forecast..."):
-    forecast_features = fetch_forecast_features(lat, lon)
+    forecast = forecast_for(lat, lon)
 
-if not forecast_features:
+if forecast['frame'].empty:
     st.error("❌ Could not fetch required data for forecasting.")
     st.stop()
 
-# Create feature DataFrame
-forecast_df = pd.DataFrame(forecast_features)
+forecast_df = forecast['frame']
+
+# Feed current observations into the shared per-location history buffer
+current_observations = record_current_observations(lat, lon)
 
-# Ensure all required features are present
-missing_features = []
-for col in feature_columns:
-    if col not in forecast_df.columns:
-        missing_features.append(col)
+# Predictions come with the features, computed by the prefetch when there was one
+predictions = forecast['predictions']
+missing_features = forecast['missing_features']
+prediction_errors = forecast['errors']
+archive_issued_forecast(forecast_df, predictions)
+monitor_forecast_inputs(forecast_df, feature_columns)
 
 if missing_features:
     st.warning(f"⚠️ Some features are missing: {missing_features[:5]}...")
-    # Fill missing features with zeros or median values
-    for col in missing_features:
-        if col.startswith(('merra2_', 'tempo_', 'weather_')):
-            forecast_df[col] = 0
-        else:
-            forecast_df[col] = 0
-
-# Make predictions
-predictions = {}
-for pollutant, model in models.items():
-    try:
-        X_forecast = forecast_df[feature_columns].fillna(0)
-        y_pred = model.predict(X_forecast)
-        predictions[pollutant] = y_pred
-    except Exception as e:
-        st.warning(f"Could not predict for {pollutant}: {str(e)}")
+
+for pollutant, error in prediction_errors.items():
+    st.warning(f"Could not predict for {pollutant}: {error}")
 
 # Display current conditions
 if predictions:
     st.markdown("## 🌡️ Current Air Quality Conditions")
     
-    current_values = {}
-    for pollutant, pred_values in predictions.items():
-        current_values[pollutant] = pred_values[0] if len(pred_values) > 0 else 0
+    # Regulatory AQI for every hour of the horizon: PM2.5 NowCast, 8-h O3, 1-h NO2,
+    # continuing from the hours observed before the forecast
+    hourly_values = {}
+    for aqi_pollutant, names in (('PM2.5', ('PM2.5', 'pm25')), ('O3', ('O3', 'o3')), ('NO2', ('NO2', 'no2'))):
+        values = next((predictions[name] for name in names if name in predictions), None)
+        if values is not None and len(forecast_df) > 1:
+            hourly_times, hourly_values[aqi_pollutant] = to_hourly(forecast_df['forecast_time'], values)
     
-    # Calculate AQI - normalize pollutant names
-    pm25_val = current_values.get('PM2.5', current_values.get('pm25', 0))
-    o3_val = current_values.get('O3', current_values.get('o3', 0))
-    no2_val = current_values.get('NO2', current_values.get('no2', 0))
+    hourly_aqi = None
+    if hourly_values:
+        hourly_aqi = stream_hourly_aqi(lat, lon, hourly_times, hourly_values, current_observations)
+    
+    if hourly_aqi is not None:
+        # Current conditions on the regulatory averages of the first hour
+        current = hourly_aqi.iloc[0]
+        pm25_val = current['PM2.5_nowcast']
+        o3_val = current['O3_8h']
+        no2_val = current['NO2_1h']
+        overall_aqi = int(current['AQI']) if pd.notna(current['AQI']) else 0
+    else:
+        current_values = {}
+        for pollutant, pred_values in predictions.items():
+            current_values[pollutant] = pred_values[0] if len(pred_values) > 0 else 0
+        
+        # Calculate AQI - normalize pollutant names
+        pm25_val = current_values.get('PM2.5', current_values.get('pm25', 0))
+        o3_val = current_values.get('O3', current_values.get('o3', 0))
+        no2_val = current_values.get('NO2', current_values.get('no2', 0))
+        
+        aqi_data = calculate_aqi_from_components(pm25_val, o3_val, no2_val)
+        overall_aqi = aqi_data.get('Overall', 0)
     
-    aqi_data = calculate_aqi_from_components(pm25_val, o3_val, no2_val)
-    overall_aqi = aqi_data.get('Overall', 0)
     category, color = get_aqi_category(overall_aqi)
     
     # Current AQI display
@@ -294,6 +142,12 @@ if predictions:
     with col4:
         if no2_val > 0:
             st.metric("NO₂", f"{no2_val:.0f} ppb", help="Nitrogen dioxide")
+    
+    if hourly_aqi is not None and not current['Complete']:
+        st.caption(
+            "⚠️ Too few observed hours for a full PM2.5 NowCast or 8-hour O₃ average; "
+            "current values average only the hours available so far."
+        )
 
 # Forecast visualization
 st.markdown("## 📊 48-Hour Forecast")
@@ -334,6 +188,39 @@ if predictions and len(forecast_df) > 1:
     )
     
     st.plotly_chart(fig, use_container_width=True)
+    
+    # Hourly regulatory AQI with the dominant pollutant per hour
+    if hourly_aqi is not None:
+        fig_aqi = go.Figure(go.Scatter(
+            x=hourly_aqi['time'],
+            y=hourly_aqi['AQI'],
+            mode='lines',
+            name='AQI',
+            customdata=np.column_stack([
+                hourly_aqi['Dominant'].fillna('n/a'),
+                np.where(hourly_aqi['Complete'], '', ', partial average')
+            ]),
+            hovertemplate='AQI %{y:.0f} (dominant: %{customdata[0]}%{customdata[1]})<extra></extra>'
+        ))
+        fig_aqi.update_layout(
+            title="Forecast AQI - Next 48 Hours (NowCast PM2.5, 8-h O₃, 1-h NO₂)",
+            xaxis_title="Time",
+            yaxis_title="AQI",
+            height=300
+        )
+        st.plotly_chart(fig_aqi, use_container_width=True)
+        
+        peak = hourly_aqi.loc[hourly_aqi['AQI'].idxmax()]
+        st.caption(
+            f"Peak forecast AQI: {peak['AQI']:.0f} "
+            f"at {peak['time']:%a %H:%M} ({peak['Dominant']})"
+        )
+        partial_hours = int((~hourly_aqi['Complete']).sum())
+        if partial_hours:
+            st.caption(
+                f"The first {partial_hours} h lack enough data for full averaging periods "
+                "and are marked as partial averages."
+            )
 
 # Health recommendations
 st.markdown("## 🏥 Health Recommendations")
@@ -369,6 +256,28 @@ with col2:
     st.markdown("**Precautions:**")
     st.warning(recommendations['precautions'])
 
+# Hour-by-hour advice and the best times to be outdoors
+if hourly_aqi is not None:
+    forecast_id = f"{lat:.4f},{lon:.4f}@{hourly_aqi['time'].iloc[0]:%Y%m%d%H%M}"
+    health_timeline = get_health_timeline(forecast_id, hourly_aqi['time'], hourly_aqi['AQI'], user_profile)
+    
+    st.markdown("### 🕒 Best Outdoor Windows")
+    if health_timeline['windows']:
+        for window in health_timeline['windows'][:3]:
+            st.success(
+                f"**{window['start']:%a %H:%M} – {window['end']:%a %H:%M}** "
+                f"({window['hours']:.0f} h, average AQI {window['mean_aqi']:.0f})"
+            )
+    else:
+        st.warning(f"No hours with AQI at or below {health_timeline['threshold']} in the next 48 hours.")
+    
+    with st.expander("Hourly health advice"):
+        st.dataframe(
+            health_timeline['timeline'][['time', 'aqi', 'category', 'activities', 'precautions']],
+            use_container_width=True,
+            hide_index=True
+        )
+
 # Location map
 st.markdown("## 🗺️ Location")
 
@@ -421,7 +330,7 @@ with col2:
     - 📺 Location-specific training
     """)
 
-region_info = "North America (TEMPO + MERRA-2)" if -170 <= lon <= -50 and 15 <= lat <= 75 else "Global (MERRA-2)"
+region_info = "North America (TEMPO + MERRA-2)" if in_tempo_coverage(lat, lon) else "Global (MERRA-2)"
 st.info(f"📍 **Data Coverage for {city}:** {region_info}")
 
 # Refresh options
@@ -431,6 +340,7 @@ col1, col2, col3 = st.columns([1, 1, 2])
 with col1:
     if st.button("🔄 Refresh Forecast"):
         st.cache_data.clear()
+        clear_prefetch_cache()
         st.rerun()
 
 with col2:
@@ -1,5 +1,6 @@
 import streamlit as st
 from datetime import datetime
+from utils import load_aqi_standards
 
 st.set_page_config(page_title="Profile - Mframapa AI", page_icon="👤", layout="wide")
 
@@ -190,6 +191,16 @@ with col2:
         default=st.session_state.user_profile.get('forecast_interest', ["Next 24 hours", "Next 48 hours"]),
         help="Which forecast periods are most useful for you?"
     )
+    
+    aqi_standards = load_aqi_standards()['standards']
+    standard_options = ['local'] + list(aqi_standards.keys())
+    aqi_standard = st.selectbox(
+        "Preferred Air Quality Index",
+        standard_options,
+        index=standard_options.index(st.session_state.user_profile.get('aqi_standard', 'local')),
+        format_func=lambda key: "Local standard for each city" if key == 'local' else aqi_standards[key].name,
+        help="Index used when comparing cities"
+    )
 
 # Save profile
 st.markdown("---")
@@ -216,6 +227,7 @@ with col2:
             'alert_threshold': alert_threshold,
             'alert_types': alert_types,
             'forecast_interest': forecast_interest,
+            'aqi_standard': aqi_standard,
             'last_updated': datetime.now().isoformat()
         })
         
@@ -6,9 +6,15 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import folium
 from streamlit_folium import folium_static
-from utils import get_lat_lon, calculate_aqi_from_components, get_aqi_category
-import random
-from datetime import datetime, timedelta
+from utils import (
+    get_lat_lon,
+    get_aqi_category,
+    get_aqi_standard,
+    default_aqi_standard,
+    load_aqi_standards
+)
+from forecasting import forecast_cities, clear_forecast_cache
+from datetime import datetime
 
 st.set_page_config(page_title="Compare Cities - Mframapa AI", page_icon="🔄", layout="wide")
 
@@ -94,60 +100,6 @@ if st.session_state.get('selected_city') and st.session_state.get('selected_coor
             st.session_state.comparison_cities.append(city_data)
             st.rerun()
 
-# Generate sample data for comparison (in production, this would use real model predictions)
-@st.cache_data(ttl=1800)
-def generate_comparison_data(cities):
-    """Generate sample air quality data for comparison cities."""
-    if not cities:
-        return pd.DataFrame()
-    
-    # Create time series for next 48 hours
-    base_time = datetime.now()
-    times = [base_time + timedelta(hours=h) for h in range(0, 49, 3)]
-    
-    data = []
-    
-    for city in cities:
-        lat, lon = city['lat'], city['lon']
-        
-        # Generate realistic-looking data based on location characteristics
-        base_pm25 = 20 + random.uniform(-5, 15)  # Base PM2.5 level
-        base_o3 = 40 + random.uniform(-10, 20)   # Base O3 level  
-        base_no2 = 25 + random.uniform(-10, 15)  # Base NO2 level
-        
-        # Urban areas typically have higher pollution
-        if any(term in city['name'].lower() for term in ['angeles', 'york', 'beijing', 'delhi', 'mexico']):
-            base_pm25 += 20
-            base_no2 += 15
-        
-        # Coastal areas might have different patterns
-        if any(term in city['name'].lower() for term in ['angeles', 'miami', 'san francisco']):
-            base_o3 += 10
-        
-        for time in times:
-            # Add daily variation
-            hour_factor = 0.8 + 0.4 * np.sin(2 * np.pi * time.hour / 24)
-            
-            pm25 = max(5, base_pm25 * hour_factor + random.uniform(-10, 10))
-            o3 = max(10, base_o3 * hour_factor + random.uniform(-15, 15))
-            no2 = max(5, base_no2 * hour_factor + random.uniform(-10, 10))
-            
-            # Calculate AQI
-            aqi_data = calculate_aqi_from_components(pm25, o3, no2)
-            
-            data.append({
-                'city': city['name'],
-                'time': time,
-                'PM2.5': pm25,
-                'O3': o3,
-                'NO2': no2,
-                'AQI': aqi_data.get('Overall', 0),
-                'lat': lat,
-                'lon': lon
-            })
-    
-    return pd.DataFrame(data)
-
 # Main comparison section
 if len(st.session_state.comparison_cities) < 2:
     st.info("💡 Add at least 2 cities to start comparing air quality forecasts.")
@@ -178,12 +130,44 @@ if len(st.session_state.comparison_cities) < 2:
                 st.rerun()
 
 else:
-    # Generate comparison data
-    comparison_data = generate_comparison_data(st.session_state.comparison_cities)
+    # Per-city cached forecasts, so only newly added cities are computed
+    comparison_data = forecast_cities(st.session_state.comparison_cities)
     
     if not comparison_data.empty:
         st.markdown("## 📊 Air Quality Comparison")
         
+        # National index to report alongside the US AQI
+        aqi_standards = load_aqi_standards()['standards']
+        standard_options = ['local'] + list(aqi_standards.keys())
+        preferred_standard = st.session_state.get('user_profile', {}).get('aqi_standard', 'local')
+        selected_standard = st.selectbox(
+            "Air quality index standard",
+            standard_options,
+            index=standard_options.index(preferred_standard) if preferred_standard in standard_options else 0,
+            format_func=lambda key: "Local standard for each city" if key == 'local' else aqi_standards[key].name,
+            help="Score each city with its national index, or use one standard for all cities"
+        )
+        st.caption(
+            "National indices are computed on trailing means over each standard's averaging "
+            "periods (e.g. 24-hour PM2.5, 8-hour O₃), so early forecast hours only average the "
+            "hours forecast so far. The US AQI per forecast step uses that step's concentrations."
+        )
+        
+        comparison_data = comparison_data.copy()
+        city_standards = {
+            city['name']: default_aqi_standard(city['lat'], city['lon']) if selected_standard == 'local' else selected_standard
+            for city in st.session_state.comparison_cities
+        }
+        comparison_data['Standard'] = comparison_data['city'].map(city_standards)
+        
+        # One vectorized evaluation per standard in use, on its averaging periods
+        for standard_key, group in comparison_data.groupby('Standard'):
+            standard = get_aqi_standard(standard_key)
+            averaged = standard.averaged(group)
+            index_values = standard.evaluate(averaged['PM2.5'], averaged['O3'], averaged['NO2'])['Overall']
+            comparison_data.loc[group.index, 'Index'] = index_values
+            comparison_data.loc[group.index, 'Index Category'] = standard.categorize(index_values)[0]
+        
         # Current conditions comparison
         st.markdown("### 🌡️ Current Conditions")
         
@@ -205,6 +189,8 @@ else:
                 st.markdown(f"<div style='background-color: {color}; height: 5px; border-radius: 3px;'></div>", 
                            unsafe_allow_html=True)
                 
+                if row['Standard'] != 'EPA':
+                    st.caption(f"{aqi_standards[row['Standard']].name}: {row['Index']:.0f} ({row['Index Category']})")
                 st.caption(f"PM2.5: {row['PM2.5']:.1f} μg/m³")
                 st.caption(f"O₃: {row['O3']:.0f} ppb")
                 st.caption(f"NO₂: {row['NO2']:.0f} ppb")
@@ -262,7 +248,10 @@ else:
                 'Avg O₃': city_data['O3'].mean(),
                 'Avg NO₂': city_data['NO2'].mean(),
                 'Hours > 100 AQI': (city_data['AQI'] > 100).sum(),
-                'Worst Category': get_aqi_category(city_data['AQI'].max())[0]
+                'Worst Category': get_aqi_category(city_data['AQI'].max())[0],
+                'Local Standard': aqi_standards[city_data['Standard'].iloc[0]].name,
+                'Max Local Index': city_data['Index'].max(),
+                'Worst Local Category': city_data.loc[city_data['Index'].idxmax(), 'Index Category']
             }
             stats_data.append(stats)
         
@@ -375,6 +364,9 @@ else:
                 st.write(f"- **{city['City']}**: Limit outdoor activities, especially {city['Hours > 100 AQI']:.0f} hours with unhealthy air")
         else:
             st.success("✅ All compared cities show acceptable air quality for your profile!")
+    
+    else:
+        st.error("❌ No forecasts available. Please run `python train_model.py` first.")
 
 # Export/Share functionality
 if st.session_state.comparison_cities and len(st.session_state.comparison_cities) >= 2:
@@ -396,6 +388,7 @@ if st.session_state.comparison_cities and len(st.session_state.comparison_cities
     with col2:
         if st.button("🔄 Refresh Data"):
             st.cache_data.clear()
+            clear_forecast_cache()
             st.rerun()
     
     with col3:
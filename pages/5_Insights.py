@@ -6,7 +6,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 from datetime import datetime, timedelta
 import calendar
-from utils import get_aqi_category
+from utils import get_aqi_category, in_tempo_coverage
 
 st.set_page_config(page_title="Insights - Mframapa AI", page_icon="💡", layout="wide")
 
@@ -391,7 +391,7 @@ with explorer_tab3:
             lat, lon = coordinates
             
             # Determine region characteristics
-            if -170 <= lon <= -50 and 15 <= lat <= 75:  # North America
+            if in_tempo_coverage(lat, lon):  # North America
                 region = "North America"
                 data_source = "TEMPO + MERRA-2"
                 typical_pm25 = "15-35 μg/m³"
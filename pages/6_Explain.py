@@ -6,6 +6,7 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import os
 import pickle
+from verification import load_skill_table
 
 st.set_page_config(page_title="How It Works - Mframapa AI", page_icon="🔬", layout="wide")
 
@@ -338,6 +339,45 @@ with ml_tab4:
     - R² < 0.6: Model needs improvement
     """)
     
+    # Live skill of archived forecasts verified against observations
+    st.markdown("### Live Forecast Verification")
+    
+    skill_df = load_skill_table()
+    if skill_df.empty:
+        st.info("No issued forecasts have been verified yet. Skill appears here as observations arrive for archived forecasts.")
+    else:
+        skill_regions = ['All regions'] + sorted(skill_df['region'].unique())
+        skill_region = st.selectbox("Region", skill_regions, key="skill_region")
+        
+        if skill_region == 'All regions':
+            # Pool regions by re-weighting with the sample counts
+            pooled = skill_df.assign(
+                sq=skill_df['rmse'] ** 2 * skill_df['n'],
+                abs_sum=skill_df['mae'] * skill_df['n'],
+                err_sum=skill_df['bias'] * skill_df['n']
+            ).groupby(['pollutant', 'lead_bucket'], as_index=False, sort=False)[['n', 'sq', 'abs_sum', 'err_sum']].sum()
+            view = pooled.assign(
+                rmse=np.sqrt(pooled['sq'] / pooled['n']),
+                mae=pooled['abs_sum'] / pooled['n'],
+                bias=pooled['err_sum'] / pooled['n']
+            )[['pollutant', 'lead_bucket', 'n', 'rmse', 'mae', 'bias']]
+        else:
+            view = skill_df[skill_df['region'] == skill_region].drop(columns='region')
+        
+        st.dataframe(
+            view.rename(columns={
+                'pollutant': 'Pollutant', 'lead_bucket': 'Lead Time', 'n': 'Verified',
+                'rmse': 'RMSE', 'mae': 'MAE', 'bias': 'Bias'
+            }).round(2),
+            use_container_width=True
+        )
+        
+        fig_skill = px.line(view, x='lead_bucket', y='rmse', color='pollutant', markers=True,
+                            title='Live RMSE by Lead Time',
+                            labels={'lead_bucket': 'Lead Time', 'rmse': 'RMSE', 'pollutant': 'Pollutant'})
+        fig_skill.update_layout(height=300)
+        st.plotly_chart(fig_skill, use_container_width=True)
+    
     # Accuracy by forecast horizon
     forecast_hours = [6, 12, 18, 24, 30, 36, 42, 48]
     accuracy = [95, 92, 89, 86, 83, 81, 78, 76]
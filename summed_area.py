@@ -0,0 +1,124 @@
+import numpy as np
+
+class SummedAreaTable:
+    """
+    Integral images of a gridded field and of its valid-value counts.
+
+    For every variable the table holds S[i, j], the sum of all cells above
+    and left of (i, j), and the same for the number of valid values. The sum
+    over any rectangle of cells then takes four lookups,
+    S[r1, c1] - S[r0, c1] - S[r1, c0] + S[r0, c0], whatever its size, and
+    many boxes can be evaluated at once with array indexing.
+
+    Cells are addressed on a global grid: row 0 starts at 90°S and column 0
+    at 180°W. Only the rectangle of rows and columns the field occupies is
+    stored, and boxes must not cross the antimeridian.
+    """
+
+    def __init__(self, first_row, first_col, grid_deg, sums, counts):
+        self.first_row = first_row
+        self.first_col = first_col
+        self.grid_deg = grid_deg
+        self.sums = sums
+        self.counts = counts
+        table = next(iter(counts.values()))
+        self.n_rows, self.n_cols = table.shape[0] - 1, table.shape[1] - 1
+
+    @classmethod
+    def from_cells(cls, rows, cols, cell_sums, cell_counts, grid_deg):
+        """
+        Build the tables from per-cell totals.
+
+        Args:
+            rows (np.ndarray): Global row of each occupied cell
+            cols (np.ndarray): Global column of each occupied cell
+            cell_sums (dict): Sum of valid values per cell, per variable
+            cell_counts (dict): Number of valid values per cell, per variable
+            grid_deg (float): Cell size in degrees
+
+        Returns:
+            SummedAreaTable: Or None if there are no cells or variables
+        """
+        if len(rows) == 0 or not cell_sums:
+            return None
+
+        first_row, first_col = int(rows.min()), int(cols.min())
+        shape = (int(rows.max()) - first_row + 1, int(cols.max()) - first_col + 1)
+        local = (rows - first_row, cols - first_col)
+
+        sums = {}
+        counts = {}
+        for name in cell_sums:
+            grid = np.zeros(shape)
+            grid[local] = cell_sums[name]
+            sums[name] = _integral_image(grid)
+
+            grid = np.zeros(shape, dtype=np.int64)
+            grid[local] = cell_counts[name]
+            counts[name] = _integral_image(grid)
+
+        return cls(first_row, first_col, grid_deg, sums, counts)
+
+    def cell_ranges(self, boxes):
+        """
+        Rectangles of cells covered by bounding boxes.
+
+        A box covers the cells whose centres lie inside it; boxes smaller
+        than a cell use the cell containing their centre.
+
+        Args:
+            boxes (np.ndarray): (n, 4) array of (min_lon, min_lat, max_lon, max_lat)
+
+        Returns:
+            tuple: (r0, r1, c0, c1) arrays of half-open ranges into the tables,
+                clipped to the stored field
+        """
+        boxes = np.atleast_2d(np.asarray(boxes, dtype=float))
+        min_lon, min_lat, max_lon, max_lat = boxes.T
+
+        def span(low, high, origin, first):
+            start = np.ceil((low - origin) / self.grid_deg - 0.5).astype(np.int64)
+            end = np.floor((high - origin) / self.grid_deg - 0.5).astype(np.int64) + 1
+            centre = np.floor(((low + high) / 2 - origin) / self.grid_deg).astype(np.int64)
+            tiny = end <= start
+            start = np.where(tiny, centre, start) - first
+            end = np.where(tiny, centre + 1, end) - first
+            return start, end
+
+        r0, r1 = span(min_lat, max_lat, -90.0, self.first_row)
+        c0, c1 = span(min_lon, max_lon, -180.0, self.first_col)
+
+        return (np.clip(r0, 0, self.n_rows), np.clip(r1, 0, self.n_rows),
+                np.clip(c0, 0, self.n_cols), np.clip(c1, 0, self.n_cols))
+
+    def box_stats(self, boxes):
+        """
+        Sums and valid counts of every variable over many boxes.
+
+        Returns:
+            dict: (sums, counts) arrays aligned with boxes, per variable
+        """
+        r0, r1, c0, c1 = self.cell_ranges(boxes)
+        return {
+            name: (_rectangle(self.sums[name], r0, r1, c0, c1),
+                   _rectangle(self.counts[name], r0, r1, c0, c1))
+            for name in self.sums
+        }
+
+    def box_means(self, boxes):
+        """Means of every variable over many boxes, NaN where a box has no valid values."""
+        means = {}
+        for name, (sums, counts) in self.box_stats(boxes).items():
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[name] = np.where(counts > 0, sums / counts, np.nan)
+        return means
+
+def _integral_image(grid):
+    """Summed-area table with a leading row and column of zeros."""
+    table = np.zeros((grid.shape[0] + 1, grid.shape[1] + 1), dtype=grid.dtype)
+    table[1:, 1:] = grid.cumsum(axis=0).cumsum(axis=1)
+    return table
+
+def _rectangle(table, r0, r1, c0, c1):
+    """Totals of the half-open cell rectangles [r0, r1) x [c0, c1)."""
+    return table[r1, c1] - table[r0, c1] - table[r1, c0] + table[r0, c0]
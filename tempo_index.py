@@ -0,0 +1,334 @@
+import numpy as np
+import earthaccess
+import xarray as xr
+import os
+import sys
+import time
+import threading
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from summed_area import SummedAreaTable
+
+TEMPO_INDEX_DIR = os.path.join('cache', 'tempo_index')
+
+# Index cells in degrees (~11 km, a few TEMPO pixels across)
+TEMPO_INDEX_GRID_DEG = 0.1
+
+# Granule variable -> feature name returned by fetch_tempo_data
+TEMPO_GRANULE_VARIABLES = {
+    'vertical_column_troposphere': 'NO2_vertical_column_troposphere',
+    'vertical_column_troposphere_uncertainty': 'NO2_column_uncertainty',
+    'column_uncertainty': 'NO2_column_uncertainty'
+}
+
+# Granule indexes kept in memory across calls
+TEMPO_INDEX_CACHE_SIZE = 64
+
+# Background threads indexing granules a live request found missing
+TEMPO_INDEX_WORKERS = 1
+
+# Forecasts use TEMPO from this many days before the issue day
+TEMPO_SERVING_LAG_DAYS = 30
+
+# Days of TEMPO averaged per forecast
+TEMPO_SERVING_DAYS = 1
+
+# Days indexed by the offline build, ending at the newest served day
+TEMPO_PREBUILD_DAYS = 3
+
+# Area covered by TEMPO (min_lon, min_lat, max_lon, max_lat)
+TEMPO_BOUNDS = (-170.0, 15.0, -50.0, 75.0)
+
+def _open_group(path, group):
+    """A netCDF group as a dataset, or None if the granule has no such group."""
+    try:
+        return xr.open_dataset(path, group=group)
+    except (OSError, ValueError, KeyError):
+        return None
+
+def read_tempo_granule(path):
+    """
+    Valid pixels of a TEMPO L2 granule.
+
+    L2 granules are swaths: latitude and longitude are 2-D arrays over
+    (mirror_step, xtrack) in the 'geolocation' group and the retrievals live
+    in the 'product' group. Granules without groups are read from the root.
+    Pixels flagged by main_data_quality_flag or without a finite position
+    are dropped.
+
+    Args:
+        path (str): Downloaded granule
+
+    Returns:
+        tuple: (lat, lon, dict of values per feature name), flat arrays of
+            the valid pixels
+    """
+    root = xr.open_dataset(path)
+    geolocation = _open_group(path, 'geolocation')
+    product = _open_group(path, 'product')
+    geolocation = root if geolocation is None else geolocation
+    product = root if product is None else product
+
+    try:
+        lat_name = 'latitude' if 'latitude' in geolocation.variables else 'lat'
+        lon_name = 'longitude' if 'longitude' in geolocation.variables else 'lon'
+        lat = np.asarray(geolocation[lat_name].values, dtype=float)
+        lon = np.asarray(geolocation[lon_name].values, dtype=float)
+
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        if 'main_data_quality_flag' in product.variables:
+            valid &= np.asarray(product['main_data_quality_flag'].values) == 0
+
+        values = {}
+        for variable, name in TEMPO_GRANULE_VARIABLES.items():
+            if variable in product.variables and name not in values:
+                data = np.broadcast_to(np.asarray(product[variable].values, dtype=float), lat.shape)
+                values[name] = data[valid]
+
+        return lat[valid], lon[valid], values
+    finally:
+        for dataset in {id(root): root, id(geolocation): geolocation, id(product): product}.values():
+            dataset.close()
+
+class GranuleIndex:
+    """
+    Cell-to-pixel mapping of one swath granule.
+
+    Pixels are binned into grid cells and stored sorted by cell id, with
+    offsets marking where each occupied cell starts (a CSR layout), so the
+    per-cell totals behind summed_area are one reduceat per variable
+    instead of a scan over the whole swath.
+    """
+
+    def __init__(self, cells, offsets, lat, lon, values, grid_deg=TEMPO_INDEX_GRID_DEG):
+        self.cells = cells
+        self.offsets = offsets
+        self.lat = lat
+        self.lon = lon
+        self.values = values
+        self.grid_deg = grid_deg
+        self.n_cols = int(np.ceil(360 / grid_deg))
+        self._summed_area = None
+
+    @classmethod
+    def build(cls, lat, lon, values, grid_deg=TEMPO_INDEX_GRID_DEG):
+        """Index flat pixel arrays."""
+        n_cols = int(np.ceil(360 / grid_deg))
+        rows = np.floor((np.asarray(lat) + 90) / grid_deg).astype(np.int64)
+        cols = np.floor(((np.asarray(lon) + 180) % 360) / grid_deg).astype(np.int64) % n_cols
+        cell_ids = rows * n_cols + cols
+
+        order = np.argsort(cell_ids, kind='stable')
+        cells, starts = np.unique(cell_ids[order], return_index=True)
+        offsets = np.append(starts, len(order)).astype(np.int64)
+
+        return cls(
+            cells,
+            offsets,
+            np.asarray(lat, dtype=np.float32)[order],
+            np.asarray(lon, dtype=np.float32)[order],
+            {name: np.asarray(column, dtype=np.float32)[order] for name, column in values.items()},
+            grid_deg
+        )
+
+    @classmethod
+    def from_granule(cls, path, grid_deg=TEMPO_INDEX_GRID_DEG):
+        """Index the valid pixels of a granule file."""
+        lat, lon, values = read_tempo_granule(path)
+        return cls.build(lat, lon, values, grid_deg)
+
+    def save(self, path):
+        """Write the index as a compressed .npz file."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(
+            path + '.tmp.npz',
+            cells=self.cells,
+            offsets=self.offsets,
+            lat=self.lat,
+            lon=self.lon,
+            grid_deg=self.grid_deg,
+            names=np.array(list(self.values), dtype=str),
+            **{f'value_{position}': column for position, column in enumerate(self.values.values())}
+        )
+        os.replace(path + '.tmp.npz', path)
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by save."""
+        with np.load(path) as data:
+            values = {str(name): data[f'value_{position}'] for position, name in enumerate(data['names'])}
+            return cls(data['cells'], data['offsets'], data['lat'], data['lon'], values, float(data['grid_deg']))
+
+    def summed_area(self):
+        """
+        Summed-area tables of the granule regridded to its index cells.
+
+        Built on first use from the per-cell totals and kept with the index,
+        so box means over this granule cost four lookups per variable.
+
+        Returns:
+            SummedAreaTable: Or None if the granule has no valid pixels
+        """
+        if self._summed_area is None and len(self.cells) > 0:
+            starts = self.offsets[:-1]
+            cell_sums = {}
+            cell_counts = {}
+            for name, column in self.values.items():
+                finite = np.isfinite(column)
+                cell_sums[name] = np.add.reduceat(np.where(finite, column, 0).astype(np.float64), starts)
+                cell_counts[name] = np.add.reduceat(finite.astype(np.int64), starts)
+
+            self._summed_area = SummedAreaTable.from_cells(
+                self.cells // self.n_cols, self.cells % self.n_cols,
+                cell_sums, cell_counts, self.grid_deg
+            )
+        return self._summed_area
+
+def granule_name(granule):
+    """File name of a search result, used as its index key."""
+    links = granule.data_links()
+    if links:
+        return os.path.basename(links[0])
+    return str(granule['meta']['native-id'])
+
+_index_cache = OrderedDict()
+_index_lock = threading.Lock()
+
+def _remember(name, index):
+    with _index_lock:
+        _index_cache[name] = index
+        _index_cache.move_to_end(name)
+        while len(_index_cache) > TEMPO_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+
+def _index_granules(granules, index_dir, download_dir):
+    """Download, index and save granules; returns GranuleIndex per name."""
+    indexes = {}
+    for file in earthaccess.download(granules, local_path=download_dir):
+        name = os.path.basename(str(file))
+        try:
+            index = GranuleIndex.from_granule(str(file))
+            index.save(os.path.join(index_dir, f'{name}.npz'))
+            indexes[name] = index
+            _remember(name, index)
+        except Exception:
+            continue
+        finally:
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+    return indexes
+
+_index_executor = ThreadPoolExecutor(max_workers=TEMPO_INDEX_WORKERS, thread_name_prefix='tempo-index')
+_pending_names = set()
+
+def _index_pending(granules, names, index_dir, download_dir):
+    try:
+        _index_granules(granules, index_dir, download_dir)
+    except Exception:
+        pass
+    finally:
+        with _index_lock:
+            _pending_names.difference_update(names)
+
+def index_in_background(granules, index_dir=TEMPO_INDEX_DIR, download_dir="./temp_data"):
+    """
+    Queue granules for indexing on a background thread.
+
+    Granules already queued are skipped, so repeated requests for the same
+    area do not download a granule twice.
+
+    Returns:
+        int: Number of granules queued
+    """
+    with _index_lock:
+        queued = [granule for granule in granules if granule_name(granule) not in _pending_names]
+        names = {granule_name(granule) for granule in queued}
+        _pending_names.update(names)
+
+    if queued:
+        _index_executor.submit(_index_pending, queued, names, index_dir, download_dir)
+    return len(queued)
+
+def granule_indexes(granules, index_dir=TEMPO_INDEX_DIR, download_dir="./temp_data", download=True):
+    """
+    Spatial indexes of search results, downloading only unindexed granules.
+
+    Indexes are kept in memory and saved to index_dir, so a granule is
+    downloaded and read once however many locations or dates query it.
+    Downloaded files are removed once indexed.
+
+    Args:
+        granules (list): earthaccess search results
+        index_dir (str): Directory of saved granule indexes
+        download_dir (str): Where granules are downloaded to
+        download (bool): Download unindexed granules before returning; if
+            False they are indexed in the background and left out
+
+    Returns:
+        list: GranuleIndex per granule that could be indexed
+    """
+    indexes = {}
+    missing = []
+    for granule in granules:
+        name = granule_name(granule)
+        with _index_lock:
+            cached = _index_cache.get(name)
+        if cached is not None:
+            indexes[name] = cached
+            continue
+
+        path = os.path.join(index_dir, f'{name}.npz')
+        if os.path.exists(path):
+            try:
+                indexes[name] = GranuleIndex.load(path)
+                _remember(name, indexes[name])
+                continue
+            except (OSError, ValueError, KeyError):
+                pass
+        missing.append(granule)
+
+    if missing:
+        if download:
+            indexes.update(_index_granules(missing, index_dir, download_dir))
+        else:
+            index_in_background(missing, index_dir, download_dir)
+
+    return list(indexes.values())
+
+def main():
+    """
+    Index recent TEMPO granules ahead of live forecasts.
+
+    Usage:
+        python tempo_index.py [--days N] [--end YYYY-MM-DD]
+    """
+    print("Building Mframapa AI TEMPO granule indexes...")
+    print("=" * 60)
+
+    days = TEMPO_PREBUILD_DAYS
+    if '--days' in sys.argv:
+        days = int(sys.argv[sys.argv.index('--days') + 1])
+    end = datetime.now() - timedelta(days=TEMPO_SERVING_LAG_DAYS)
+    if '--end' in sys.argv:
+        end = datetime.strptime(sys.argv[sys.argv.index('--end') + 1], '%Y-%m-%d')
+    start = end - timedelta(days=days - 1)
+
+    if not earthaccess.login().authenticated:
+        print("FAILED: Could not log in to NASA Earthdata")
+        return
+
+    started = time.time()
+    granules = earthaccess.search_data(
+        short_name="TEMPO_NO2_L2",
+        temporal=(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')),
+        bounding_box=TEMPO_BOUNDS
+    )
+    indexes = granule_indexes(granules or [])
+    print(f"Indexed {len(indexes)} of {len(granules or [])} granules from {start:%Y-%m-%d} to {end:%Y-%m-%d} "
+          f"in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import (
+    AQI_BREAKPOINTS,
+    AQI_POLLUTANTS,
+    calculate_aqi_arrays,
+    calculate_aqi_from_components,
+    get_aqi_category,
+    get_aqi_standard,
+    load_aqi_standards,
+    nowcast,
+    StreamingAQIEngine
+)
+
+
+def test_epa_table_matches_scalar_breakpoints():
+    standard = get_aqi_standard('EPA')
+    for pollutant, breakpoints in AQI_BREAKPOINTS.items():
+        concentrations, index_values = map(np.array, zip(*breakpoints))
+        np.testing.assert_array_equal(standard.pollutants[pollutant]['c'], concentrations)
+        np.testing.assert_array_equal(standard.pollutants[pollutant]['index'], index_values)
+
+
+def test_standard_tables_are_well_formed():
+    for key, standard in load_aqi_standards()['standards'].items():
+        assert np.all(np.diff(standard.category_upper) > 0), key
+        assert len(standard.category_labels) == len(standard.category_colors)
+        for pollutant, table in standard.pollutants.items():
+            assert table['averaging_hours'] in (1, 8, 24), (key, pollutant)
+            if standard.method == 'linear':
+                assert np.all(np.diff(table['c']) > 0), (key, pollutant)
+                assert np.all(np.diff(table['index']) > 0), (key, pollutant)
+            else:
+                assert np.all(np.diff(table['upper']) > 0), (key, pollutant)
+                assert len(table['levels']) == len(table['upper']) + 1, (key, pollutant)
+
+
+def test_arrays_match_scalar():
+    rng = np.random.default_rng(0)
+    pm25 = np.concatenate([rng.gamma(2.0, 15.0, 2000), [0, 12, 35.4, 600]])
+    o3 = np.concatenate([rng.gamma(3.0, 15.0, 2000), [0, 54, 70, 400]])
+    no2 = np.concatenate([rng.gamma(2.0, 20.0, 2000), [0, 53, 100, 3000]])
+
+    vector = calculate_aqi_arrays(pm25, o3, no2)
+    for position in range(len(pm25)):
+        scalar = calculate_aqi_from_components(pm25[position], o3[position], no2[position])
+        for pollutant in AQI_POLLUTANTS:
+            assert vector[pollutant][position] == scalar[pollutant]
+        assert vector['Overall'][position] == scalar['Overall']
+
+
+def test_arrays_ignore_missing_pollutants():
+    result = calculate_aqi_arrays([10.0, np.nan], [np.nan, np.nan], None)
+    assert result['Overall'][0] == calculate_aqi_from_components(pm25=10.0)['Overall']
+    assert result['Dominant'][0] == AQI_POLLUTANTS.index('PM2.5')
+    assert result['Overall'][1] == 0
+    assert result['Dominant'][1] == -1
+
+
+def test_category_of_missing_value_is_top_category():
+    assert get_aqi_category(np.nan) == get_aqi_category(501)
+    assert get_aqi_category(30)[0] == 'Good'
+
+
+def test_averaged_uses_trailing_window_per_series():
+    frame = pd.DataFrame({
+        'city': ['a'] * 4 + ['b'] * 2,
+        'time': list(pd.date_range('2026-01-01', periods=4, freq='3h'))
+        + list(pd.date_range('2026-01-01', periods=2, freq='3h')),
+        'PM2.5': [10.0, 20.0, 30.0, 40.0, 5.0, 15.0],
+        'O3': [30.0, 60.0, 90.0, 120.0, 1.0, 3.0],
+        'NO2': [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+    })
+    averaged = get_aqi_standard('EPA').averaged(frame)
+
+    np.testing.assert_allclose(averaged['PM2.5'], [10, 15, 20, 25, 5, 10])
+    # 8-hour ozone window at 09:00 covers 03:00, 06:00 and 09:00
+    np.testing.assert_allclose(averaged['O3'], [30, 45, 60, 90, 1, 2])
+    np.testing.assert_allclose(averaged['NO2'], frame['NO2'])
+
+
+def test_nowcast_constant_series():
+    assert nowcast(np.full(12, 20.0)) == pytest.approx(20.0)
+
+
+def test_nowcast_epa_example():
+    # Weight factor min/max = 0.5, so hours are weighted 1, 0.5, 0.25, ...
+    values = np.array([40.0, 20.0] + [30.0] * 10)
+    weights = 0.5 ** np.arange(12)
+    assert nowcast(values) == pytest.approx(np.sum(weights * values) / weights.sum())
+
+
+def test_nowcast_weight_floor():
+    values = np.array([100.0, 1.0, 1.0, 1.0])
+    weights = 0.5 ** np.arange(4)
+    assert nowcast(values) == pytest.approx(np.sum(weights * values) / weights.sum())
+
+
+def test_nowcast_requires_two_of_last_three_hours():
+    assert np.isnan(nowcast(np.array([10.0, np.nan, np.nan, 10.0, 10.0])))
+    assert nowcast(np.array([10.0, np.nan, 10.0, 10.0])) == pytest.approx(10.0)
+    # A stream that has only just started
+    assert nowcast(np.array([15.0])) == pytest.approx(15.0)
+
+
+def test_engine_flags_warm_up_and_seeding_completes_windows():
+    times = pd.date_range('2026-01-01 12:00', periods=6, freq='h')
+    values = np.full(6, 40.0)
+
+    cold = StreamingAQIEngine().run(times, values, values, values)
+    assert not cold['Complete'].iloc[0]
+    assert cold['Complete'].iloc[-1]
+
+    history = {'PM2.5': np.full(24, 20.0), 'O3': np.full(24, 30.0)}
+    seeded = StreamingAQIEngine().run(times, values, values, values, history=history)
+    assert seeded['Complete'].all()
+    assert seeded['O3_8h'].iloc[0] == pytest.approx((7 * 30.0 + 40.0) / 8)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from charting import lttb_indices
+
+
+def test_short_series_is_kept_whole():
+    np.testing.assert_array_equal(lttb_indices(np.arange(10), np.arange(10), 20), np.arange(10))
+    np.testing.assert_array_equal(lttb_indices(np.arange(10), np.arange(10), 2), np.arange(10))
+
+
+def test_keeps_endpoints_and_sorted_unique_indices():
+    rng = np.random.default_rng(1)
+    y = rng.normal(size=1000)
+    indices = lttb_indices(np.arange(1000), y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0
+    assert indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_preserves_spikes():
+    y = np.zeros(1000)
+    y[[137, 612]] = [50.0, -40.0]
+    indices = lttb_indices(np.arange(1000), y, 50)
+    assert 137 in indices
+    assert 612 in indices
+
+
+def test_accepts_datetimes():
+    times = pd.date_range('2026-01-01', periods=500, freq='h')
+    y = np.sin(np.arange(500) / 10.0)
+    indices = lttb_indices(times.values, y, 60)
+    assert len(indices) == 60
+    assert indices[-1] == 499
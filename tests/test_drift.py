@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from drift import psi, ks_statistic
+
+
+def test_psi_identical_histograms_is_zero():
+    counts = np.array([10, 20, 30, 40])
+    assert psi(counts, counts) == pytest.approx(0.0, abs=1e-9)
+
+
+def test_psi_matches_formula():
+    expected = np.array([0.25, 0.25, 0.25, 0.25])
+    actual = np.array([0.1, 0.2, 0.3, 0.4])
+    formula = np.sum((actual - expected) * np.log(actual / expected))
+    assert psi(expected * 1e6, actual * 1e6) == pytest.approx(formula, rel=1e-4)
+
+
+def test_psi_is_symmetric_and_grows_with_shift():
+    base = np.array([5, 20, 50, 20, 5])
+    small = np.array([4, 18, 50, 22, 6])
+    large = np.array([1, 5, 20, 50, 24])
+    assert psi(base, small) == pytest.approx(psi(small, base))
+    assert 0 < psi(base, small) < psi(base, large)
+
+
+def test_psi_tolerates_empty_bins():
+    assert np.isfinite(psi([0, 10, 10], [10, 0, 10]))
+
+
+def test_ks_statistic():
+    assert ks_statistic([1, 1], [1, 1]) == 0.0
+    assert ks_statistic([1, 0], [0, 1]) == pytest.approx(1.0)
+    assert ks_statistic([0, 0], [1, 1]) == 0.0
@@ -0,0 +1,57 @@
+import numpy as np
+
+from summed_area import SummedAreaTable
+
+
+def _brute_force(lats, lons, values, box):
+    min_lon, min_lat, max_lon, max_lat = box
+    inside = (lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)
+    valid = inside & np.isfinite(values)
+    return values[valid].sum(), valid.sum()
+
+
+def test_box_stats_match_brute_force():
+    grid_deg = 0.5
+    rng = np.random.default_rng(2)
+    rows = np.repeat(np.arange(200, 210), 12)
+    cols = np.tile(np.arange(100, 112), 10)
+    values = rng.normal(10.0, 3.0, len(rows))
+    values[rng.random(len(rows)) < 0.2] = np.nan
+
+    valid = np.isfinite(values)
+    table = SummedAreaTable.from_cells(
+        rows, cols, {'no2': np.where(valid, values, 0.0)}, {'no2': valid.astype(int)}, grid_deg
+    )
+
+    # Cell centres in degrees
+    lats = -90.0 + (rows + 0.5) * grid_deg
+    lons = -180.0 + (cols + 0.5) * grid_deg
+
+    boxes = np.array([
+        [-130.0, 10.0, -124.0, 15.0],
+        [-128.2, 11.1, -126.9, 13.4],
+        [-140.0, 0.0, -100.0, 30.0],
+        [-129.0, 12.0, -128.0, 12.4]
+    ])
+    sums, counts = table.box_stats(boxes)['no2']
+
+    for position, box in enumerate(boxes):
+        expected_sum, expected_count = _brute_force(lats, lons, values, box)
+        assert counts[position] == expected_count
+        np.testing.assert_allclose(sums[position], expected_sum)
+
+
+def test_box_smaller_than_a_cell_uses_the_containing_cell():
+    table = SummedAreaTable.from_cells(
+        np.array([0, 0]), np.array([0, 1]), {'v': np.array([3.0, 5.0])}, {'v': np.array([1, 1])}, 1.0
+    )
+    sums, counts = table.box_stats([[-178.6, -89.6, -178.4, -89.4]])['v']
+    assert sums[0] == 5.0
+    assert counts[0] == 1
+
+
+def test_boxes_outside_the_field_are_empty():
+    table = SummedAreaTable.from_cells(
+        np.array([5]), np.array([5]), {'v': np.array([2.0])}, {'v': np.array([1])}, 1.0
+    )
+    assert np.isnan(table.box_means([[0.0, 0.0, 10.0, 10.0]])['v'][0])
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+
+from train_model import AirQualityModelTrainer
+from utils import add_lag_features, lag_feature_names
+
+
+def _observations():
+    rng = np.random.default_rng(4)
+    dates = pd.date_range('2025-01-01', periods=60, freq='D')
+    frames = []
+    for site, parameter in (('s1', 'O3'), ('s1', 'PM2.5'), ('s2', 'O3')):
+        frames.append(pd.DataFrame({
+            'site_id': site,
+            'parameter': parameter,
+            'date': dates,
+            'Latitude': 34.0 if site == 's1' else 40.0,
+            'Longitude': -118.0 if site == 's1' else -74.0,
+            'value': rng.gamma(3.0, 10.0, len(dates))
+        }))
+    data = pd.concat(frames, ignore_index=True)
+    # A gap so some lags are genuinely missing
+    return data.drop(index=data.index[(data['site_id'] == 's2') & (data['date'] == '2025-02-20')])
+
+
+def _features(data):
+    features = data[['Latitude', 'Longitude', 'date']].drop_duplicates().reset_index(drop=True)
+    features['merra2_T2M'] = 288.15 + np.arange(len(features)) % 7
+    return features
+
+
+def test_update_lags_match_full_recompute():
+    data = _observations()
+    features = _features(data)
+    last_date = pd.Timestamp('2025-02-15')
+    keys = ['site_id', 'parameter', 'date']
+    columns = lag_feature_names()
+
+    trainer = AirQualityModelTrainer()
+    trainer.merge_and_engineer_features(data[data['date'] <= last_date], features)
+    update = trainer.merge_and_engineer_features(data, features, fit_encoders=False, since=last_date)
+
+    full = add_lag_features(data)
+    expected = full[full['date'] > last_date].set_index(keys).sort_index()
+    update = update.set_index(keys).sort_index()
+
+    assert update.index.min()[2] > last_date
+    assert update.index.equals(expected.index)
+    # Missing lags are filled with the training medians in the update
+    known = expected[columns].notna()
+    assert (~known).any().any()
+    np.testing.assert_allclose(update[columns].where(known), expected[columns])
+
+
+def test_update_fills_missing_values_with_training_medians():
+    data = _observations()
+    features = _features(data)
+    last_date = pd.Timestamp('2025-02-15')
+
+    trainer = AirQualityModelTrainer()
+    trainer.merge_and_engineer_features(data[data['date'] <= last_date], features)
+    medians = dict(trainer.feature_medians)
+
+    update = trainer.merge_and_engineer_features(data, features, fit_encoders=False, since=last_date)
+    gap_row = update[(update['site_id'] == 's2') & (update['date'] == '2025-02-21')].iloc[0]
+    assert gap_row['value_lag_1d'] == medians['value_lag_1d']
+    assert trainer.feature_medians == medians
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from verification import SkillAccumulator
+
+
+def _errors(values, pollutant='O3', region='North America', bucket='0-6 h'):
+    return pd.DataFrame({
+        'pollutant': pollutant,
+        'region': region,
+        'lead_bucket': bucket,
+        'error': values
+    })
+
+
+def test_skill_matches_batch_statistics():
+    rng = np.random.default_rng(3)
+    errors = rng.normal(1.0, 4.0, 500)
+
+    accumulator = SkillAccumulator()
+    for chunk in np.array_split(errors, 7):
+        accumulator.update(_errors(chunk))
+
+    row = accumulator.to_frame().iloc[0]
+    assert row['n'] == len(errors)
+    assert row['rmse'] == pytest.approx(np.sqrt(np.mean(errors ** 2)))
+    assert row['mae'] == pytest.approx(np.mean(np.abs(errors)))
+    assert row['bias'] == pytest.approx(np.mean(errors))
+
+
+def test_skill_is_kept_per_key():
+    accumulator = SkillAccumulator()
+    accumulator.update(pd.concat([
+        _errors([1.0, -1.0], pollutant='O3'),
+        _errors([2.0], pollutant='NO2')
+    ], ignore_index=True))
+    accumulator.update(None)
+
+    skill = accumulator.to_frame().set_index('pollutant')
+    assert skill.loc['O3', 'n'] == 2
+    assert skill.loc['O3', 'bias'] == pytest.approx(0.0)
+    assert skill.loc['NO2', 'rmse'] == pytest.approx(2.0)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'stats.json')
+    accumulator = SkillAccumulator()
+    accumulator.update(_errors([1.0, 2.0, 3.0]))
+    accumulator.watermarks['series'] = '2026-01-01T00:00:00'
+    accumulator.save(path)
+
+    loaded = SkillAccumulator.load(path)
+    assert loaded.sums == accumulator.sums
+    assert loaded.watermarks == accumulator.watermarks
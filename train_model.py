@@ -1,18 +1,326 @@
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import datetime
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from sklearn.preprocessing import LabelEncoder
 import os
 import sys
+import json
+import time
+import hashlib
+import pickle
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from utils import (
     process_training_data, 
     fetch_merra2_data, 
-    fetch_tempo_data,
-    get_lat_lon
+    fetch_tempo_box_means,
+    in_tempo_coverage,
+    get_lat_lon,
+    add_lag_features,
+    MODEL_UNITS,
+    LEGACY_MODEL_UNITS
 )
+from historical_store import build_history_store, HISTORY_STORE_DIR
+from merra2 import MERRA2_COLLECTIONS
+from tempo_index import TEMPO_GRANULE_VARIABLES, TEMPO_INDEX_GRID_DEG
+from climatology import CLIMATOLOGY_DIR
+from drift import build_feature_profile, save_feature_profile
+
+# Peak memory reporting is only available on Unix
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Default XGBoost configuration shared by all pollutant models
+XGB_PARAMS = {
+    'n_estimators': 1000,
+    'max_depth': 6,
+    'learning_rate': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'tree_method': 'hist',
+    'random_state': 42
+}
+
+EARLY_STOPPING_ROUNDS = 50
+
+# Bump whenever feature engineering changes so cached matrices are rebuilt
+FEATURE_CODE_VERSION = 3
+
+FEATURE_CACHE_DIR = os.path.join('cache', 'features')
+
+# Months of ground truth kept for training; the cutoff snaps to a month start
+# so the feature cache stays valid between runs within the same month
+TRAINING_WINDOW_MONTHS = 24
+
+# Rows per batch handed to XGBoost in external-memory training
+EXTERNAL_BATCH_SIZE = 100_000
+
+def train_pollutant_model(X, y, n_jobs=1, params=None):
+    """
+    Train and evaluate a single pollutant model.
+    
+    Runs in a worker process, so it is kept at module level to be picklable.
+    
+    Args:
+        X (pd.DataFrame): Feature matrix, sorted by date
+        y (pd.Series): Target values
+        n_jobs (int): Number of threads available to this worker
+        params (dict): Overrides for the default XGBoost parameters
+        
+    Returns:
+        dict: Trained model, evaluation metrics and training statistics
+    """
+    start_time = time.perf_counter()
+    
+    # Rows are in date order, so hold out the most recent data as the test
+    # set and the period just before it as validation for early stopping
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, shuffle=False
+    )
+    X_train, X_val, y_train, y_val = train_test_split(
+        X_train, y_train, test_size=0.1, shuffle=False
+    )
+    
+    model = xgb.XGBRegressor(
+        **{**XGB_PARAMS, **(params or {})},
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        n_jobs=n_jobs
+    )
+    
+    model.fit(
+        X_train, y_train,
+        eval_set=[(X_val, y_val)],
+        verbose=False
+    )
+    
+    # Evaluate model
+    y_pred = model.predict(X_test)
+    
+    return {
+        'model': model,
+        'rmse': float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        'mae': float(mean_absolute_error(y_test, y_pred)),
+        'r2': float(r2_score(y_test, y_pred)),
+        'best_iteration': int(model.best_iteration),
+        'train_seconds': time.perf_counter() - start_time,
+        'n_train': len(X_train),
+        'n_val': len(X_val),
+        'n_test': len(X_test)
+    }
+
+# Hyperparameter search space for the pollutant models
+PARAM_SPACE = {
+    'max_depth': [3, 4, 6, 8, 10],
+    'learning_rate': [0.01, 0.03, 0.05, 0.1, 0.2],
+    'subsample': [0.6, 0.7, 0.8, 0.9, 1.0],
+    'colsample_bytree': [0.6, 0.7, 0.8, 0.9, 1.0],
+    'min_child_weight': [1, 3, 5, 10],
+    'reg_lambda': [0.1, 1.0, 5.0, 10.0]
+}
+
+def rolling_origin_splits(dates, n_folds=5, min_train_fraction=0.5):
+    """
+    Build rolling-origin (expanding window) cross-validation folds.
+    
+    Folds are cut on unique dates so that every row of a given day falls on the
+    same side of the split, and validation data always lies after training data.
+    
+    Args:
+        dates (pd.Series): Observation date of each row
+        n_folds (int): Number of validation folds
+        min_train_fraction (float): Share of the dates always kept for training
+        
+    Returns:
+        list: (train_index, val_index) arrays of row positions
+    """
+    dates = pd.to_datetime(pd.Series(dates)).values
+    unique_dates = np.unique(dates)
+    
+    n_initial = int(len(unique_dates) * min_train_fraction)
+    fold_size = (len(unique_dates) - n_initial) // n_folds
+    
+    if n_initial == 0 or fold_size == 0:
+        return []
+    
+    splits = []
+    for fold in range(n_folds):
+        train_end = unique_dates[n_initial + fold * fold_size]
+        val_end = unique_dates[min(n_initial + (fold + 1) * fold_size, len(unique_dates) - 1)]
+        
+        train_index = np.flatnonzero(dates < train_end)
+        if fold == n_folds - 1:
+            val_index = np.flatnonzero(dates >= train_end)
+        else:
+            val_index = np.flatnonzero((dates >= train_end) & (dates < val_end))
+        splits.append((train_index, val_index))
+    
+    return splits
+
+def sample_param_candidates(n_candidates, seed=42):
+    """
+    Draw random hyperparameter candidates from PARAM_SPACE.
+    
+    Args:
+        n_candidates (int): Number of candidates to draw
+        seed (int): Random seed for reproducible searches
+        
+    Returns:
+        list: Parameter dictionaries
+    """
+    rng = np.random.default_rng(seed)
+    return [
+        {name: values[rng.integers(len(values))] for name, values in PARAM_SPACE.items()}
+        for _ in range(n_candidates)
+    ]
+
+def evaluate_fold(X_train, y_train, X_val, y_val, params, n_estimators, n_jobs=1):
+    """
+    Fit one candidate on one cross-validation fold.
+    
+    Early stopping watches the most recent tenth of the training rows, as
+    in train_pollutant_model, so the validation rows only score the fit.
+    
+    Runs in a worker process, so it is kept at module level to be picklable.
+    
+    Args:
+        X_train, y_train: Training rows for the fold, sorted by date
+        X_val, y_val: Validation rows for the fold
+        params (dict): Candidate hyperparameters
+        n_estimators (int): Tree budget for this evaluation
+        n_jobs (int): Number of threads available to this worker
+        
+    Returns:
+        dict: Validation metrics and fit cost
+    """
+    start_time = time.perf_counter()
+    
+    X_fit, X_stop, y_fit, y_stop = train_test_split(
+        X_train, y_train, test_size=0.1, shuffle=False
+    )
+    
+    model = xgb.XGBRegressor(
+        **{**XGB_PARAMS, **params, 'n_estimators': n_estimators},
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        n_jobs=n_jobs
+    )
+    model.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)], verbose=False)
+    
+    y_pred = model.predict(X_val)
+    
+    return {
+        'rmse': float(np.sqrt(mean_squared_error(y_val, y_pred))),
+        'mae': float(mean_absolute_error(y_val, y_pred)),
+        'best_iteration': int(model.best_iteration),
+        'fit_seconds': time.perf_counter() - start_time
+    }
+
+def training_cutoff(now=None):
+    """First day of the training window, pinned to the start of a month."""
+    month_start = pd.Timestamp(now or datetime.now()).normalize().replace(day=1)
+    return month_start - pd.DateOffset(months=TRAINING_WINDOW_MONTHS)
+
+def feature_source_versions(climatology_dir=CLIMATOLOGY_DIR):
+    """
+    Describe the satellite sources behind the engineered features.
+    
+    Args:
+        climatology_dir (str): Directory of the climatology cube used as fallback
+        
+    Returns:
+        dict: JSON-serializable description of the MERRA-2, TEMPO and climatology inputs
+    """
+    climatology = None
+    meta_path = os.path.join(climatology_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            climatology = json.load(f).get('built_at')
+    
+    return {
+        'merra2': MERRA2_COLLECTIONS,
+        'tempo': {'variables': TEMPO_GRANULE_VARIABLES, 'grid_deg': TEMPO_INDEX_GRID_DEG},
+        'climatology': climatology
+    }
+
+def dataset_fingerprint(ground_truth_data, cutoff=None):
+    """
+    Fingerprint the raw training inputs together with the feature code version.
+    
+    Args:
+        ground_truth_data (pd.DataFrame): Ground truth records fed to the pipeline
+        cutoff (pd.Timestamp): Start of the training window the records were filtered to
+        
+    Returns:
+        str: Hex digest identifying the engineered feature matrices
+    """
+    digest = hashlib.sha256()
+    digest.update(f'features-v{FEATURE_CODE_VERSION}'.encode())
+    digest.update(f'cutoff-{cutoff}'.encode())
+    digest.update(json.dumps(feature_source_versions(), sort_keys=True, default=str).encode())
+    digest.update(','.join(map(str, ground_truth_data.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(ground_truth_data, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+def model_path_for(pollutant, model_dir='models'):
+    """Path of the saved booster for a pollutant, as read by the Forecast page."""
+    return os.path.join(model_dir, f'xgboost_model_{pollutant.lower().replace(".", "")}.json')
+
+def peak_rss_mb():
+    """Peak resident set size of this process in megabytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+def format_peak_rss():
+    """Peak resident set size for training reports, e.g. '512 MB'."""
+    peak = peak_rss_mb()
+    return 'unavailable' if peak is None else f"{peak:.0f} MB"
+
+class ParquetShardIter(xgb.DataIter):
+    """
+    XGBoost data iterator streaming feature batches from Parquet shards.
+    
+    Only one batch of batch_size rows is held in memory at a time; XGBoost
+    pages the quantized data to its external-memory cache between batches.
+    """
+    
+    def __init__(self, shard_paths, feature_columns, batch_size=EXTERNAL_BATCH_SIZE,
+                 cache_prefix=None):
+        self.shard_paths = shard_paths
+        self.feature_columns = feature_columns
+        self.batch_size = batch_size
+        self._batches = None
+        super().__init__(cache_prefix=cache_prefix)
+    
+    def iter_frames(self):
+        """Yield (X, y) batches across all shards in order."""
+        columns = self.feature_columns + ['value']
+        for path in self.shard_paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=self.batch_size, columns=columns):
+                frame = batch.to_pandas()
+                X = frame[self.feature_columns].astype(np.float32).fillna(0)
+                y = frame['value'].astype(np.float32)
+                yield X, y.fillna(y.median())
+    
+    def next(self, input_data):
+        if self._batches is None:
+            self._batches = self.iter_frames()
+        try:
+            X, y = next(self._batches)
+        except StopIteration:
+            return False
+        input_data(data=X, label=y)
+        return True
+    
+    def reset(self):
+        self._batches = None
 
 class AirQualityModelTrainer:
     """
@@ -23,6 +331,13 @@ class AirQualityModelTrainer:
         self.models = {}
         self.label_encoders = {}
         self.feature_columns = []
+        self.best_params = {}
+        self.metrics = {}
+        self.feature_profile = None
+        self.model_units = MODEL_UNITS
+        self.feature_fingerprint = None
+        self.feature_medians = {}
+        self.training_cutoff = None
         
     def load_ground_truth_data(self):
         """
@@ -43,12 +358,12 @@ class AirQualityModelTrainer:
         print(f"Loaded {len(ground_truth_data)} ground truth records")
         
         # Filter data to recent years for better model performance
-        cutoff_date = datetime.now() - timedelta(days=730)  # 2 years
+        self.training_cutoff = training_cutoff()
         ground_truth_data = ground_truth_data[
-            ground_truth_data['date'] >= cutoff_date
+            ground_truth_data['date'] >= self.training_cutoff
         ]
         
-        print(f"Filtered to {len(ground_truth_data)} records from last 2 years")
+        print(f"Filtered to {len(ground_truth_data)} records since {self.training_cutoff.date()}")
         
         return ground_truth_data
     
@@ -64,13 +379,31 @@ class AirQualityModelTrainer:
         """
         print("Fetching satellite and weather features...")
         
-        # Get unique locations and dates
-        unique_locations = ground_truth_data[['Latitude', 'Longitude', 'date']].drop_duplicates()
+        # Get unique locations and dates; walking them day by day lets all
+        # sites of a day share its MERRA-2 granules before they are evicted
+        unique_locations = (
+            ground_truth_data[['Latitude', 'Longitude', 'date']]
+            .drop_duplicates()
+            .sort_values('date', kind='stable')
+        )
+        
+        # TEMPO box means of all North American sites, one batch per date
+        in_tempo_domain = in_tempo_coverage(unique_locations['Latitude'], unique_locations['Longitude'])
+        tempo_by_site = {}
+        for date, sites in unique_locations[in_tempo_domain].groupby('date'):
+            date_str = date.strftime('%Y-%m-%d')
+            bounding_boxes = [
+                (lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5)
+                for lat, lon in zip(sites['Latitude'], sites['Longitude'])
+            ]
+            tempo_results = fetch_tempo_box_means(bounding_boxes, date_str, date_str)
+            for lat, lon, tempo_data in zip(sites['Latitude'], sites['Longitude'], tempo_results):
+                tempo_by_site[(lat, lon, date)] = tempo_data
         
         feature_data = []
         total_locations = len(unique_locations)
         
-        for idx, row in unique_locations.iterrows():
+        for idx, (_, row) in enumerate(unique_locations.iterrows()):
             if idx % 10 == 0:  # Progress update every 10 locations
                 print(f"Processing location {idx + 1}/{total_locations}")
             
@@ -91,21 +424,27 @@ class AirQualityModelTrainer:
             
             try:
                 # Fetch MERRA-2 data (global coverage)
+                filled = []
                 merra_data = fetch_merra2_data(lat, lon, date_str, date_str)
                 if merra_data:
+                    merra_data = dict(merra_data)
+                    filled += [f'merra2_{key}' for key in merra_data.pop('_filled', [])]
                     for key, value in merra_data.items():
                         if isinstance(value, (np.ndarray, list)) and len(value) > 0:
                             features[f'merra2_{key}'] = np.mean(value)
                         elif isinstance(value, (int, float)):
                             features[f'merra2_{key}'] = value
                 
-                # Fetch TEMPO data for North American locations
-                if -170 <= lon <= -50 and 15 <= lat <= 75:  # North America bounds
-                    bounding_box = (lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5)
-                    tempo_data = fetch_tempo_data(bounding_box, date_str, date_str)
-                    if tempo_data:
-                        for key, value in tempo_data.items():
-                            features[f'tempo_{key}'] = value
+                # TEMPO data for North American locations
+                tempo_data = tempo_by_site.get((lat, lon, date))
+                if tempo_data:
+                    tempo_data = dict(tempo_data)
+                    filled += [f'tempo_{key}' for key in tempo_data.pop('_filled', [])]
+                    for key, value in tempo_data.items():
+                        features[f'tempo_{key}'] = value
+                
+                # Satellite features taken from the climatology instead of granules
+                features['filled_features'] = ','.join(filled)
                 
                 # Add seasonal features
                 features['season'] = (date.month - 1) // 3  # 0=Winter, 1=Spring, 2=Summer, 3=Fall
@@ -124,19 +463,29 @@ class AirQualityModelTrainer:
         
         return feature_df
     
-    def merge_and_engineer_features(self, ground_truth_data, feature_data):
+    def merge_and_engineer_features(self, ground_truth_data, feature_data, fit_encoders=True, since=None):
         """
         Merge ground truth data with satellite features and create additional features.
         
         Args:
             ground_truth_data (pd.DataFrame): Ground truth air quality data
             feature_data (pd.DataFrame): Satellite feature data
+            fit_encoders (bool): Fit new label encoders and fill values, or reuse
+                the loaded ones so incremental updates match the current models
+            since (datetime): Keep only rows after this date; earlier rows
+                still provide the lag and rolling history
             
         Returns:
             pd.DataFrame: Complete dataset with all features
         """
         print("Merging data and engineering features...")
         
+        # Lag and rolling features come from the full ground-truth history,
+        # before the inner merge drops dates without satellite features
+        ground_truth_data = add_lag_features(ground_truth_data)
+        if since is not None:
+            ground_truth_data = ground_truth_data[ground_truth_data['date'] > since]
+        
         # Merge datasets
         merged_data = ground_truth_data.merge(
             feature_data,
@@ -146,19 +495,28 @@ class AirQualityModelTrainer:
         
         print(f"Merged dataset has {len(merged_data)} records")
         
-        # Handle missing values
+        # Handle missing values with the medians of the full training data
         numeric_columns = merged_data.select_dtypes(include=[np.number]).columns
-        merged_data[numeric_columns] = merged_data[numeric_columns].fillna(
-            merged_data[numeric_columns].median()
-        )
+        medians = merged_data[numeric_columns].median()
+        if fit_encoders:
+            self.feature_medians = {col: float(value) for col, value in medians.dropna().items()}
+        else:
+            medians = pd.Series(self.feature_medians, dtype=float).reindex(numeric_columns).fillna(medians)
+        merged_data[numeric_columns] = merged_data[numeric_columns].fillna(medians)
         
         # Encode categorical variables
         categorical_columns = ['parameter', 'site_id']
         for col in categorical_columns:
-            if col in merged_data.columns:
+            if col not in merged_data.columns:
+                continue
+            if fit_encoders or col not in self.label_encoders:
                 le = LabelEncoder()
                 merged_data[f'{col}_encoded'] = le.fit_transform(merged_data[col].astype(str))
                 self.label_encoders[col] = le
+            else:
+                # Unseen categories get -1 instead of failing the update
+                classes = {c: i for i, c in enumerate(self.label_encoders[col].classes_)}
+                merged_data[f'{col}_encoded'] = merged_data[col].astype(str).map(classes).fillna(-1).astype(int)
         
         # Create interaction features
         if 'merra2_T2M' in merged_data.columns and 'merra2_RH2M' in merged_data.columns:
@@ -179,91 +537,740 @@ class AirQualityModelTrainer:
         
         return merged_data
     
-    def train_models(self, data):
+    def prepare_pollutant_data(self, data):
         """
-        Train separate XGBoost models for each pollutant type.
+        Split the training dataset into per-pollutant feature matrices.
         
         Args:
             data (pd.DataFrame): Complete training dataset
             
         Returns:
-            dict: Trained models for each pollutant
+            dict: (X, y, dates) per pollutant, sorted by date
         """
-        print("Training XGBoost models...")
-        
         # Define feature columns (exclude target and identifier columns)
-        exclude_columns = ['value', 'value_log', 'parameter', 'date', 'site_id']
+        exclude_columns = ['value', 'value_log', 'parameter', 'date', 'site_id', 'filled_features']
         self.feature_columns = [col for col in data.columns if col not in exclude_columns]
         
         print(f"Using {len(self.feature_columns)} features for training")
         
-        # Train separate models for each pollutant
-        pollutants = data['parameter'].unique()
-        results = {}
-        
-        for pollutant in pollutants:
-            print(f"\nTraining model for {pollutant}...")
-            
-            # Filter data for current pollutant
-            pollutant_data = data[data['parameter'] == pollutant].copy()
+        jobs = {}
+        for pollutant in data['parameter'].unique():
+            pollutant_data = data[data['parameter'] == pollutant].sort_values('date')
             
             if len(pollutant_data) < 50:  # Minimum data requirement
                 print(f"Insufficient data for {pollutant} ({len(pollutant_data)} records)")
                 continue
             
-            # Prepare features and target
-            X = pollutant_data[self.feature_columns]
+            # Prepare features and target, handling remaining NaN values
+            X = pollutant_data[self.feature_columns].fillna(0)
             y = pollutant_data['value']
-            
-            # Handle remaining NaN values
-            X = X.fillna(0)
             y = y.fillna(y.median())
+            jobs[pollutant] = (X, y, pollutant_data['date'])
+        
+        return jobs
+    
+    def save_feature_cache(self, jobs, fingerprint, cache_dir=FEATURE_CACHE_DIR):
+        """
+        Persist per-pollutant feature matrices as .npy files plus metadata.
+        
+        Args:
+            jobs (dict): (X, y, dates) per pollutant from prepare_pollutant_data
+            fingerprint (str): Dataset fingerprint from dataset_fingerprint
+            cache_dir (str): Root directory of the feature cache
+        """
+        path = os.path.join(cache_dir, fingerprint)
+        os.makedirs(path, exist_ok=True)
+        
+        pollutants = {}
+        for index, (pollutant, (X, y, dates)) in enumerate(jobs.items()):
+            prefix = f'pollutant_{index}'
+            np.save(os.path.join(path, f'{prefix}_X.npy'), X.to_numpy(dtype=np.float32))
+            np.save(os.path.join(path, f'{prefix}_y.npy'), y.to_numpy(dtype=np.float32))
+            np.save(os.path.join(path, f'{prefix}_dates.npy'), pd.to_datetime(dates).values)
+            pollutants[pollutant] = prefix
+        
+        with open(os.path.join(path, 'label_encoders.pkl'), 'wb') as f:
+            pickle.dump(self.label_encoders, f)
+        
+        # Metadata is written last so a partial cache is never picked up
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({
+                'fingerprint': fingerprint,
+                'feature_code_version': FEATURE_CODE_VERSION,
+                'feature_columns': self.feature_columns,
+                'feature_medians': self.feature_medians,
+                'pollutants': pollutants,
+                'created_at': datetime.now().isoformat(timespec='seconds')
+            }, f, indent=2)
+        
+        print(f"Cached feature matrices for {len(jobs)} pollutants in {path}")
+    
+    def load_feature_cache(self, fingerprint, cache_dir=FEATURE_CACHE_DIR):
+        """
+        Load cached per-pollutant feature matrices as memory-mapped arrays.
+        
+        Args:
+            fingerprint (str): Dataset fingerprint from dataset_fingerprint
+            cache_dir (str): Root directory of the feature cache
+            
+        Returns:
+            dict | None: (X, y, dates) per pollutant, or None on a cache miss
+        """
+        path = os.path.join(cache_dir, fingerprint)
+        meta_path = os.path.join(path, 'meta.json')
+        
+        if not os.path.exists(meta_path):
+            return None
+        
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            
+            if meta.get('feature_code_version') != FEATURE_CODE_VERSION:
+                return None
+            
+            with open(os.path.join(path, 'label_encoders.pkl'), 'rb') as f:
+                self.label_encoders = pickle.load(f)
+            
+            self.feature_columns = meta['feature_columns']
+            self.feature_medians = meta.get('feature_medians', {})
+            
+            jobs = {}
+            for pollutant, prefix in meta['pollutants'].items():
+                X = np.load(os.path.join(path, f'{prefix}_X.npy'), mmap_mode='r')
+                y = np.load(os.path.join(path, f'{prefix}_y.npy'), mmap_mode='r')
+                dates = np.load(os.path.join(path, f'{prefix}_dates.npy'))
+                jobs[pollutant] = (
+                    pd.DataFrame(X, columns=self.feature_columns, copy=False),
+                    pd.Series(y, name='value', copy=False),
+                    pd.Series(dates, name='date')
+                )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable feature cache {path}: {str(e)}")
+            return None
+        
+        print(f"Loaded cached feature matrices for {len(jobs)} pollutants from {path}")
+        return jobs
+    
+    def write_feature_shards(self, data, shard_dir, rows_per_shard=EXTERNAL_BATCH_SIZE * 5):
+        """
+        Write engineered training data as per-pollutant Parquet shards.
+        
+        Accepts either a complete DataFrame or an iterable of date-ordered
+        DataFrame chunks, so the feature stage can stream datasets that never
+        fit in memory at once.
+        
+        Args:
+            data (pd.DataFrame | iterable): Engineered training data or chunks of it
+            shard_dir (str): Output directory for the shards
+            rows_per_shard (int): Maximum rows per Parquet file
+        """
+        chunks = [data] if isinstance(data, pd.DataFrame) else data
+        exclude_columns = ['value', 'value_log', 'parameter', 'date', 'site_id', 'filled_features']
+        
+        os.makedirs(shard_dir, exist_ok=True)
+        pollutants = {}
+        shard_counts = {}
+        
+        for chunk in chunks:
+            if not self.feature_columns:
+                self.feature_columns = [col for col in chunk.columns if col not in exclude_columns]
             
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42, stratify=None
+            for pollutant, pollutant_data in chunk.groupby('parameter', sort=False):
+                subdir = pollutants.setdefault(pollutant, f'pollutant_{len(pollutants)}')
+                os.makedirs(os.path.join(shard_dir, subdir), exist_ok=True)
+                
+                pollutant_data = pollutant_data.sort_values('date')
+                columns = self.feature_columns + ['value', 'date']
+                
+                for start in range(0, len(pollutant_data), rows_per_shard):
+                    part = shard_counts.get(subdir, 0)
+                    shard_counts[subdir] = part + 1
+                    table = pa.Table.from_pandas(
+                        pollutant_data.iloc[start:start + rows_per_shard].reindex(columns=columns),
+                        preserve_index=False
+                    )
+                    pq.write_table(table, os.path.join(shard_dir, subdir, f'part-{part:05d}.parquet'))
+        
+        with open(os.path.join(shard_dir, 'label_encoders.pkl'), 'wb') as f:
+            pickle.dump(self.label_encoders, f)
+        
+        with open(os.path.join(shard_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'feature_columns': self.feature_columns,
+                'pollutants': pollutants,
+                'model_units': MODEL_UNITS
+            }, f, indent=2)
+        
+        print(f"Wrote {sum(shard_counts.values())} shards for {len(pollutants)} pollutants to {shard_dir}")
+    
+    def train_models_external(self, shard_dir, batch_size=EXTERNAL_BATCH_SIZE):
+        """
+        Train pollutant models with XGBoost external memory over Parquet shards.
+        
+        Pollutants are trained one after another so that memory use stays
+        bounded by the batch size rather than by the dataset. The last shard of
+        each pollutant (the most recent data) is used for validation and early
+        stopping.
+        
+        Args:
+            shard_dir (str): Directory written by write_feature_shards
+            batch_size (int): Rows per batch streamed to XGBoost
+            
+        Returns:
+            dict: Trained models for each pollutant
+        """
+        with open(os.path.join(shard_dir, 'meta.json')) as f:
+            meta = json.load(f)
+        
+        with open(os.path.join(shard_dir, 'label_encoders.pkl'), 'rb') as f:
+            self.label_encoders = pickle.load(f)
+        
+        self.feature_columns = meta['feature_columns']
+        self.model_units = meta.get('model_units', LEGACY_MODEL_UNITS)
+        cache_dir = os.path.join(shard_dir, 'xgb_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        
+        print(f"Training XGBoost models with external memory (batch size {batch_size})...")
+        
+        params = {
+            key: value for key, value in XGB_PARAMS.items()
+            if key not in ('n_estimators', 'random_state')
+        }
+        params['seed'] = XGB_PARAMS['random_state']
+        
+        results = {}
+        training_shards = []
+        start_time = time.perf_counter()
+        
+        for pollutant, subdir in meta['pollutants'].items():
+            shard_paths = sorted(
+                os.path.join(shard_dir, subdir, name)
+                for name in os.listdir(os.path.join(shard_dir, subdir))
+                if name.endswith('.parquet')
             )
             
-            # Configure XGBoost
-            model = xgb.XGBRegressor(
-                n_estimators=100,
-                max_depth=6,
-                learning_rate=0.1,
-                subsample=0.8,
-                colsample_bytree=0.8,
-                random_state=42,
-                n_jobs=-1
+            if len(shard_paths) < 2:
+                print(f"Need at least two shards for {pollutant}, found {len(shard_paths)}")
+                continue
+            
+            pollutant_start = time.perf_counter()
+            training_shards.extend(shard_paths[:-1])
+            
+            train_iter = ParquetShardIter(
+                shard_paths[:-1], self.feature_columns, batch_size,
+                cache_prefix=os.path.join(cache_dir, f'{subdir}_train')
             )
+            val_iter = ParquetShardIter(
+                shard_paths[-1:], self.feature_columns, batch_size,
+                cache_prefix=os.path.join(cache_dir, f'{subdir}_val')
+            )
+            
+            dtrain = xgb.ExtMemQuantileDMatrix(train_iter, max_bin=256)
+            dval = xgb.ExtMemQuantileDMatrix(val_iter, max_bin=256, ref=dtrain)
             
-            # Train model
-            model.fit(
-                X_train, y_train,
-                eval_set=[(X_test, y_test)],
-                verbose=False
+            booster = xgb.train(
+                params, dtrain,
+                num_boost_round=XGB_PARAMS['n_estimators'],
+                evals=[(dval, 'validation')],
+                early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                verbose_eval=False
             )
             
-            # Evaluate model
-            y_pred = model.predict(X_test)
+            # Stream the validation shard again to score the final model
+            squared_error = absolute_error = 0.0
+            n_val = 0
+            for X_val, y_val in val_iter.iter_frames():
+                residual = y_val.to_numpy() - booster.predict(xgb.DMatrix(X_val))
+                squared_error += float(np.sum(residual ** 2))
+                absolute_error += float(np.sum(np.abs(residual)))
+                n_val += len(residual)
             
-            rmse = mean_squared_error(y_test, y_pred, squared=False)
-            mae = mean_absolute_error(y_test, y_pred)
-            r2 = r2_score(y_test, y_pred)
+            model = xgb.XGBRegressor()
+            model.load_model(bytearray(booster.save_raw('json')))
             
-            print(f"{pollutant} Model Performance:")
-            print(f"  RMSE: {rmse:.3f}")
-            print(f"  MAE: {mae:.3f}")
-            print(f"  R²: {r2:.3f}")
+            result = {
+                'model': model,
+                'rmse': float(np.sqrt(squared_error / n_val)),
+                'mae': absolute_error / n_val,
+                'best_iteration': int(booster.best_iteration),
+                'train_seconds': time.perf_counter() - pollutant_start,
+                'n_val': n_val
+            }
+            
+            print(f"\n{pollutant} Model Performance:")
+            print(f"  RMSE: {result['rmse']:.3f}")
+            print(f"  MAE: {result['mae']:.3f}")
+            print(f"  Best iteration: {result['best_iteration']}")
+            print(f"  Training time: {result['train_seconds']:.1f}s")
+            print(f"  Peak RSS so far: {format_peak_rss()}")
             
-            # Save model and results
             self.models[pollutant] = model
+            results[pollutant] = result
+            last_dates = pq.read_table(shard_paths[-1], columns=['date']).to_pandas()['date']
+            self.metrics[pollutant] = {
+                'mode': 'full',
+                'rmse': result['rmse'],
+                'mae': result['mae'],
+                'best_iteration': result['best_iteration'],
+                'data_end': str(pd.to_datetime(last_dates).max().date()),
+                'trained_at': datetime.now().isoformat(timespec='seconds')
+            }
+        
+        # One more streaming pass for the training input histograms
+        if training_shards:
+            profile_iter = ParquetShardIter(training_shards, self.feature_columns, batch_size)
+            self.feature_profile = build_feature_profile(
+                (X for X, _ in profile_iter.iter_frames()), self.feature_columns
+            )
+        
+        print(f"\nTotal wall-clock time: {time.perf_counter() - start_time:.1f}s")
+        print(f"Peak RSS: {format_peak_rss()}")
+        
+        return results
+    
+    def train_models(self, data, n_workers=None, cpu_budget=None, batch_size=EXTERNAL_BATCH_SIZE):
+        """
+        Train separate XGBoost models for each pollutant type.
+        
+        Each pollutant is trained in its own worker process using the histogram
+        tree method, with early stopping on a chronological validation split
+        taken just before the held-out test period. The CPU budget is divided
+        evenly between the workers.
+        
+        Passing a directory of Parquet shards instead of in-memory data switches
+        to external-memory training (see train_models_external).
+        
+        Args:
+            data (pd.DataFrame | dict | str): Complete training dataset, per-pollutant
+                matrices from prepare_pollutant_data / load_feature_cache, or a
+                directory written by write_feature_shards
+            n_workers (int): Number of worker processes (default: one per pollutant)
+            cpu_budget (int): Total CPU threads to share between workers (default: all cores)
+            batch_size (int): Rows per batch in external-memory training
+            
+        Returns:
+            dict: Trained models for each pollutant
+        """
+        if isinstance(data, str):
+            return self.train_models_external(data, batch_size=batch_size)
+        
+        print("Training XGBoost models...")
+        
+        jobs = data if isinstance(data, dict) else self.prepare_pollutant_data(data)
+        
+        if not jobs:
+            return {}
+        
+        # Training data is converted to MODEL_UNITS by process_training_data
+        self.model_units = MODEL_UNITS
+        
+        # Training input histograms, the reference for serving drift monitoring
+        self.feature_profile = build_feature_profile(
+            (X for X, _, _ in jobs.values()), self.feature_columns
+        )
+        
+        # Split the CPU budget between worker processes
+        cpu_budget = cpu_budget or os.cpu_count() or 1
+        n_workers = max(1, min(n_workers or len(jobs), len(jobs), cpu_budget))
+        threads_per_worker = max(1, cpu_budget // n_workers)
+        
+        print(f"Training {len(jobs)} pollutants on {n_workers} workers "
+              f"x {threads_per_worker} threads")
+        
+        results = {}
+        start_time = time.perf_counter()
+        
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            futures = {
+                executor.submit(
+                    train_pollutant_model, X, y, threads_per_worker,
+                    self.best_params.get(pollutant)
+                ): pollutant
+                for pollutant, (X, y, _) in jobs.items()
+            }
+            
+            for future in as_completed(futures):
+                pollutant = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Error training model for {pollutant}: {str(e)}")
+                    continue
+                
+                print(f"\n{pollutant} Model Performance:")
+                print(f"  RMSE: {result['rmse']:.3f}")
+                print(f"  MAE: {result['mae']:.3f}")
+                print(f"  R²: {result['r2']:.3f}")
+                print(f"  Best iteration: {result['best_iteration']}")
+                print(f"  Training time: {result['train_seconds']:.1f}s")
+                
+                # Save model and results
+                self.models[pollutant] = result['model']
+                results[pollutant] = result
+                self.metrics[pollutant] = {
+                    'mode': 'full',
+                    'rmse': result['rmse'],
+                    'mae': result['mae'],
+                    'best_iteration': result['best_iteration'],
+                    'params': self.best_params.get(pollutant, {}),
+                    'feature_fingerprint': self.feature_fingerprint,
+                    'data_end': str(jobs[pollutant][2].max().date()),
+                    'trained_at': datetime.now().isoformat(timespec='seconds')
+                }
+        
+        wall_clock = time.perf_counter() - start_time
+        
+        print("\nTraining report:")
+        print(f"  {'Pollutant':<26}{'Best iter':>10}{'Time (s)':>10}{'RMSE':>10}")
+        for pollutant, result in results.items():
+            print(f"  {pollutant:<26}{result['best_iteration']:>10}"
+                  f"{result['train_seconds']:>10.1f}{result['rmse']:>10.3f}")
+        print(f"  Total wall-clock time: {wall_clock:.1f}s")
+        print(f"  Peak RSS (trainer process): {format_peak_rss()}")
+        
+        return results
+    
+    def tune_hyperparameters(self, data, n_candidates=16, n_folds=5, search='halving',
+                             n_workers=None, results_path='models/tuning_results.csv'):
+        """
+        Search XGBoost hyperparameters with rolling-origin cross-validation.
+        
+        Every (candidate, fold) fit runs as a separate task on a process pool.
+        With search='random' all candidates are scored at the full tree budget.
+        With search='halving' candidates start on a small tree budget and only
+        the best third advance to the next round with three times the budget.
+        Each evaluation is appended to a local CSV results table.
+        
+        Args:
+            data (pd.DataFrame | dict): Complete training dataset, or per-pollutant
+                matrices from prepare_pollutant_data / load_feature_cache
+            n_candidates (int): Number of random candidates to draw
+            n_folds (int): Number of rolling-origin folds
+            search (str): 'halving' or 'random'
+            n_workers (int): Number of worker processes (default: all cores)
+            results_path (str): CSV file the evaluations are appended to
+            
+        Returns:
+            dict: Best hyperparameters per pollutant
+        """
+        print(f"Tuning hyperparameters ({search} search, {n_folds} folds)...")
+        
+        jobs = data if isinstance(data, dict) else self.prepare_pollutant_data(data)
+        n_workers = n_workers or os.cpu_count() or 1
+        run_id = datetime.now().strftime('%Y%m%d_%H%M%S')
+        
+        max_trees = XGB_PARAMS['n_estimators']
+        if search == 'halving':
+            eta = 3
+            n_rounds = max(1, int(np.log(n_candidates) / np.log(eta)) + 1)
+            budgets = [max(50, max_trees // eta ** (n_rounds - 1 - r)) for r in range(n_rounds)]
+        else:
+            eta = 1
+            budgets = [max_trees]
+        
+        records = []
+        
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            for pollutant, (X, y, dates) in jobs.items():
+                splits = rolling_origin_splits(dates, n_folds=n_folds)
+                if not splits:
+                    print(f"Not enough history to cross-validate {pollutant}")
+                    continue
+                
+                candidates = dict(enumerate(sample_param_candidates(n_candidates)))
+                
+                for round_number, n_estimators in enumerate(budgets):
+                    futures = {
+                        executor.submit(
+                            evaluate_fold,
+                            X.iloc[train_index], y.iloc[train_index],
+                            X.iloc[val_index], y.iloc[val_index],
+                            params, n_estimators
+                        ): (candidate_id, fold)
+                        for candidate_id, params in candidates.items()
+                        for fold, (train_index, val_index) in enumerate(splits)
+                    }
+                    
+                    round_scores = {}
+                    for future in as_completed(futures):
+                        candidate_id, fold = futures[future]
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            print(f"Error evaluating candidate {candidate_id} on fold {fold}: {str(e)}")
+                            continue
+                        
+                        round_scores.setdefault(candidate_id, []).append(result['rmse'])
+                        records.append({
+                            'run_id': run_id,
+                            'pollutant': pollutant,
+                            'search': search,
+                            'round': round_number,
+                            'candidate_id': candidate_id,
+                            'fold': fold,
+                            'n_estimators': n_estimators,
+                            'params': json.dumps(candidates[candidate_id], default=float),
+                            **result
+                        })
+                    
+                    if not round_scores:
+                        break
+                    
+                    # Keep the best candidates by mean validation RMSE
+                    ranked = sorted(round_scores, key=lambda c: np.mean(round_scores[c]))
+                    n_keep = max(1, len(ranked) // eta)
+                    candidates = {c: candidates[c] for c in ranked[:n_keep]}
+                    
+                    print(f"{pollutant} round {round_number}: {len(round_scores)} candidates "
+                          f"at {n_estimators} trees, best RMSE "
+                          f"{np.mean(round_scores[ranked[0]]):.3f}")
+                
+                best_id = next(iter(candidates))
+                self.best_params[pollutant] = candidates[best_id]
+                print(f"Best parameters for {pollutant}: {candidates[best_id]}")
+        
+        if records:
+            os.makedirs(os.path.dirname(results_path) or '.', exist_ok=True)
+            pd.DataFrame(records).to_csv(
+                results_path, mode='a', index=False,
+                header=not os.path.exists(results_path)
+            )
+            print(f"Logged {len(records)} evaluations to {results_path}")
+        
+        return self.best_params
+    
+    def load_models(self, model_dir='models'):
+        """
+        Load the currently deployed models and their training metadata.
+        
+        Args:
+            model_dir (str): Directory the models were saved to
+            
+        Returns:
+            bool: True if the feature columns and metrics could be loaded
+        """
+        try:
+            with open(os.path.join(model_dir, 'feature_columns.pkl'), 'rb') as f:
+                self.feature_columns = pickle.load(f)
+            
+            with open(os.path.join(model_dir, 'label_encoders.pkl'), 'rb') as f:
+                self.label_encoders = pickle.load(f)
+            
+            with open(os.path.join(model_dir, 'model_metrics.json')) as f:
+                self.metrics = json.load(f)
+            
+            # Tuned hyperparameters travel with each model's metrics
+            self.best_params = {
+                pollutant: metrics['params'] for pollutant, metrics in self.metrics.items() if metrics.get('params')
+            }
+            
+            # Models saved before the units file predict raw AQS units
+            units_path = os.path.join(model_dir, 'model_units.json')
+            self.model_units = LEGACY_MODEL_UNITS
+            if os.path.exists(units_path):
+                with open(units_path) as f:
+                    self.model_units = json.load(f)
+            
+            # Fill values of the last full training, for engineering update rows
+            medians_path = os.path.join(model_dir, 'feature_medians.json')
+            if os.path.exists(medians_path):
+                with open(medians_path) as f:
+                    self.feature_medians = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"ERROR: Could not load model metadata: {str(e)}")
+            return False
+        
+        for pollutant in self.metrics:
+            model_path = model_path_for(pollutant, model_dir)
+            if os.path.exists(model_path):
+                model = xgb.XGBRegressor()
+                model.load_model(model_path)
+                self.models[pollutant] = model
+        
+        print(f"Loaded current models for: {', '.join(self.models.keys())}")
+        return True
+    
+    def load_history_matrices(self):
+        """
+        Feature matrices the loaded models were last fully trained on.
+        
+        They are read from the feature cache entry recorded in each model's
+        metrics. The loaded feature columns and label encoders are kept.
+        
+        Returns:
+            dict | None: (X, y, dates) per pollutant, or None if not cached
+        """
+        columns, encoders, medians = self.feature_columns, self.label_encoders, self.feature_medians
+        history = {}
+        
+        fingerprints = {metrics.get('feature_fingerprint') for metrics in self.metrics.values()}
+        for fingerprint in fingerprints - {None}:
+            jobs = self.load_feature_cache(fingerprint) or {}
+            for pollutant, (X, y, dates) in jobs.items():
+                if self.metrics.get(pollutant, {}).get('feature_fingerprint') == fingerprint:
+                    history[pollutant] = (X.reindex(columns=columns).fillna(0), y, dates)
+        
+        self.feature_columns, self.label_encoders, self.feature_medians = columns, encoders, medians
+        return history or None
+    
+    def update_models(self, new_data, history_data=None, mode='continue',
+                      max_extra_trees=100, max_rmse_gap=0.1):
+        """
+        Incrementally update the loaded models with newly arrived observations.
+        
+        In 'continue' mode up to max_extra_trees new trees are boosted on top of
+        the current booster. In 'refresh' mode the tree structure is kept and
+        only the leaf values are re-estimated on the new rows. The most recent
+        new rows are held out, and the updated model is compared on them with
+        a candidate retrained from scratch on history_data plus the other new
+        rows (or with the current model when there is no history). If its RMSE
+        is more than max_rmse_gap (relative) worse, the update is discarded and
+        the pollutant is retrained from scratch on history_data plus new_data.
+        
+        Args:
+            new_data (pd.DataFrame): Engineered rows not seen by the current models
+            history_data (dict): (X, y, dates) per pollutant used for the last full
+                retrain, e.g. from load_history_matrices
+            mode (str): 'continue' or 'refresh'
+            max_extra_trees (int): Extra tree budget in 'continue' mode
+            max_rmse_gap (float): Allowed relative RMSE increase over the baseline
+            
+        Returns:
+            dict: Update outcome per pollutant
+        """
+        print(f"Updating models with {len(new_data)} new records ({mode} mode)...")
+        
+        if not self.models and not self.load_models():
+            return {}
+        
+        history_data = history_data or {}
+        results = {}
+        needs_retrain = []
+        
+        # Boosting on top of models trained in other units would mix both scales
+        if self.model_units != MODEL_UNITS:
+            print("Current models predict in legacy units, a full retrain is required")
+            needs_retrain = list(self.models)
+        
+        for pollutant, model in self.models.items():
+            if pollutant in needs_retrain:
+                results[pollutant] = {'accepted': False}
+                continue
+            
+            pollutant_data = new_data[new_data['parameter'] == pollutant].sort_values('date')
+            
+            if len(pollutant_data) < 10:
+                print(f"Skipping {pollutant}: only {len(pollutant_data)} new records")
+                continue
+            
+            X = pollutant_data.reindex(columns=self.feature_columns).fillna(0)
+            y = pollutant_data['value']
+            y = y.fillna(y.median())
+            
+            # Validate on the most recent part of the new data
+            X_train, X_val, y_train, y_val = train_test_split(
+                X, y, test_size=0.2, shuffle=False
+            )
+            
+            start_time = time.perf_counter()
+            booster = model.get_booster()
+            
+            if mode == 'refresh':
+                # Leaf refresh needs a plain DMatrix, so use the native API
+                refreshed = xgb.train(
+                    {'process_type': 'update', 'updater': 'refresh', 'refresh_leaf': True},
+                    xgb.DMatrix(X_train, label=y_train),
+                    num_boost_round=booster.num_boosted_rounds(),
+                    xgb_model=booster
+                )
+                updated = xgb.XGBRegressor()
+                updated.load_model(bytearray(refreshed.save_raw('json')))
+            else:
+                updated = xgb.XGBRegressor(
+                    **{**XGB_PARAMS, **self.best_params.get(pollutant, {}),
+                       'n_estimators': max_extra_trees},
+                    early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+                    n_jobs=-1
+                )
+                updated.fit(
+                    X_train, y_train,
+                    eval_set=[(X_val, y_val)],
+                    xgb_model=booster,
+                    verbose=False
+                )
+            
+            rmse = float(np.sqrt(mean_squared_error(y_val, updated.predict(X_val))))
+            update_seconds = time.perf_counter() - start_time
+            
+            # Score the alternative on the same held-out rows
+            if pollutant in history_data:
+                X_history, y_history, _ = history_data[pollutant]
+                candidate = evaluate_fold(
+                    pd.concat([X_history, X_train], ignore_index=True),
+                    pd.concat([y_history, y_train], ignore_index=True),
+                    X_val, y_val,
+                    self.best_params.get(pollutant, {}), XGB_PARAMS['n_estimators'], n_jobs=-1
+                )
+                baseline, baseline_rmse = 'retrained candidate', candidate['rmse']
+            else:
+                baseline = 'current model'
+                baseline_rmse = float(np.sqrt(mean_squared_error(y_val, model.predict(X_val))))
+            
+            accepted = rmse <= baseline_rmse * (1 + max_rmse_gap)
+            
+            print(f"{pollutant}: updated RMSE {rmse:.3f} vs {baseline} {baseline_rmse:.3f} "
+                  f"in {update_seconds:.1f}s -> {'accepted' if accepted else 'rejected'}")
+            
             results[pollutant] = {
-                'model': model,
                 'rmse': rmse,
-                'mae': mae,
-                'r2': r2,
-                'n_train': len(X_train),
-                'n_test': len(X_test)
+                'baseline': baseline,
+                'baseline_rmse': baseline_rmse,
+                'update_seconds': update_seconds,
+                'accepted': accepted
             }
+            
+            if accepted:
+                self.models[pollutant] = updated
+                self.metrics[pollutant] = {
+                    **self.metrics.get(pollutant, {}),
+                    'mode': mode,
+                    'update_rmse': rmse,
+                    'data_end': str(pollutant_data['date'].max().date()),
+                    'trained_at': datetime.now().isoformat(timespec='seconds')
+                }
+            else:
+                needs_retrain.append(pollutant)
+        
+        # Fall back to a full retrain where the update drifted too far
+        missing = [pollutant for pollutant in needs_retrain if pollutant not in history_data]
+        if missing:
+            print(f"Full retrain required for: {', '.join(missing)} "
+                  "(no cached history data, keeping current models)")
+        
+        jobs = {}
+        for pollutant in needs_retrain:
+            if pollutant not in history_data:
+                continue
+            X_history, y_history, dates_history = history_data[pollutant]
+            pollutant_data = new_data[new_data['parameter'] == pollutant].sort_values('date')
+            y = pollutant_data['value']
+            jobs[pollutant] = (
+                pd.concat([X_history, pollutant_data.reindex(columns=self.feature_columns).fillna(0)],
+                          ignore_index=True),
+                pd.concat([y_history, y.fillna(y.median())], ignore_index=True),
+                pd.concat([dates_history, pollutant_data['date']], ignore_index=True)
+            )
+        
+        if jobs:
+            # The retrained models still extend the same cached history
+            fingerprints = {
+                pollutant: self.metrics.get(pollutant, {}).get('feature_fingerprint') for pollutant in jobs
+            }
+            retrained = self.train_models(jobs)
+            for pollutant in retrained:
+                self.metrics[pollutant]['feature_fingerprint'] = fingerprints[pollutant]
+                results[pollutant]['retrained'] = True
         
         return results
     
@@ -282,20 +1289,34 @@ class AirQualityModelTrainer:
         
         # Save each model
         for pollutant, model in self.models.items():
-            model_path = f'models/xgboost_model_{pollutant.lower().replace(".", "")}.json'
+            model_path = model_path_for(pollutant)
             model.save_model(model_path)
             print(f"Saved {pollutant} model to {model_path}")
         
         # Save feature columns and label encoders
-        import pickle
-        
         with open('models/feature_columns.pkl', 'wb') as f:
             pickle.dump(self.feature_columns, f)
         
         with open('models/label_encoders.pkl', 'wb') as f:
             pickle.dump(self.label_encoders, f)
         
-        print("Saved feature columns and label encoders")
+        # Validation metrics of the last fit, used as the update-mode baseline
+        with open('models/model_metrics.json', 'w') as f:
+            json.dump(self.metrics, f, indent=2)
+        
+        # Units of the targets, lag features and predictions
+        with open('models/model_units.json', 'w') as f:
+            json.dump(self.model_units, f, indent=2)
+        
+        # Missing-value fill of the training data, reused by updates
+        with open('models/feature_medians.json', 'w') as f:
+            json.dump(self.feature_medians, f, indent=2)
+        
+        # Updates keep the profile of the last full training
+        if self.feature_profile:
+            save_feature_profile(self.feature_profile)
+        
+        print("Saved feature columns, label encoders, model metrics, units, fill values and feature profile")
         print("Model training completed successfully!")
 
 def main():
@@ -307,36 +1328,99 @@ def main():
     
     trainer = AirQualityModelTrainer()
     
+    # Append new days to the historical observation store (or rewrite it) and exit
+    if '--history' in sys.argv:
+        rows = build_history_store(rebuild='--rebuild' in sys.argv)
+        print(f"Wrote {rows} observations to the historical store in {HISTORY_STORE_DIR}")
+        return
+    
+    # External-memory mode: train straight from Parquet shards on disk
+    if '--shards' in sys.argv:
+        shard_dir = sys.argv[sys.argv.index('--shards') + 1]
+        if trainer.train_models(shard_dir):
+            trainer.save_models()
+        return
+    
     # Step 1: Load ground truth data
     ground_truth_data = trainer.load_ground_truth_data()
     if ground_truth_data is None:
         print("FAILED: Could not load ground truth data")
         return
     
-    # Step 2: Fetch satellite features (this will take a long time)
-    print("\nWARNING: Feature fetching will take several hours due to satellite data downloads")
-    print("Consider running this on a subset of data first for testing")
-    
-    response = input("Continue with full dataset? (y/N): ")
-    if response.lower() != 'y':
-        print("Training cancelled. Consider using a subset of data for testing.")
+    # Incremental mode: only fetch features for records newer than the models
+    if '--update' in sys.argv:
+        if not trainer.load_models():
+            print("FAILED: No current models to update, run a full training first")
+            return
+        
+        last_date = min(pd.Timestamp(m['data_end']) for m in trainer.metrics.values())
+        new_records = ground_truth_data[ground_truth_data['date'] > last_date]
+        print(f"Found {len(new_records)} records newer than {last_date.date()}")
+        
+        if len(new_records) == 0:
+            print("Models are up to date")
+            return
+        
+        # Lags of the new rows look back into the records the models were trained on
+        feature_data = trainer.fetch_satellite_features(new_records)
+        new_data = trainer.merge_and_engineer_features(
+            ground_truth_data, feature_data, fit_encoders=False, since=last_date
+        )
+        mode = 'refresh' if '--refresh' in sys.argv else 'continue'
+        trainer.update_models(new_data, history_data=trainer.load_history_matrices(), mode=mode)
+        trainer.save_models()
         return
     
-    feature_data = trainer.fetch_satellite_features(ground_truth_data)
+    # Reuse engineered feature matrices when the raw inputs are unchanged
+    fingerprint = dataset_fingerprint(ground_truth_data, trainer.training_cutoff)
+    trainer.feature_fingerprint = fingerprint
+    training_data = trainer.load_feature_cache(fingerprint)
     
-    if feature_data is None or len(feature_data) == 0:
-        print("FAILED: Could not fetch satellite features")
-        return
-    
-    # Step 3: Merge and engineer features
-    complete_data = trainer.merge_and_engineer_features(ground_truth_data, feature_data)
+    if training_data is None:
+        # Step 2: Fetch satellite features (this will take a long time)
+        print("\nWARNING: Feature fetching will take several hours due to satellite data downloads")
+        print("Consider running this on a subset of data first for testing")
+        
+        response = input("Continue with full dataset? (y/N): ")
+        if response.lower() != 'y':
+            print("Training cancelled. Consider using a subset of data for testing.")
+            return
+        
+        feature_data = trainer.fetch_satellite_features(ground_truth_data)
+        
+        if feature_data is None or len(feature_data) == 0:
+            print("FAILED: Could not fetch satellite features")
+            return
+        
+        # Step 3: Merge and engineer features
+        complete_data = trainer.merge_and_engineer_features(ground_truth_data, feature_data)
+        
+        if complete_data is None or len(complete_data) == 0:
+            print("FAILED: Could not create complete dataset")
+            return
+        
+        training_data = trainer.prepare_pollutant_data(complete_data)
+        trainer.save_feature_cache(training_data, fingerprint)
     
-    if complete_data is None or len(complete_data) == 0:
-        print("FAILED: Could not create complete dataset")
+    # Export the matrices as Parquet shards for external-memory training and exit
+    if '--write-shards' in sys.argv:
+        shard_dir = sys.argv[sys.argv.index('--write-shards') + 1]
+        trainer.write_feature_shards(
+            (
+                X.assign(value=y.values, date=dates.values, parameter=pollutant)
+                for pollutant, (X, y, dates) in training_data.items()
+            ),
+            shard_dir
+        )
+        print(f"Train on them with: python train_model.py --shards {shard_dir}")
         return
     
+    # Optional: tune hyperparameters before the final fit
+    if '--tune' in sys.argv:
+        trainer.tune_hyperparameters(training_data)
+    
     # Step 4: Train models
-    training_results = trainer.train_models(complete_data)
+    training_results = trainer.train_models(training_data)
     
     if not training_results:
         print("FAILED: No models were trained successfully")
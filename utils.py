@@ -3,31 +3,64 @@ import pandas as pd
 import numpy as np
 import requests
 import earthaccess
-import xarray as xr
 from datetime import datetime, timedelta
 from geopy.geocoders import Nominatim
+from geopy.extra.rate_limiter import RateLimiter
 import pytz
 import math
 import os
+import json
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from climatology import climatology_fallback, MERRA2_VARIABLES, TEMPO_VARIABLES
+from tempo_index import granule_indexes, TEMPO_BOUNDS
+from merra2 import merra2_hourly
+from gazetteer import get_gazetteer, cached_geocode, remember_geocode
 
-# Initialize geopy geocoder
-geolocator = Nominatim(user_agent="mframapa_ai")
+# Nominatim allows one request per second; created on first use
+_nominatim = None
+_nominatim_lock = threading.Lock()
+
+def _nominatim_geocode(query):
+    """Geocode with Nominatim, rate limited to its usage policy."""
+    global _nominatim
+    with _nominatim_lock:
+        if _nominatim is None:
+            _nominatim = RateLimiter(Nominatim(user_agent="mframapa_ai").geocode, min_delay_seconds=1)
+        return _nominatim(query)
 
-@st.cache_data(ttl=3600)
 def get_lat_lon(city_name):
     """
-    Get latitude and longitude coordinates for a city using Geopy Nominatim.
-    
+    Get latitude and longitude coordinates for a city.
+
+    Names are resolved with the offline gazetteer first, then from the
+    persistent geocode cache, and only then with Nominatim, whose answers
+    are written back to the cache.
+
     Args:
         city_name (str): Name of the city
-        
+
     Returns:
         tuple: (latitude, longitude) or None if not found
     """
+    gazetteer = get_gazetteer()
+    if gazetteer is not None:
+        place = gazetteer.lookup(city_name)
+        if place:
+            return (place['lat'], place['lon'])
+
+    coordinates = cached_geocode(city_name)
+    if coordinates:
+        return coordinates
+
     try:
-        location = geolocator.geocode(city_name)
+        location = _nominatim_geocode(city_name)
         if location:
-            return (location.latitude, location.longitude)
+            coordinates = (location.latitude, location.longitude)
+            remember_geocode(city_name, coordinates)
+            return coordinates
         else:
             return None
     except Exception as e:
@@ -82,126 +115,30 @@ def fetch_merra2_data(lat: float, lon: float, start_date: str, end_date: str):
         end_date (str): End date in YYYY-MM-DD
 
     Returns:
-        dict | None: Processed MERRA-2 data (keyed by variable name) or fallback values
+        dict: Processed MERRA-2 data keyed by variable name; variables that
+            could not be fetched are filled from the climatology cube and
+            listed under '_filled'
     """
     try:
-        # Authenticate with NASA Earthdata using secrets.toml
-        username = st.secrets.get("EARTHDATA_USERNAME")
-        password = st.secrets.get("EARTHDATA_PASSWORD")
-
-        if not username or not password:
-            return {
-                "BCSMASS": 0.0,
-                "OCSMASS": 0.0,
-                "DUSMASS": 0.0,
-                "SSSMASS": 0.0,
-                "SO4SMASS": 0.0,
-                "T2M": 20.0,
-                "QV2M": 0.01,
-                "U2M": 0.0,
-                "V2M": 0.0,
-                "PBLH": 1000.0,
-                "CLDTOT": 0.5
-            }
-
-        # Set environment variables for earthaccess
-        os.environ["EARTHDATA_USERNAME"] = username
-        os.environ["EARTHDATA_PASSWORD"] = password
-
-        # Authenticate using environment strategy
-        auth = earthaccess.login(strategy="environment")
-        if not auth.authenticated:
-            return {
-                "BCSMASS": 0.0,
-                "OCSMASS": 0.0,
-                "DUSMASS": 0.0,
-                "SSSMASS": 0.0,
-                "SO4SMASS": 0.0,
-                "T2M": 20.0,
-                "QV2M": 0.01,
-                "U2M": 0.0,
-                "V2M": 0.0,
-                "PBLH": 1000.0,
-                "CLDTOT": 0.5
-            }
-
-        # Define collections
-        collections = ["M2T1NXAER", "M2T1NXSLV"]
-        data_dict = {}
-
-        # Loop through MERRA-2 collections
-        for collection in collections:
-            try:
-                granules = earthaccess.search_data(
-                    short_name=collection,
-                    temporal=(start_date, end_date),
-                    bounding_box=(lon - 0.5, lat - 0.5, lon + 0.5, lat + 0.5)
-                )
-
-                if not granules:
-                    continue
-
-                files = earthaccess.download(granules, local_path="./temp_data")
-
-                for file in files:
-                    if not file.endswith(".nc4"):
-                        continue
-
-                    ds = xr.open_dataset(file)
-
-                    if collection == "M2T1NXAER":
-                        variables = ["BCSMASS", "OCSMASS", "DUSMASS", "SSSMASS", "SO4SMASS"]
-                    else:
-                        variables = ["T2M", "QV2M", "U2M", "V2M", "PBLH", "CLDTOT"]
-
-                    for var in variables:
-                        if var in ds.variables:
-                            var_data = ds[var].sel(lat=lat, lon=lon, method="nearest")
-                            data_dict[var] = float(var_data.mean().values)
-
-                    ds.close()
-                    try:
-                        os.remove(file)
-                    except OSError:
-                        pass
-
-            except Exception:
-                continue
-
-        # Return data if available, otherwise provide fallback values
-        if data_dict:
-            return data_dict
-
-        # Fallback values for MERRA-2 variables
-        return {
-            "BCSMASS": 0.0,
-            "OCSMASS": 0.0,
-            "DUSMASS": 0.0,
-            "SSSMASS": 0.0,
-            "SO4SMASS": 0.0,
-            "T2M": 20.0,
-            "QV2M": 0.01,
-            "U2M": 0.0,
-            "V2M": 0.0,
-            "PBLH": 1000.0,
-            "CLDTOT": 0.5
+        # Daily granules are shared through the local MERRA-2 granule cache
+        days = pd.date_range(start_date, end_date, freq='D')
+        hourly = merra2_hourly(lat, lon, days)
+        data_dict = {
+            var: float(hourly[var].mean())
+            for var in MERRA2_VARIABLES if var in hourly and hourly[var].notna().any()
         }
 
+        # Variables no granule provided come from the climatology
+        return climatology_fallback(lat, lon, start_date, end_date, MERRA2_VARIABLES, data_dict)
+
     except Exception:
-        # Return fallback values on any error
-        return {
-            "BCSMASS": 0.0,
-            "OCSMASS": 0.0,
-            "DUSMASS": 0.0,
-            "SSSMASS": 0.0,
-            "SO4SMASS": 0.0,
-            "T2M": 20.0,
-            "QV2M": 0.01,
-            "U2M": 0.0,
-            "V2M": 0.0,
-            "PBLH": 1000.0,
-            "CLDTOT": 0.5
-        }
+        return climatology_fallback(lat, lon, start_date, end_date, MERRA2_VARIABLES)
+
+def in_tempo_coverage(lat, lon):
+    """Whether locations (scalars or arrays) lie in the North American area TEMPO covers."""
+    min_lon, min_lat, max_lon, max_lat = TEMPO_BOUNDS
+    lat, lon = np.asarray(lat, dtype=float), np.asarray(lon, dtype=float)
+    return (min_lon <= lon) & (lon <= max_lon) & (min_lat <= lat) & (lat <= max_lat)
 
 @st.cache_data(ttl=3600)
 def fetch_tempo_data(bounding_box, start_date, end_date):
@@ -214,90 +151,114 @@ def fetch_tempo_data(bounding_box, start_date, end_date):
         end_date (str): End date in YYYY-MM-DD format
         
     Returns:
-        dict: Processed TEMPO data or fallback values
+        dict: Processed TEMPO data; outside North America both columns are 0,
+            otherwise variables that could not be fetched are filled from the
+            climatology cube and listed under '_filled'
     """
-    try:
-        # Check if location is in North America
-        min_lon, min_lat, max_lon, max_lat = bounding_box
-        na_bounds = (-170, 15, -50, 75)
-        
-        if not (na_bounds[0] <= min_lon <= na_bounds[2] and 
-                na_bounds[1] <= min_lat <= na_bounds[3]):
-            return {
-                "NO2_vertical_column_troposphere": 0.0,
-                "NO2_column_uncertainty": 0.0
-            }
+    return fetch_tempo_box_means([tuple(bounding_box)], start_date, end_date)[0]
 
+@st.cache_data(ttl=3600)
+def fetch_tempo_box_means(bounding_boxes, start_date, end_date, download=True):
+    """
+    TEMPO NO2 means over many bounding boxes in one pass.
+    
+    Granules are searched once for the union of the boxes. Each granule is
+    regridded to its index cells with summed-area tables, so every box mean
+    costs four lookups per granule and variable, evaluated for all boxes at
+    once. Means are pixel-weighted across all granules in the window.
+    
+    Args:
+        bounding_boxes (list): (min_lon, min_lat, max_lon, max_lat) tuples
+        start_date (str): Start date in YYYY-MM-DD format
+        end_date (str): End date in YYYY-MM-DD format
+        download (bool): Download granules that are not indexed yet; live
+            requests pass False, so those granules are indexed in the
+            background and the climatology fills in meanwhile
+        
+    Returns:
+        list: One dict per box, as returned by fetch_tempo_data
+    """
+    boxes = np.asarray(bounding_boxes, dtype=float).reshape(-1, 4)
+    centers = [((box[1] + box[3]) / 2, (box[0] + box[2]) / 2) for box in boxes]
+    results = [{"NO2_vertical_column_troposphere": 0.0, "NO2_column_uncertainty": 0.0} for _ in boxes]
+    
+    # Only boxes centred in North America are covered by TEMPO
+    covered = np.flatnonzero(in_tempo_coverage([lat for lat, _ in centers], [lon for _, lon in centers]))
+    if len(covered) == 0:
+        return results
+    
+    def complete(data_by_box):
+        for position, box in enumerate(covered):
+            lat, lon = centers[box]
+            results[box] = climatology_fallback(
+                lat, lon, start_date, end_date, TEMPO_VARIABLES, data_by_box[position]
+            )
+        return results
+    
+    no_data = [{} for _ in covered]
+    
+    try:
         # Authenticate with NASA Earthdata using secrets.toml
         username = st.secrets.get("EARTHDATA_USERNAME")
         password = st.secrets.get("EARTHDATA_PASSWORD")
-
+        
         if not username or not password:
-            return {
-                "NO2_vertical_column_troposphere": 0.0,
-                "NO2_column_uncertainty": 0.0
-            }
-
+            return complete(no_data)
+        
         # Set environment variables for earthaccess
         os.environ["EARTHDATA_USERNAME"] = username
         os.environ["EARTHDATA_PASSWORD"] = password
-
+        
         # Authenticate using environment strategy
         auth = earthaccess.login(strategy="environment")
         if not auth.authenticated:
-            return {
-                "NO2_vertical_column_troposphere": 0.0,
-                "NO2_column_uncertainty": 0.0
-            }
-        
-        data_dict = {}
+            return complete(no_data)
         
+        covered_boxes = boxes[covered]
+        union = (
+            float(covered_boxes[:, 0].min()), float(covered_boxes[:, 1].min()),
+            float(covered_boxes[:, 2].max()), float(covered_boxes[:, 3].max())
+        )
         granules = earthaccess.search_data(
             short_name="TEMPO_NO2_L2",
             temporal=(start_date, end_date),
-            bounding_box=bounding_box
+            bounding_box=union
         )
         
-        if granules:
-            files = earthaccess.download(granules[:5], local_path="./temp_data")
-            
-            for file in files:
-                if file.endswith('.nc'):
-                    try:
-                        ds = xr.open_dataset(file)
-                        
-                        variables = ['vertical_column_troposphere', 'column_uncertainty']
-                        
-                        for var in variables:
-                            if var in ds.variables:
-                                var_data = ds[var].sel(
-                                    latitude=slice(min_lat, max_lat),
-                                    longitude=slice(min_lon, max_lon)
-                                ).mean()
-                                data_dict[f"NO2_{var}"] = float(var_data.values)
-                        
-                        ds.close()
-                        try:
-                            os.remove(file)
-                        except OSError:
-                            pass
-                    except Exception:
-                        continue
-        
-        # Return data if available, otherwise provide fallback values
-        if data_dict:
-            return data_dict
+        sums = {}
+        counts = {}
+        for index in granule_indexes(granules or [], download=download):
+            table = index.summed_area()
+            if table is None:
+                continue
+            for name, (total, count) in table.box_stats(covered_boxes).items():
+                sums[name] = sums.get(name, 0.0) + total
+                counts[name] = counts.get(name, 0) + count
         
-        return {
-            "NO2_vertical_column_troposphere": 0.0,
-            "NO2_column_uncertainty": 0.0
-        }
+        return complete([
+            {name: float(sums[name][position] / counts[name][position])
+             for name in sums if counts[name][position] > 0}
+            for position in range(len(covered))
+        ])
         
     except Exception:
-        return {
-            "NO2_vertical_column_troposphere": 0.0,
-            "NO2_column_uncertainty": 0.0
-        }
+        return complete(no_data)
+
+# US EPA (concentration, AQI) breakpoints per pollutant
+AQI_BREAKPOINTS = {
+    'PM2.5': [
+        (0, 0), (12, 50), (35.4, 100), (55.4, 150),
+        (150.4, 200), (250.4, 300), (500.4, 500)
+    ],
+    'O3': [
+        (0, 0), (54, 50), (70, 100), (85, 150),
+        (105, 200), (200, 300), (300, 500)
+    ],
+    'NO2': [
+        (0, 0), (53, 50), (100, 100), (360, 150),
+        (649, 200), (1249, 300), (2049, 500)
+    ]
+}
 
 def calculate_aqi_from_components(pm25=None, o3=None, no2=None):
     """
@@ -325,20 +286,9 @@ def calculate_aqi_from_components(pm25=None, o3=None, no2=None):
             return 500
         return 0
     
-    pm25_breakpoints = [
-        (0, 0), (12, 50), (35.4, 100), (55.4, 150),
-        (150.4, 200), (250.4, 300), (500.4, 500)
-    ]
-    
-    o3_breakpoints = [
-        (0, 0), (54, 50), (70, 100), (85, 150),
-        (105, 200), (200, 300), (300, 500)
-    ]
-    
-    no2_breakpoints = [
-        (0, 0), (53, 50), (100, 100), (360, 150),
-        (649, 200), (1249, 300), (2049, 500)
-    ]
+    pm25_breakpoints = AQI_BREAKPOINTS['PM2.5']
+    o3_breakpoints = AQI_BREAKPOINTS['O3']
+    no2_breakpoints = AQI_BREAKPOINTS['NO2']
     
     aqi_values = {}
     
@@ -359,95 +309,680 @@ def calculate_aqi_from_components(pm25=None, o3=None, no2=None):
     
     return aqi_values
 
-def get_aqi_category(aqi_value):
-    """Get AQI category and color based on AQI value."""
-    if aqi_value <= 50:
-        return "Good", "#00E400"
-    elif aqi_value <= 100:
-        return "Moderate", "#FFFF00"
-    elif aqi_value <= 150:
-        return "Unhealthy for Sensitive Groups", "#FF7E00"
-    elif aqi_value <= 200:
-        return "Unhealthy", "#FF0000"
-    elif aqi_value <= 300:
-        return "Very Unhealthy", "#8F3F97"
-    else:
-        return "Hazardous", "#7E0023"
+# Pollutant order used for the dominant-pollutant index
+AQI_POLLUTANTS = ('PM2.5', 'O3', 'NO2')
 
-def get_health_recommendation(aqi_value, user_profile=None):
+def calculate_aqi_arrays(pm25=None, o3=None, no2=None):
     """
-    Get personalized health recommendations based on AQI and user profile.
+    Vectorized US EPA AQI for whole arrays or DataFrame columns.
+    
+    Breakpoint segments are located with np.searchsorted and interpolated in
+    one pass, giving the same results as calculate_aqi_from_components for
+    every element. Missing pollutants (None or NaN entries) are ignored when
+    taking the overall maximum.
     
     Args:
-        aqi_value (int): Current AQI value
-        user_profile (dict): User health profile with age, conditions, activity level
+        pm25 (array-like): PM2.5 concentrations in μg/m³
+        o3 (array-like): O3 concentrations in ppb
+        no2 (array-like): NO2 concentrations in ppb
         
     Returns:
-        dict: Health recommendations and advice
+        dict: AQI array per pollutant, 'Overall' AQI array and 'Dominant'
+            index into AQI_POLLUTANTS (-1 where no pollutant is available)
     """
-    category, color = get_aqi_category(aqi_value)
+    return get_aqi_standard('EPA').evaluate(pm25, o3, no2)
+
+def interpolate_index(concentration, c_bp, index_bp):
+    """
+    Piecewise-linear index lookup over breakpoint arrays.
     
-    base_recommendations = {
-        "Good": {
-            "general": "Air quality is satisfactory. Perfect day for outdoor activities!",
-            "activities": "All outdoor activities recommended",
-            "precautions": "None needed"
-        },
-        "Moderate": {
-            "general": "Air quality is acceptable. Sensitive individuals should limit prolonged outdoor exertion.",
-            "activities": "Most outdoor activities are fine. Consider shorter durations for intense exercise.",
-            "precautions": "Sensitive individuals should monitor symptoms"
-        },
-        "Unhealthy for Sensitive Groups": {
-            "general": "Sensitive groups should reduce outdoor activities.",
-            "activities": "Limit outdoor exercise. Choose indoor alternatives when possible.",
-            "precautions": "Sensitive individuals should stay indoors during peak hours"
-        },
-        "Unhealthy": {
-            "general": "Everyone should limit outdoor activities.",
-            "activities": "Avoid outdoor exercise. Stay indoors with windows closed.",
-            "precautions": "Use air purifiers indoors. Wear masks when going outside."
-        },
-        "Very Unhealthy": {
-            "general": "Everyone should avoid outdoor activities.",
-            "activities": "Stay indoors. Avoid all outdoor exercise.",
-            "precautions": "Keep windows closed. Use air purifiers. Wear N95 masks outdoors."
+    Args:
+        concentration (np.ndarray): Concentrations in the table's units
+        c_bp (np.ndarray): Concentration breakpoints (ascending)
+        index_bp (np.ndarray): Index value at each breakpoint
+        
+    Returns:
+        np.ndarray: Rounded index values (NaN where the concentration is NaN)
+    """
+    segment = np.clip(np.searchsorted(c_bp, concentration, side='right') - 1, 0, len(c_bp) - 2)
+    c_lo, c_hi = c_bp[segment], c_bp[segment + 1]
+    i_lo, i_hi = index_bp[segment], index_bp[segment + 1]
+    
+    index = np.round((i_hi - i_lo) / (c_hi - c_lo) * (concentration - c_lo) + i_lo)
+    index = np.where(concentration > c_bp[-1], index_bp[-1], index)
+    index = np.where(concentration < c_bp[0], index_bp[0], index)
+    return np.where(np.isnan(concentration), np.nan, index)
+
+# Units the pollutant models predict in
+MODEL_UNITS = {'PM2.5': 'ug/m3', 'O3': 'ppb', 'NO2': 'ppb'}
+
+# Multipliers from other units into MODEL_UNITS
+UNIT_SCALES = {'Parts per million': 1000.0, 'ppm': 1000.0}
+
+# Units of models saved without a units file, trained on raw AQS values
+LEGACY_MODEL_UNITS = {'PM2.5': 'ug/m3', 'O3': 'ppm', 'NO2': 'ppb'}
+
+def unit_scale(unit, pollutant):
+    """Multiplier from a unit into the model unit of a pollutant."""
+    if unit is None or unit == MODEL_UNITS.get(pollutant):
+        return 1.0
+    return UNIT_SCALES.get(unit, 1.0)
+
+AQI_STANDARDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'aqi_standards.json')
+
+class AQIStandard:
+    """
+    An air quality index compiled from its breakpoint table.
+    
+    'linear' standards interpolate between breakpoints (EPA, India, China);
+    'banded' standards map concentration bands to discrete levels (UK DAQI,
+    WHO). Categories are looked up with np.digitize over whole arrays.
+    """
+    
+    def __init__(self, key, spec, ppb_to_ugm3):
+        self.key = key
+        self.name = spec['name']
+        self.method = spec['method']
+        self.pollutants = {}
+        
+        for pollutant, table in spec['pollutants'].items():
+            compiled = {
+                'scale': 1.0 if table['unit'] == MODEL_UNITS[pollutant] else ppb_to_ugm3[pollutant],
+                'averaging_hours': table.get('averaging_hours', 1)
+            }
+            if self.method == 'linear':
+                breakpoints = np.asarray(table['breakpoints'], dtype=float)
+                compiled['c'] = breakpoints[:, 0]
+                compiled['index'] = breakpoints[:, 1]
+            else:
+                compiled['upper'] = np.asarray(table['upper'], dtype=float)
+                compiled['levels'] = np.asarray(table['levels'], dtype=float)
+            self.pollutants[pollutant] = compiled
+        
+        categories = spec['categories']
+        self.category_upper = np.asarray(categories['upper'], dtype=float)
+        self.category_labels = np.asarray(categories['labels'], dtype=object)
+        self.category_colors = np.asarray(categories['colors'], dtype=object)
+    
+    def sub_index(self, pollutant, concentration):
+        """Index values of one pollutant for concentrations in model units."""
+        table = self.pollutants[pollutant]
+        concentration = np.asarray(concentration, dtype=float).ravel() * table['scale']
+        
+        if self.method == 'linear':
+            return interpolate_index(concentration, table['c'], table['index'])
+        
+        levels = table['levels'][np.searchsorted(table['upper'], concentration, side='left')]
+        return np.where(np.isnan(concentration), np.nan, levels)
+    
+    def averaged(self, frame, group_col='city', time_col='time'):
+        """
+        Trailing means of each pollutant over this standard's averaging period.
+        
+        Breakpoints are defined on averaged concentrations (e.g. 24-h PM2.5,
+        8-h O3), not on single hourly values. Rows early in a series only
+        average the hours available so far.
+        
+        Args:
+            frame (pd.DataFrame): Concentrations in model units with one
+                column per pollutant, a time column and a group column
+            group_col (str): Column separating independent series
+            time_col (str): Timestamp column
+            
+        Returns:
+            pd.DataFrame: Averaged concentrations aligned with frame's index
+        """
+        pollutants = [pollutant for pollutant in AQI_POLLUTANTS if pollutant in frame]
+        result = pd.DataFrame(index=frame.index, columns=pollutants, dtype=float)
+        
+        for _, group in frame.groupby(group_col, sort=False):
+            group = group.sort_values(time_col)
+            series = group.set_index(time_col)
+            for pollutant in pollutants:
+                hours = self.pollutants.get(pollutant, {}).get('averaging_hours', 1)
+                means = series[pollutant].rolling(f'{hours}h').mean()
+                result.loc[group.index, pollutant] = means.to_numpy()
+        
+        return result
+    
+    def evaluate(self, pm25=None, o3=None, no2=None):
+        """
+        Evaluate the index over arrays of concentrations in model units.
+        
+        Args:
+            pm25 (array-like): PM2.5 concentrations in μg/m³
+            o3 (array-like): O3 concentrations in ppb
+            no2 (array-like): NO2 concentrations in ppb
+            
+        Returns:
+            dict: Index array per pollutant, 'Overall' array and 'Dominant'
+                index into AQI_POLLUTANTS (-1 where no pollutant is available)
+        """
+        inputs = dict(zip(AQI_POLLUTANTS, (pm25, o3, no2)))
+        size = max((np.size(values) for values in inputs.values() if values is not None), default=0)
+        
+        index_values = {}
+        stacked = np.full((len(AQI_POLLUTANTS), size), np.nan)
+        
+        for row, (pollutant, values) in enumerate(inputs.items()):
+            if values is None or pollutant not in self.pollutants:
+                continue
+            index = np.broadcast_to(self.sub_index(pollutant, values), (size,))
+            index_values[pollutant] = index
+            stacked[row] = index
+        
+        available = ~np.isnan(stacked)
+        has_any = available.any(axis=0)
+        filled = np.where(available, stacked, -np.inf)
+        
+        index_values['Overall'] = np.where(has_any, filled.max(axis=0, initial=-np.inf), 0)
+        index_values['Dominant'] = np.where(has_any, filled.argmax(axis=0), -1)
+        
+        return index_values
+    
+    def categorize(self, values):
+        """
+        Category labels and colors for an array of index values.
+        
+        Returns:
+            tuple: (labels, colors) object arrays, None where the value is NaN
+        """
+        values = np.asarray(values, dtype=float)
+        bins = np.digitize(values, self.category_upper, right=True)
+        missing = np.isnan(values)
+        labels = np.where(missing, None, self.category_labels[bins])
+        colors = np.where(missing, None, self.category_colors[bins])
+        return labels, colors
+
+@st.cache_resource
+def load_aqi_standards(path=AQI_STANDARDS_PATH):
+    """
+    Load and compile all AQI breakpoint tables once per process.
+    
+    Returns:
+        dict: Compiled tables ('standards'), location rules ('regions') and
+            the fallback standard key ('default')
+    """
+    with open(path) as f:
+        spec = json.load(f)
+    
+    return {
+        'standards': {
+            key: AQIStandard(key, table, spec['ppb_to_ugm3'])
+            for key, table in spec['standards'].items()
         },
-        "Hazardous": {
-            "general": "Emergency conditions. Everyone should remain indoors.",
-            "activities": "No outdoor activities. Stay indoors with air purification.",
-            "precautions": "Seal windows and doors. Use multiple air purifiers. Avoid going outside."
-        }
+        'regions': spec.get('regions', []),
+        'default': spec.get('default_standard', 'EPA')
     }
+
+def get_aqi_standard(key):
+    """Compiled AQIStandard for a key such as 'EPA' or 'UK_DAQI'."""
+    return load_aqi_standards()['standards'][key]
+
+def default_aqi_standard(lat, lon):
+    """
+    The national index normally reported at a location.
+    
+    The country is taken from the nearest gazetteer place and matched
+    against each region's country codes. Without a gazetteer the region
+    bounding boxes are used instead; they overlap near borders, so the
+    first matching region wins.
+    
+    Args:
+        lat (float): Latitude
+        lon (float): Longitude
+        
+    Returns:
+        str: Standard key, falling back to the configured default
+    """
+    config = load_aqi_standards()
+    gazetteer = get_gazetteer()
+    place = gazetteer.nearest(lat, lon) if gazetteer is not None else None
+    
+    for region in config['regions']:
+        if place is not None and 'countries' in region:
+            if place['country'] in region['countries']:
+                return region['standard']
+            continue
+        min_lon, min_lat, max_lon, max_lat = region['bbox']
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            return region['standard']
+    return config['default']
+
+def get_aqi_categories(values, standard='EPA'):
+    """Vectorized category labels and colors for a series of index values."""
+    return get_aqi_standard(standard).categorize(values)
+
+class RollingWindowMean:
+    """
+    Running mean over the last `window` hourly values with O(1) updates.
+    
+    Keeps a ring buffer plus a running sum and count of valid (non-NaN)
+    entries, so each push only adds the new value and drops the oldest.
+    """
+    
+    def __init__(self, window, min_fraction=0.75):
+        self.window = window
+        self.min_fraction = min_fraction
+        self.values = np.full(window, np.nan)
+        self.position = 0
+        self.seen = 0
+        self.total = 0.0
+        self.count = 0
+    
+    def push(self, value):
+        """Add the next hourly value and return the current window mean."""
+        old = self.values[self.position]
+        if not np.isnan(old):
+            self.total -= old
+            self.count -= 1
+        
+        value = np.nan if value is None else float(value)
+        self.values[self.position] = value
+        if not np.isnan(value):
+            self.total += value
+            self.count += 1
+        
+        self.position = (self.position + 1) % self.window
+        self.seen = min(self.seen + 1, self.window)
+        
+        # Require enough valid hours, relative to the hours seen while warming up
+        if self.count == 0 or self.count < np.ceil(self.min_fraction * self.seen):
+            return np.nan
+        return self.total / self.count
+    
+    @property
+    def complete(self):
+        """Whether the window holds enough valid hours for a regulatory average."""
+        return self.count >= np.ceil(self.min_fraction * self.window)
+    
+    def recent(self, hours):
+        """Most recent `hours` values, newest first."""
+        index = (self.position - 1 - np.arange(hours)) % self.window
+        return self.values[index]
+
+def nowcast(recent_values, min_weight=0.5):
+    """
+    EPA NowCast for the 12 most recent hourly concentrations.
     
-    recommendations = base_recommendations.get(category, base_recommendations["Moderate"])
+    Args:
+        recent_values (np.ndarray): Hourly values, newest first (NaN if missing)
+        min_weight (float): Lower bound of the weight factor (0.5 for PM)
+        
+    Returns:
+        float: NowCast concentration, or NaN without 2 of the last 3 hours
+    """
+    # At the very start of a stream a single hour is all there is
+    if np.sum(~np.isnan(recent_values[:3])) < min(2, len(recent_values)):
+        return np.nan
+    
+    valid = ~np.isnan(recent_values)
+    c_max = np.max(recent_values[valid])
+    if c_max <= 0:
+        return 0.0
+    
+    weight = max(np.min(recent_values[valid]) / c_max, min_weight)
+    powers = weight ** np.arange(len(recent_values))
+    return float(np.sum(powers[valid] * recent_values[valid]) / np.sum(powers[valid]))
+
+class StreamingAQIEngine:
+    """
+    Hour-by-hour regulatory AQI over a concentration series.
+    
+    PM2.5 is reported as a 12-hour NowCast and a 24-hour mean, O3 as an
+    8-hour mean and NO2 as a 1-hour value, following the US EPA averaging
+    periods. Each push does a constant amount of work, so extending the
+    horizon or adding hourly steps only costs the new hours.
+    
+    Until the windows hold enough hours the averages cover only the hours
+    pushed so far; such hours are flagged as incomplete rather than passed
+    off as regulatory values. Seeding the engine with observed hours before
+    the forecast shortens that warm-up.
+    """
+    
+    def __init__(self):
+        self.pm25_24h = RollingWindowMean(24)
+        self.o3_8h = RollingWindowMean(8)
     
-    if user_profile:
-        age = user_profile.get('age', 30)
-        conditions = user_profile.get('conditions', [])
-        activity_level = user_profile.get('activity_level', 'moderate')
+    def push(self, pm25=None, o3=None, no2=None):
+        """
+        Add one hour of concentrations.
+        
+        Returns:
+            dict: Averaged concentrations for this hour
+        """
+        pm25_24h = self.pm25_24h.push(pm25)
+        recent_pm25 = self.pm25_24h.recent(min(12, self.pm25_24h.seen))
+        return {
+            'PM2.5_nowcast': nowcast(recent_pm25),
+            'PM2.5_24h': pm25_24h,
+            'O3_8h': self.o3_8h.push(o3),
+            'NO2_1h': np.nan if no2 is None else float(no2),
+            # NowCast needs 2 of the 3 most recent hours, the 8-h mean 6 of 8
+            'PM2.5_complete': np.sum(~np.isnan(recent_pm25[:3])) >= 2,
+            'O3_complete': self.o3_8h.complete
+        }
+    
+    def seed(self, pm25=None, o3=None, no2=None):
+        """
+        Push observed hours that precede the series to be reported.
+        
+        Hours before the first observation are skipped, so an empty history
+        leaves the engine as if freshly created.
+        
+        Args:
+            pm25, o3, no2 (array-like): Hourly observations, oldest first and of
+                equal length (NaN where missing, None if not observed)
+        """
+        series = [None if values is None else np.asarray(values, dtype=float) for values in (pm25, o3, no2)]
+        n_hours = max((len(values) for values in series if values is not None), default=0)
+        series = [np.full(n_hours, np.nan) if values is None else values for values in series]
+        
+        observed = np.isfinite(np.vstack(series)).any(axis=0) if n_hours else np.zeros(0, dtype=bool)
+        if not observed.any():
+            return
+        
+        first = int(np.argmax(observed))
+        for p, o, n in zip(*(values[first:] for values in series)):
+            self.push(p, o, n)
+    
+    def run(self, times, pm25=None, o3=None, no2=None, history=None):
+        """
+        Stream a whole hourly series through the engine.
+        
+        Args:
+            times (array-like): Hourly timestamps
+            pm25, o3, no2 (array-like): Hourly concentrations (None if not modelled)
+            history (dict): Observed hours before the series per pollutant, as
+                accepted by seed
+            
+        Returns:
+            pd.DataFrame: Averaged concentrations, per-pollutant and overall AQI,
+                the dominant pollutant and a 'Complete' flag for every hour
+        """
+        if history:
+            self.seed(*(history.get(pollutant) for pollutant in AQI_POLLUTANTS))
         
-        if age < 18 or age > 65:
-            if aqi_value > 100:
-                recommendations["precautions"] += " Extra caution recommended for your age group."
+        n_hours = len(times)
+        series = [
+            np.full(n_hours, np.nan) if values is None else np.asarray(values, dtype=float)
+            for values in (pm25, o3, no2)
+        ]
+        
+        rows = [self.push(p, o, n) for p, o, n in zip(*series)]
+        result = pd.DataFrame(rows, index=pd.Index(times, name='time'))
+        
+        # Only the averages that feed the AQI decide whether an hour is complete
+        complete = np.ones(n_hours, dtype=bool)
+        if pm25 is not None:
+            complete &= result.pop('PM2.5_complete').to_numpy(dtype=bool)
+        if o3 is not None:
+            complete &= result.pop('O3_complete').to_numpy(dtype=bool)
+        result = result.drop(columns=['PM2.5_complete', 'O3_complete'], errors='ignore')
         
-        sensitive_conditions = ['asthma', 'copd', 'heart_disease', 'diabetes']
-        if any(condition in conditions for condition in sensitive_conditions):
-            if aqi_value > 50:
-                recommendations["precautions"] += " Your health conditions require extra caution."
-                if aqi_value > 100:
-                    recommendations["activities"] = "Avoid all outdoor activities. Consult your healthcare provider."
+        aqi = calculate_aqi_arrays(
+            result['PM2.5_nowcast'] if pm25 is not None else None,
+            result['O3_8h'] if o3 is not None else None,
+            result['NO2_1h'] if no2 is not None else None
+        )
+        for pollutant in AQI_POLLUTANTS:
+            if pollutant in aqi:
+                result[f'AQI_{pollutant}'] = aqi[pollutant]
+        result['AQI'] = aqi['Overall']
+        result['Dominant'] = [AQI_POLLUTANTS[i] if i >= 0 else None for i in aqi['Dominant']]
+        result['Complete'] = complete
+        
+        return result.reset_index()
+
+def to_hourly(times, values):
+    """
+    Linearly interpolate a coarse forecast series onto hourly steps.
+    
+    Args:
+        times (array-like): Forecast timestamps
+        values (array-like): Forecast values at those timestamps
         
-        if activity_level == 'high' and aqi_value > 100:
-            recommendations["activities"] = "Consider indoor training alternatives. High-intensity exercise not recommended outdoors."
+    Returns:
+        tuple: (hourly timestamps, hourly values)
+    """
+    times = pd.to_datetime(pd.Series(times)).reset_index(drop=True)
+    hourly_times = pd.date_range(times.iloc[0], times.iloc[-1], freq='h')
+    
+    x = (times - times.iloc[0]).dt.total_seconds().to_numpy()
+    x_hourly = (hourly_times - times.iloc[0]).total_seconds().to_numpy()
+    
+    return hourly_times, np.interp(x_hourly, x, np.asarray(values, dtype=float))
+
+def get_aqi_category(aqi_value):
+    """
+    Get AQI category and color based on AQI value.
+    
+    A missing value maps to the top category, as it always has, so callers
+    can rely on a label and a color being returned.
+    """
+    labels, colors = get_aqi_categories([aqi_value])
+    if labels[0] is None:
+        standard = get_aqi_standard('EPA')
+        return standard.category_labels[-1], standard.category_colors[-1]
+    return labels[0], colors[0]
+
+# Base advice per US EPA AQI category, in category order
+BASE_RECOMMENDATIONS = {
+    "Good": {
+        "general": "Air quality is satisfactory. Perfect day for outdoor activities!",
+        "activities": "All outdoor activities recommended",
+        "precautions": "None needed"
+    },
+    "Moderate": {
+        "general": "Air quality is acceptable. Sensitive individuals should limit prolonged outdoor exertion.",
+        "activities": "Most outdoor activities are fine. Consider shorter durations for intense exercise.",
+        "precautions": "Sensitive individuals should monitor symptoms"
+    },
+    "Unhealthy for Sensitive Groups": {
+        "general": "Sensitive groups should reduce outdoor activities.",
+        "activities": "Limit outdoor exercise. Choose indoor alternatives when possible.",
+        "precautions": "Sensitive individuals should stay indoors during peak hours"
+    },
+    "Unhealthy": {
+        "general": "Everyone should limit outdoor activities.",
+        "activities": "Avoid outdoor exercise. Stay indoors with windows closed.",
+        "precautions": "Use air purifiers indoors. Wear masks when going outside."
+    },
+    "Very Unhealthy": {
+        "general": "Everyone should avoid outdoor activities.",
+        "activities": "Stay indoors. Avoid all outdoor exercise.",
+        "precautions": "Keep windows closed. Use air purifiers. Wear N95 masks outdoors."
+    },
+    "Hazardous": {
+        "general": "Emergency conditions. Everyone should remain indoors.",
+        "activities": "No outdoor activities. Stay indoors with air purification.",
+        "precautions": "Seal windows and doors. Use multiple air purifiers. Avoid going outside."
+    }
+}
+
+SENSITIVE_CONDITIONS = ['asthma', 'copd', 'heart_disease', 'diabetes']
+
+def get_profile_risk_class(user_profile=None):
+    """
+    Reduce a health profile to the flags that change the advice.
+    
+    Args:
+        user_profile (dict): User health profile with age, conditions, activity level
+        
+    Returns:
+        tuple: (sensitive age, sensitive condition, high activity) booleans
+    """
+    if not user_profile:
+        return (False, False, False)
+    
+    age = user_profile.get('age', 30)
+    conditions = user_profile.get('conditions', [])
+    
+    return (
+        age < 18 or age > 65,
+        any(condition in conditions for condition in SENSITIVE_CONDITIONS),
+        user_profile.get('activity_level', 'moderate') == 'high'
+    )
+
+def _build_advice_table():
+    """
+    Precompute advice for every (category, risk class) pair.
+    
+    Category positions stand in for the AQI thresholds: position >= 1 is
+    AQI > 50 and position >= 2 is AQI > 100.
+    """
+    table = {}
+    
+    for position, (category, base) in enumerate(BASE_RECOMMENDATIONS.items()):
+        for risk_class in itertools.product((False, True), repeat=3):
+            sensitive_age, sensitive_condition, high_activity = risk_class
+            advice = dict(base)
+            
+            if sensitive_age and position >= 2:
+                advice["precautions"] += " Extra caution recommended for your age group."
+            
+            if sensitive_condition and position >= 1:
+                advice["precautions"] += " Your health conditions require extra caution."
+                if position >= 2:
+                    advice["activities"] = "Avoid all outdoor activities. Consult your healthcare provider."
+            
+            if high_activity and position >= 2:
+                advice["activities"] = "Consider indoor training alternatives. High-intensity exercise not recommended outdoors."
+            
+            table[(category, risk_class)] = advice
+    
+    return table
+
+HEALTH_ADVICE_TABLE = _build_advice_table()
+
+def get_health_recommendation(aqi_value, user_profile=None):
+    """
+    Get personalized health recommendations based on AQI and user profile.
+    
+    Args:
+        aqi_value (int): Current AQI value
+        user_profile (dict): User health profile with age, conditions, activity level
+        
+    Returns:
+        dict: Health recommendations and advice
+    """
+    category, color = get_aqi_category(aqi_value)
+    risk_class = get_profile_risk_class(user_profile)
+    
+    recommendations = HEALTH_ADVICE_TABLE.get(
+        (category, risk_class), HEALTH_ADVICE_TABLE[("Moderate", risk_class)]
+    )
     
     return {
         "category": category,
         "color": color,
-        "recommendations": recommendations,
+        "recommendations": dict(recommendations),
         "aqi_value": aqi_value
     }
 
+def profile_hash(user_profile=None):
+    """Stable hash of the profile fields that affect health advice."""
+    key = (get_profile_risk_class(user_profile), (user_profile or {}).get('alert_threshold'))
+    return hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+
+def find_outdoor_windows(times, aqi_values, threshold):
+    """
+    Contiguous runs of hours with AQI at or below a threshold.
+    
+    Args:
+        times (array-like): Hourly timestamps
+        aqi_values (array-like): AQI for each hour
+        threshold (float): Highest acceptable AQI
+        
+    Returns:
+        list: Windows as dicts with start, end, hours and mean_aqi, longest first
+    """
+    times = pd.to_datetime(pd.Series(times)).reset_index(drop=True)
+    aqi_values = np.asarray(aqi_values, dtype=float)
+    
+    mask = np.concatenate(([False], aqi_values <= threshold, [False]))
+    edges = np.flatnonzero(np.diff(mask.astype(np.int8)))
+    starts, ends = edges[::2], edges[1::2]
+    
+    step = times.diff().median() if len(times) > 1 else pd.Timedelta(hours=1)
+    
+    windows = [
+        {
+            'start': times.iloc[start],
+            'end': times.iloc[end - 1] + step,
+            'hours': (end - start) * step / pd.Timedelta(hours=1),
+            'mean_aqi': float(aqi_values[start:end].mean())
+        }
+        for start, end in zip(starts, ends)
+    ]
+    return sorted(windows, key=lambda window: window['hours'], reverse=True)
+
+_health_timeline_cache = OrderedDict()
+_health_timeline_lock = threading.Lock()
+HEALTH_TIMELINE_CACHE_SIZE = 256
+
+def get_health_timeline(forecast_id, times, aqi_values, user_profile=None):
+    """
+    Health advice for every forecast hour plus the best outdoor windows.
+    
+    Categories and advice are looked up for the whole series in one
+    vectorized pass. Results are memoized per (forecast id, AQI series
+    hash, profile hash), so reruns of the page for the same forecast and
+    profile are free while a re-issued forecast with new values is not
+    served stale advice.
+    
+    Args:
+        forecast_id (str): Identifier of the forecast the series belongs to
+        times (array-like): Hourly timestamps
+        aqi_values (array-like): AQI for each hour
+        user_profile (dict): User health profile
+        
+    Returns:
+        dict: 'timeline' DataFrame (one row per hour) and 'windows' list
+    """
+    aqi_values = np.asarray(aqi_values, dtype=float)
+    aqi_hash = hashlib.sha1(aqi_values.tobytes()).hexdigest()[:12]
+    cache_key = (forecast_id, aqi_hash, profile_hash(user_profile))
+    
+    with _health_timeline_lock:
+        if cache_key in _health_timeline_cache:
+            _health_timeline_cache.move_to_end(cache_key)
+            return _health_timeline_cache[cache_key]
+    
+    risk_class = get_profile_risk_class(user_profile)
+    categories = list(BASE_RECOMMENDATIONS.keys())
+    advice = [HEALTH_ADVICE_TABLE[(category, risk_class)] for category in categories]
+    
+    labels, colors = get_aqi_categories(aqi_values)
+    positions = np.array([categories.index(label) if label else 1 for label in labels])
+    
+    timeline = pd.DataFrame({
+        'time': pd.to_datetime(pd.Series(times)).reset_index(drop=True),
+        'aqi': aqi_values,
+        'category': labels,
+        'color': colors
+    })
+    for field in ('general', 'activities', 'precautions'):
+        timeline[field] = np.array([entry[field] for entry in advice], dtype=object)[positions]
+    
+    # Sensitive profiles get a stricter definition of a good outdoor hour
+    threshold = 50 if (risk_class[0] or risk_class[1]) else 100
+    if user_profile and user_profile.get('alert_threshold'):
+        threshold = min(threshold, user_profile['alert_threshold'])
+    
+    result = {
+        'timeline': timeline,
+        'windows': find_outdoor_windows(timeline['time'], aqi_values, threshold),
+        'threshold': threshold
+    }
+    
+    with _health_timeline_lock:
+        _health_timeline_cache[cache_key] = result
+        if len(_health_timeline_cache) > HEALTH_TIMELINE_CACHE_SIZE:
+            _health_timeline_cache.popitem(last=False)
+    
+    return result
+
 @st.cache_data(ttl=3600)
 def fetch_air_quality_data(lat, lon):
     """
@@ -494,12 +1029,277 @@ def fetch_air_quality_data(lat, lon):
     
     return data
 
+# Lag and rolling-window history features (in days)
+LAG_DAYS = (1, 2, 7)
+
+# Hourly observations kept per location to seed the regulatory averages
+HOURLY_HISTORY_HOURS = 24
+ROLLING_WINDOWS = (3, 7)
+
+def lag_feature_names(value_col='value'):
+    """Names of the lag and rolling-window features, in a stable order."""
+    names = [f'{value_col}_lag_{lag}d' for lag in LAG_DAYS]
+    for window in ROLLING_WINDOWS:
+        names += [f'{value_col}_rollmean_{window}d', f'{value_col}_rollmax_{window}d']
+    return names
+
+def add_lag_features(data, group_cols=('site_id', 'parameter'), value_col='value', date_col='date'):
+    """
+    Add per-site lag and rolling-window features of pollutant history.
+    
+    Observations are first reduced to one daily mean per group. Lags are
+    looked up by calendar day, so gaps in the record yield NaN instead of
+    silently borrowing an older day, and rolling windows exclude the current
+    day so the target never leaks into its own features.
+    
+    Args:
+        data (pd.DataFrame): Observations with group, date and value columns
+        group_cols (tuple): Columns identifying one history (site and pollutant)
+        value_col (str): Column holding the observed concentration
+        date_col (str): Column holding the observation timestamp
+        
+    Returns:
+        pd.DataFrame: Input data with the lag_feature_names() columns added
+    """
+    group_cols = [col for col in group_cols if col in data.columns]
+    
+    data = data.copy()
+    data['_day'] = pd.to_datetime(data[date_col]).dt.floor('D')
+    
+    daily = data.groupby(group_cols + ['_day'], as_index=False)[value_col].mean()
+    features = daily[group_cols + ['_day']].copy()
+    
+    # Lags: the same history shifted forward by whole days
+    for lag in LAG_DAYS:
+        lagged = daily.rename(columns={value_col: f'{value_col}_lag_{lag}d'})
+        lagged['_day'] = lagged['_day'] + pd.Timedelta(days=lag)
+        features = features.merge(lagged, on=group_cols + ['_day'], how='left')
+    
+    # Rolling windows over the preceding days of each history
+    rolling_source = daily.sort_values('_day').set_index('_day').groupby(group_cols)[value_col]
+    for window in ROLLING_WINDOWS:
+        rolling = rolling_source.rolling(f'{window}D', closed='left')
+        stats = pd.DataFrame({
+            f'{value_col}_rollmean_{window}d': rolling.mean(),
+            f'{value_col}_rollmax_{window}d': rolling.max()
+        }).reset_index()
+        features = features.merge(stats, on=group_cols + ['_day'], how='left')
+    
+    data = data.merge(features, on=group_cols + ['_day'], how='left')
+    return data.drop(columns='_day')
+
+class PollutantHistoryBuffer:
+    """
+    Fixed-size ring buffer of recent daily observations per location.
+    
+    Values are concentrations in MODEL_UNITS, the units the training data
+    is converted to before add_lag_features.
+    
+    Serving-side counterpart of add_lag_features: each (location, pollutant)
+    keeps one slot per calendar day, indexed by day ordinal modulo the buffer
+    length, so updates and feature lookups are O(1) and no history is
+    recomputed per request. A second ring with one slot per hour keeps the
+    last day of hourly observations for StreamingAQIEngine.seed.
+    """
+    
+    def __init__(self, days=None, hours=HOURLY_HISTORY_HOURS):
+        self.days = days or max(max(LAG_DAYS), max(ROLLING_WINDOWS)) + 1
+        self.hours = hours
+        self._buffers = {}
+        self._hourly = {}
+    
+    @staticmethod
+    def location_key(lat, lon):
+        """Bucket coordinates to ~1 km so nearby requests share a history."""
+        return (round(float(lat), 2), round(float(lon), 2))
+    
+    def _buffer(self, lat, lon, pollutant, create=True):
+        key = (self.location_key(lat, lon), pollutant)
+        if key not in self._buffers:
+            if not create:
+                return None
+            self._buffers[key] = {
+                'day': np.full(self.days, -1, dtype=np.int64),
+                'sum': np.zeros(self.days),
+                'count': np.zeros(self.days, dtype=np.int64)
+            }
+        return self._buffers[key]
+    
+    def update(self, lat, lon, pollutant, timestamp, value):
+        """
+        Record an observation, averaging multiple readings of the same day.
+        
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            pollutant (str): Pollutant key
+            timestamp (datetime): Observation time
+            value (float): Observed concentration
+        """
+        if value is None or not np.isfinite(value):
+            return
+        
+        buffer = self._buffer(lat, lon, pollutant)
+        day = pd.Timestamp(timestamp).toordinal()
+        slot = day % self.days
+        
+        if buffer['day'][slot] != day:
+            buffer['day'][slot] = day
+            buffer['sum'][slot] = 0.0
+            buffer['count'][slot] = 0
+        
+        buffer['sum'][slot] += value
+        buffer['count'][slot] += 1
+        
+        hourly = self._hour_buffer(lat, lon, pollutant)
+        hour = self.hour_ordinal(timestamp)
+        slot = hour % self.hours
+        
+        if hourly['hour'][slot] != hour:
+            hourly['hour'][slot] = hour
+            hourly['sum'][slot] = 0.0
+            hourly['count'][slot] = 0
+        
+        hourly['sum'][slot] += value
+        hourly['count'][slot] += 1
+    
+    @staticmethod
+    def hour_ordinal(timestamp):
+        """Whole hours since the epoch."""
+        return pd.Timestamp(timestamp).value // 3_600_000_000_000
+    
+    def _hour_buffer(self, lat, lon, pollutant, create=True):
+        key = (self.location_key(lat, lon), pollutant)
+        if key not in self._hourly:
+            if not create:
+                return None
+            self._hourly[key] = {
+                'hour': np.full(self.hours, -1, dtype=np.int64),
+                'sum': np.zeros(self.hours),
+                'count': np.zeros(self.hours, dtype=np.int64)
+            }
+        return self._hourly[key]
+    
+    def recent_hours(self, lat, lon, pollutant, before):
+        """
+        Hourly means for the hours preceding the hour of `before`.
+        
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            pollutant (str): Pollutant key
+            before (datetime): Start of the series the history precedes
+            
+        Returns:
+            np.ndarray: One value per hour, oldest first (NaN where unobserved)
+        """
+        hourly = self._hour_buffer(lat, lon, pollutant, create=False)
+        if hourly is None:
+            return np.full(self.hours, np.nan)
+        
+        hours = self.hour_ordinal(pd.Timestamp(before).floor('h')) - np.arange(self.hours, 0, -1)
+        slots = hours % self.hours
+        valid = (hourly['hour'][slots] == hours) & (hourly['count'][slots] > 0)
+        return np.where(valid, hourly['sum'][slots] / np.maximum(hourly['count'][slots], 1), np.nan)
+    
+    def features(self, lat, lon, pollutant, timestamp, value_col='value'):
+        """
+        Lag and rolling-window features for a target day.
+        
+        Args:
+            lat (float): Latitude
+            lon (float): Longitude
+            pollutant (str): Pollutant key
+            timestamp (datetime): Day the features are needed for
+            value_col (str): Prefix used for the feature names
+            
+        Returns:
+            dict: Feature values matching add_lag_features (NaN where unknown)
+        """
+        buffer = self._buffer(lat, lon, pollutant, create=False)
+        if buffer is None:
+            return {name: np.nan for name in lag_feature_names(value_col)}
+        
+        day = pd.Timestamp(timestamp).toordinal()
+        
+        # Daily means for the preceding days, most recent first
+        previous_days = day - np.arange(1, self.days)
+        slots = previous_days % self.days
+        valid = (buffer['day'][slots] == previous_days) & (buffer['count'][slots] > 0)
+        history = np.where(valid, buffer['sum'][slots] / np.maximum(buffer['count'][slots], 1), np.nan)
+        
+        features = {}
+        for lag in LAG_DAYS:
+            features[f'{value_col}_lag_{lag}d'] = history[lag - 1]
+        
+        for window in ROLLING_WINDOWS:
+            values = history[:window]
+            has_values = np.isfinite(values).any()
+            features[f'{value_col}_rollmean_{window}d'] = np.nanmean(values) if has_values else np.nan
+            features[f'{value_col}_rollmax_{window}d'] = np.nanmax(values) if has_values else np.nan
+        
+        return features
+
+@st.cache_resource
+def get_history_buffer():
+    """Process-wide history buffer shared by all sessions."""
+    return PollutantHistoryBuffer()
+
+def aqi_to_concentration(aqi, pollutant):
+    """
+    Invert the US EPA AQI scale for a pollutant.
+    
+    Args:
+        aqi (float): AQI sub-index value
+        pollutant (str): 'PM2.5', 'O3' or 'NO2'
+        
+    Returns:
+        float | None: Concentration, or None for unknown pollutants
+    """
+    breakpoints = AQI_BREAKPOINTS.get(pollutant)
+    if breakpoints is None or aqi is None:
+        return None
+    
+    concentrations, aqis = zip(*breakpoints)
+    return float(np.interp(aqi, aqis, concentrations))
+
+def parse_current_observations(air_quality_data):
+    """
+    Extract current concentrations from fetch_air_quality_data results.
+    
+    Both AirNow and AQICN report AQI sub-indices, which are converted back
+    to concentrations. AirNow takes precedence where both report a pollutant.
+    
+    Args:
+        air_quality_data (dict): Result of fetch_air_quality_data
+        
+    Returns:
+        dict: Concentration per pollutant ('PM2.5', 'O3', 'NO2') in MODEL_UNITS
+    """
+    observations = {}
+    
+    aqicn = (air_quality_data or {}).get('aqicn', {})
+    if isinstance(aqicn, dict) and aqicn.get('status') == 'ok':
+        iaqi = aqicn.get('data', {}).get('iaqi', {})
+        for key, pollutant in (('pm25', 'PM2.5'), ('o3', 'O3'), ('no2', 'NO2')):
+            if isinstance(iaqi.get(key), dict) and 'v' in iaqi[key]:
+                observations[pollutant] = aqi_to_concentration(iaqi[key]['v'], pollutant)
+    
+    for observation in (air_quality_data or {}).get('airnow', []) or []:
+        pollutant = {'PM2.5': 'PM2.5', 'OZONE': 'O3', 'O3': 'O3', 'NO2': 'NO2'}.get(
+            str(observation.get('ParameterName', '')).upper()
+        )
+        if pollutant and observation.get('AQI', -1) >= 0:
+            observations[pollutant] = aqi_to_concentration(observation['AQI'], pollutant)
+    
+    return observations
+
 def process_training_data():
     """
     Process training data from CSV files for model training.
     
     Returns:
-        pd.DataFrame: Processed training data
+        pd.DataFrame: Processed training data, with 'value' in MODEL_UNITS
     """
     try:
         us_data_files = [
@@ -531,6 +1331,11 @@ def process_training_data():
                     df['date'] = pd.to_datetime(df['Date Local'])
                 if 'Arithmetic Mean' in df.columns:
                     df['value'] = df['Arithmetic Mean']
+                
+                # Concentrations are in MODEL_UNITS from here on (ozone is reported in ppm)
+                if 'Units of Measure' in df.columns:
+                    df['value'] = df['value'] * df['Units of Measure'].map(UNIT_SCALES).fillna(1.0)
+                    df = df.drop(columns='Units of Measure')
                 if 'Parameter Name' in df.columns:
                     df['parameter'] = df['Parameter Name']
                 
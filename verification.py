@@ -0,0 +1,389 @@
+import pandas as pd
+import numpy as np
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+import pyarrow as pa
+import pyarrow.dataset as ds
+from utils import process_training_data, unit_scale, MODEL_UNITS, LEGACY_MODEL_UNITS
+from historical_store import to_history_records
+
+FORECAST_ARCHIVE_DIR = os.path.join('data', 'forecast_archive')
+VERIFICATION_STATS_PATH = os.path.join('data', 'verification_stats.json')
+
+# (name, (min_lon, min_lat, max_lon, max_lat)); the first match wins
+VERIFICATION_REGIONS = [
+    ('North America', (-170.0, 15.0, -50.0, 75.0)),
+    ('South America', (-92.0, -56.0, -30.0, 15.0)),
+    ('Europe', (-25.0, 35.0, 45.0, 72.0)),
+    ('Africa', (-20.0, -35.0, 52.0, 37.0)),
+    ('South Asia', (60.0, 5.0, 98.0, 37.0)),
+    ('East Asia', (98.0, 18.0, 150.0, 55.0)),
+    ('Oceania', (110.0, -50.0, 180.0, -5.0))
+]
+
+# Forecasts and monitors within the same grid cell are compared (~11 km)
+VERIFICATION_GRID_DEG = 0.1
+
+# Lower edges of the lead-time buckets in hours
+LEAD_BUCKETS = (0, 6, 12, 24)
+
+# Largest gap between an hourly observation and the forecast step it verifies
+MATCH_TOLERANCE = pd.Timedelta(minutes=90)
+
+ARCHIVE_SCHEMA = pa.schema([
+    ('issue_time', pa.timestamp('ms')),
+    ('forecast_time', pa.timestamp('ms')),
+    ('lead_hours', pa.int16()),
+    ('location', pa.string()),
+    ('region', pa.string()),
+    ('pollutant', pa.string()),
+    ('value', pa.float32()),
+    ('unit', pa.string()),
+    ('forecast_date', pa.string())
+])
+
+ARCHIVE_PARTITIONING = ds.partitioning(pa.schema([('forecast_date', pa.string())]), flavor='hive')
+
+# (location, issue time) pairs remembered as already archived
+ARCHIVED_ISSUES_SIZE = 4096
+
+_archive_lock = threading.Lock()
+_archived_issues = OrderedDict()
+
+def location_key(lat, lon, grid_deg=VERIFICATION_GRID_DEG):
+    """Grid cell shared by forecasts and the monitors that verify them."""
+    return f"{int(np.floor(lat / grid_deg))},{int(np.floor(lon / grid_deg))}"
+
+def region_for(lat, lon):
+    """Verification region containing a location."""
+    for name, (min_lon, min_lat, max_lon, max_lat) in VERIFICATION_REGIONS:
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            return name
+    return 'Other'
+
+def lead_bucket_labels():
+    """Readable label of every lead-time bucket, in order."""
+    edges = list(LEAD_BUCKETS) + [None]
+    return [
+        f"{low}-{high - 1}h" if high is not None else f"{low}h+"
+        for low, high in zip(edges[:-1], edges[1:])
+    ]
+
+def lead_bucket(lead_hours):
+    """Lead-time bucket label for an array of lead times."""
+    positions = np.searchsorted(LEAD_BUCKETS, np.asarray(lead_hours, dtype=float), side='right') - 1
+    return np.array(lead_bucket_labels(), dtype=object)[np.clip(positions, 0, len(LEAD_BUCKETS) - 1)]
+
+def archive_forecast(frame, predictions, pollutant_names, archive_dir=FORECAST_ARCHIVE_DIR):
+    """
+    Append an issued forecast to the archive.
+
+    Rows are stored in long format and partitioned by forecast date, so the
+    verification of a day only opens that day's partition. Each location
+    and issue time is archived once per process, which keeps Streamlit
+    reruns of the same cached forecast from duplicating it.
+
+    Args:
+        frame (pd.DataFrame): Rows with issue_time, forecast_time, lead_hours, lat and lon
+        predictions (dict): Predicted values per model key in MODEL_UNITS, aligned with frame
+        pollutant_names (dict): Model key -> pollutant name
+        archive_dir (str): Root of the archive
+
+    Returns:
+        int: Number of rows written
+    """
+    if frame is None or len(frame) == 0 or not predictions:
+        return 0
+
+    locations = np.array([location_key(lat, lon) for lat, lon in zip(frame['lat'], frame['lon'])], dtype=object)
+    # The archive stores whole seconds
+    issues = pd.to_datetime(frame['issue_time']).dt.floor('s').values
+    issue_keys = set(zip(locations, issues))
+
+    with _archive_lock:
+        new_keys = {key for key in issue_keys if key not in _archived_issues}
+        for key in new_keys:
+            _archived_issues[key] = True
+        while len(_archived_issues) > ARCHIVED_ISSUES_SIZE:
+            _archived_issues.popitem(last=False)
+
+    if not new_keys:
+        return 0
+
+    keep = np.array([key in new_keys for key in zip(locations, issues)])
+    frame = frame[keep]
+    locations = locations[keep]
+    regions = np.array([region_for(lat, lon) for lat, lon in zip(frame['lat'], frame['lon'])], dtype=object)
+
+    parts = []
+    for model_key, values in predictions.items():
+        pollutant = pollutant_names.get(model_key, model_key)
+        forecast_times = pd.to_datetime(frame['forecast_time']).dt.floor('s')
+        parts.append(pd.DataFrame({
+            'issue_time': issues[keep],
+            'forecast_time': forecast_times.values,
+            'lead_hours': frame['lead_hours'].values,
+            'location': locations,
+            'region': regions,
+            'pollutant': pollutant,
+            'value': np.asarray(values, dtype=float)[keep],
+            'unit': MODEL_UNITS.get(pollutant),
+            'forecast_date': forecast_times.dt.strftime('%Y-%m-%d').values
+        }))
+
+    table = pa.Table.from_pandas(pd.concat(parts, ignore_index=True), schema=ARCHIVE_SCHEMA, preserve_index=False)
+    ds.write_dataset(
+        table,
+        archive_dir,
+        format='parquet',
+        partitioning=ARCHIVE_PARTITIONING,
+        existing_data_behavior='overwrite_or_ignore',
+        basename_template=f'forecast-{time.time_ns()}-{{i}}.parquet'
+    )
+
+    return table.num_rows
+
+def read_archive(dates, locations=None, pollutants=None, archive_dir=FORECAST_ARCHIVE_DIR):
+    """
+    Archived forecasts valid on the given dates, with values in MODEL_UNITS.
+
+    Rows archived before units were recorded came from models trained in
+    LEGACY_MODEL_UNITS and are rescaled as such.
+
+    Args:
+        dates (iterable): Forecast dates ('YYYY-MM-DD')
+        locations (iterable): Location keys to include, all if None
+        pollutants (iterable): Pollutants to include, all if None
+        archive_dir (str): Root of the archive
+
+    Returns:
+        pd.DataFrame: Archive rows
+    """
+    if not os.path.isdir(archive_dir) or not os.listdir(archive_dir):
+        return ARCHIVE_SCHEMA.empty_table().to_pandas()
+
+    dataset = ds.dataset(archive_dir, schema=ARCHIVE_SCHEMA, format='parquet', partitioning=ARCHIVE_PARTITIONING)
+
+    expression = ds.field('forecast_date').isin(sorted(set(dates)))
+    if locations is not None:
+        expression = expression & ds.field('location').isin(sorted(set(locations)))
+    if pollutants is not None:
+        expression = expression & ds.field('pollutant').isin(sorted(set(pollutants)))
+
+    forecasts = dataset.to_table(filter=expression).to_pandas()
+    forecasts['unit'] = forecasts['unit'].fillna(forecasts['pollutant'].map(LEGACY_MODEL_UNITS))
+    forecasts['value'] = forecasts['value'].astype(float) * model_unit_scales(forecasts)
+    forecasts['unit'] = forecasts['pollutant'].map(MODEL_UNITS).fillna(forecasts['unit'])
+    return forecasts
+
+def model_unit_scales(frame):
+    """Multiplier taking each row's value from its 'unit' into MODEL_UNITS."""
+    pairs = list(zip(frame['unit'], frame['pollutant']))
+    scales = {pair: unit_scale(*pair) for pair in set(pairs)}
+    return np.array([scales[pair] for pair in pairs], dtype=float)
+
+class SkillAccumulator:
+    """
+    Streaming forecast-error statistics.
+
+    Keeps count, sum of errors, sum of absolute errors and sum of squared
+    errors per (pollutant, region, lead bucket). RMSE, MAE and bias follow
+    from those sums, so verifying new observations only costs their own
+    rows. Per-series watermarks record the latest verified observation so
+    nothing is counted twice.
+    """
+
+    COLUMNS = ['pollutant', 'region', 'lead_bucket']
+
+    def __init__(self, sums=None, watermarks=None):
+        self.sums = sums if sums is not None else {}
+        self.watermarks = watermarks if watermarks is not None else {}
+
+    def update(self, errors):
+        """
+        Add verified forecast errors.
+
+        Args:
+            errors (pd.DataFrame): pollutant, region, lead_bucket and error columns
+        """
+        if errors is None or len(errors) == 0:
+            return
+
+        errors = errors.assign(abs_error=errors['error'].abs(), sq_error=errors['error'] ** 2)
+        totals = errors.groupby(self.COLUMNS).agg(
+            count=('error', 'size'),
+            sum_error=('error', 'sum'),
+            sum_abs=('abs_error', 'sum'),
+            sum_sq=('sq_error', 'sum')
+        )
+
+        for key, row in totals.iterrows():
+            current = self.sums.setdefault('|'.join(key), [0, 0.0, 0.0, 0.0])
+            current[0] += int(row['count'])
+            current[1] += float(row['sum_error'])
+            current[2] += float(row['sum_abs'])
+            current[3] += float(row['sum_sq'])
+
+    def to_frame(self):
+        """Skill table with n, RMSE, MAE and bias per key."""
+        rows = []
+        for key, (count, sum_error, sum_abs, sum_sq) in self.sums.items():
+            pollutant, region, bucket = key.split('|')
+            rows.append({
+                'pollutant': pollutant,
+                'region': region,
+                'lead_bucket': bucket,
+                'n': count,
+                'rmse': np.sqrt(sum_sq / count),
+                'mae': sum_abs / count,
+                'bias': sum_error / count
+            })
+
+        skill = pd.DataFrame(rows, columns=self.COLUMNS + ['n', 'rmse', 'mae', 'bias'])
+        order = {label: position for position, label in enumerate(lead_bucket_labels())}
+        return skill.sort_values(
+            ['pollutant', 'region', 'lead_bucket'], key=lambda col: col.map(order) if col.name == 'lead_bucket' else col
+        ).reset_index(drop=True)
+
+    def save(self, path=VERIFICATION_STATS_PATH):
+        """Atomically write the accumulators to disk."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w') as f:
+            json.dump({'sums': self.sums, 'watermarks': self.watermarks}, f)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path=VERIFICATION_STATS_PATH):
+        """Read accumulators from disk, empty if none were saved yet."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, 'r') as f:
+            state = json.load(f)
+        return cls(state.get('sums'), state.get('watermarks'))
+
+_verification_lock = threading.Lock()
+
+def verify_observations(observations, resolution='hour', archive_dir=FORECAST_ARCHIVE_DIR,
+                        stats_path=VERIFICATION_STATS_PATH):
+    """
+    Verify archived forecasts against newly arrived observations.
+
+    Observations at or before the watermark of their (location, pollutant,
+    resolution) series are skipped. Hourly observations are matched to the
+    forecast step of each issue within MATCH_TOLERANCE; daily means are
+    matched to the mean of each issue's forecasts for that day. Only the
+    archive partitions of the observation dates are read.
+
+    Args:
+        observations (pd.DataFrame): lat, lon, pollutant, time and value, plus
+            an optional unit column (MODEL_UNITS if absent)
+        resolution (str): 'hour' or 'day'
+        archive_dir (str): Root of the forecast archive
+        stats_path (str): Accumulator file
+
+    Returns:
+        int: Number of forecast values verified
+    """
+    if observations is None or len(observations) == 0:
+        return 0
+
+    # Forecasts come out of read_archive in MODEL_UNITS; bring observations there too
+    if 'unit' not in observations:
+        observations = observations.assign(unit=None)
+    observed = observations['value'].astype(float).values * model_unit_scales(observations)
+
+    observations = pd.DataFrame({
+        'location': [location_key(lat, lon) for lat, lon in zip(observations['lat'], observations['lon'])],
+        'pollutant': observations['pollutant'].values,
+        'time': pd.to_datetime(observations['time']).values,
+        'observed': observed
+    }).dropna(subset=['observed'])
+
+    with _verification_lock:
+        accumulator = SkillAccumulator.load(stats_path)
+
+        series = observations['location'] + '|' + observations['pollutant'] + '|' + resolution
+        watermarks = pd.to_datetime(series.map(accumulator.watermarks))
+        observations = observations[watermarks.isna().values | (observations['time'] > watermarks).values]
+        if observations.empty:
+            return 0
+
+        if resolution == 'day':
+            observations = observations.assign(time=observations['time'].dt.normalize())
+            dates = observations['time'].dt.strftime('%Y-%m-%d')
+        else:
+            # Forecasts within the tolerance may fall on a neighbouring date
+            dates = pd.concat([
+                (observations['time'] - MATCH_TOLERANCE).dt.strftime('%Y-%m-%d'),
+                (observations['time'] + MATCH_TOLERANCE).dt.strftime('%Y-%m-%d')
+            ])
+
+        forecasts = read_archive(dates, observations['location'], observations['pollutant'], archive_dir)
+
+        matched = pd.DataFrame()
+        if not forecasts.empty:
+            if resolution == 'day':
+                forecasts['time'] = pd.to_datetime(forecasts['forecast_time']).dt.normalize()
+                forecasts = forecasts.groupby(
+                    ['location', 'region', 'pollutant', 'issue_time', 'time'], as_index=False
+                ).agg(value=('value', 'mean'), lead_hours=('lead_hours', 'min'))
+                matched = forecasts.merge(observations, on=['location', 'pollutant', 'time'])
+            else:
+                candidates = forecasts.merge(observations, on=['location', 'pollutant'])
+                candidates['gap'] = (candidates['forecast_time'] - candidates['time']).abs()
+                candidates = candidates[candidates['gap'] <= MATCH_TOLERANCE]
+                # Closest step of each issue to each observation
+                matched = candidates.sort_values('gap').drop_duplicates(['location', 'pollutant', 'time', 'issue_time'])
+
+        if not matched.empty:
+            accumulator.update(pd.DataFrame({
+                'pollutant': matched['pollutant'].values,
+                'region': matched['region'].values,
+                'lead_bucket': lead_bucket(matched['lead_hours']),
+                'error': (matched['value'] - matched['observed']).values
+            }))
+
+        latest = observations.groupby(['location', 'pollutant'])['time'].max()
+        for (location, pollutant), latest_time in latest.items():
+            accumulator.watermarks[f"{location}|{pollutant}|{resolution}"] = pd.Timestamp(latest_time).isoformat()
+
+        accumulator.save(stats_path)
+
+    return len(matched)
+
+def load_skill_table(stats_path=VERIFICATION_STATS_PATH):
+    """Current live skill per pollutant, region and lead bucket."""
+    return SkillAccumulator.load(stats_path).to_frame()
+
+def main():
+    """
+    Verify archived forecasts against the ground-truth CSVs.
+
+    Usage:
+        python verification.py
+    """
+    print("Verifying archived forecasts against ground truth...")
+    print("=" * 60)
+
+    ground_truth_data = process_training_data()
+    if ground_truth_data is None:
+        print("FAILED: Could not load ground truth data")
+        return
+
+    records = to_history_records(ground_truth_data)
+    observations = records.rename(columns={'date': 'time'})[['lat', 'lon', 'pollutant', 'time', 'value']]
+    observations['unit'] = observations['pollutant'].map(MODEL_UNITS)
+
+    started = time.time()
+    verified = verify_observations(observations, resolution='day')
+    print(f"Verified {verified} forecast values in {time.time() - started:.1f}s")
+
+    skill = load_skill_table()
+    if not skill.empty:
+        print(skill.to_string(index=False))
+
+if __name__ == "__main__":
+    main()